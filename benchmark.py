@@ -0,0 +1,210 @@
+#
+# benchmark.py
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# See the LICENSE file for more details.
+#
+# Benchmarks for the pyudmx send paths.
+#
+#   python benchmark.py sim      runs against a simulated interface (no hardware needed)
+#   python benchmark.py bench    runs the same workloads against a real uDMX interface
+#
+# By default the simulated interface takes no time per transfer, so the sim
+# results measure the library's own overhead. Add --realtime to use the
+# simulator's low speed USB timing model instead.
+#
+# Use --json FILE to save machine readable results, and compare the files
+# from different releases to spot regressions.
+#
+# Requirements
+# A virtual environment meeting the requirements defined in requirements.txt.
+# Specifically the pyusb module must be installed.
+#
+
+import argparse
+import json
+import platform
+import sys
+import time
+from array import array
+from pyudmx import pyudmx
+from pyudmx.simulator import SimulatedBackend
+import uDMX
+
+
+def measure(name, fn, duration):
+    """
+    Call fn repeatedly for about duration seconds.
+    Returns a result dictionary.
+    """
+    # Warm up
+    fn()
+    ops = 0
+    start = time.perf_counter()
+    end = start + duration
+    now = start
+    while now < end:
+        fn()
+        ops += 1
+        now = time.perf_counter()
+    elapsed = now - start
+    result = {
+        "name": name,
+        "ops": ops,
+        "seconds": elapsed,
+        "us_per_op": elapsed / ops * 1e6,
+        "ops_per_sec": ops / elapsed,
+    }
+    print("{0:<40} {1:>12.2f} us/op {2:>12.1f} ops/s".format(name, result["us_per_op"], result["ops_per_sec"]))
+    return result
+
+
+def send_workloads(dev, duration):
+    """
+    Benchmark the uDMXDevice send paths.
+    """
+    results = []
+    results.append(measure("send_single_value", lambda: dev.send_single_value(1, 255), duration))
+
+    for length in (1, 8, 64, 256, 512):
+        values = bytearray(range(256)) * 2
+        values = values[:length]
+        results.append(measure("send_multi_value len={0}".format(length),
+                               lambda: dev.send_multi_value(1, values), duration))
+
+    full_list = list(range(256)) * 2
+    full_bytearray = bytearray(full_list)
+    full_bytes = bytes(full_list)
+    results.append(measure("send_multi_value list[512]", lambda: dev.send_multi_value(1, full_list), duration))
+    results.append(measure("send_multi_value bytearray[512]",
+                           lambda: dev.send_multi_value(1, full_bytearray), duration))
+    results.append(measure("send_multi_value bytes[512]", lambda: dev.send_multi_value(1, full_bytes), duration))
+    full_array = array("B", full_list)
+    full_view = memoryview(full_bytes * 2)[256:768]
+    results.append(measure("send_multi_value array('B')[512]", lambda: dev.send_multi_value(1, full_array), duration))
+    results.append(measure("send_multi_value memoryview[512]", lambda: dev.send_multi_value(1, full_view), duration))
+
+    results.append(measure("_send_control_message single",
+                           lambda: dev._send_control_message(pyudmx.SetSingleChannel, 255, 1, 1), duration))
+
+    # Sustained full universe updates, a different frame every time
+    frames = [bytes([i]) * 512 for i in range(256)]
+    counter = [0]
+
+    def full_frame():
+        counter[0] = (counter[0] + 1) & 0xff
+        dev.send_multi_value(1, frames[counter[0]])
+    result = measure("full universe frames", full_frame, duration)
+    result["fps"] = result["ops_per_sec"]
+    results.append(result)
+
+    # Universe buffer with a handful of changed channels per frame
+    def sparse_frame():
+        counter[0] = (counter[0] + 1) & 0xff
+        dev.Universe.set_values(1, [counter[0]] * 3)
+        dev.Universe.set_value(7, counter[0])
+        dev.flush()
+    results.append(measure("flush 4 changed channels", sparse_frame, duration))
+    return results
+
+
+def timing_workload(dev, duration):
+    """
+    Measure the frame timing of refresh mode at 44 Hz while a few channels
+    change every frame. Lateness is how long after its deadline a frame started.
+    """
+    # At least 100 frames for meaningful percentiles
+    seconds = max(duration * 4, 2.5)
+    engine = dev.start_refresh(rate=44)
+    counter = [0]
+
+    def renderer(now):
+        counter[0] = (counter[0] + 1) & 0xff
+        dev.Universe.set_values(1, [counter[0]] * 4)
+    engine.add_renderer(renderer)
+    time.sleep(seconds)
+    stats = engine.stats()
+    dev.stop_refresh()
+    result = {
+        "name": "refresh 44 Hz frame timing",
+        "seconds": seconds,
+        "frames": stats["frames"],
+        "fps": stats["fps"],
+        "missed_deadlines": stats["missed_deadlines"],
+        "lateness_p50_ms": stats["lateness_p50_ms"],
+        "lateness_p95_ms": stats["lateness_p95_ms"],
+        "lateness_p99_ms": stats["lateness_p99_ms"],
+        "max_lateness_ms": stats["max_lateness_ms"],
+    }
+    print("{0:<40} p50 {1:.3f} p95 {2:.3f} p99 {3:.3f} max {4:.3f} ms, {5} missed".format(
+        result["name"], result["lateness_p50_ms"], result["lateness_p95_ms"], result["lateness_p99_ms"],
+        result["max_lateness_ms"], result["missed_deadlines"]))
+    return result
+
+
+def translate_workloads(duration):
+    """
+    Benchmark uDMX.py alias translation.
+    """
+    results = []
+    for i in range(1, 201):
+        uDMX.add_channel("ch{0}".format(i), i)
+        uDMX.add_values("val{0}".format(i), [i % 256, (i * 7) % 256, (i * 13) % 256])
+    results.append(measure("translate_message_tokens numeric",
+                           lambda: uDMX.translate_message_tokens(["1", "255", "128", "0"]), duration))
+    results.append(measure("translate_message_tokens aliases",
+                           lambda: uDMX.translate_message_tokens(["ch100", "val1", "val50", "val200"]), duration))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pyudmx send paths")
+    parser.add_argument("mode", nargs="?", choices=["sim", "bench"], default="sim",
+                        help="sim: simulated interface (default), bench: real uDMX interface")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="seconds per workload (default 0.5 for sim, 2.0 for bench)")
+    parser.add_argument("--realtime", action="store_true",
+                        help="sim only: use the simulator's USB timing model")
+    parser.add_argument("--json", metavar="FILE", help="write machine readable results to FILE")
+    args = parser.parse_args()
+
+    duration = args.duration
+    if duration is None:
+        duration = 0.5 if args.mode == "sim" else 2.0
+
+    dev = pyudmx.uDMXDevice()
+    if args.mode == "sim":
+        opened = dev.open(backend=SimulatedBackend(realtime=args.realtime))
+    else:
+        opened = dev.open()
+    if not opened:
+        print("Unable to find and open uDMX interface")
+        return 1
+
+    results = send_workloads(dev, duration)
+    results.append(timing_workload(dev, duration))
+    results.extend(translate_workloads(duration))
+    dev.close()
+
+    if args.json:
+        report = {
+            "mode": args.mode,
+            "realtime": args.realtime if args.mode == "sim" else True,
+            "timestamp": time.time(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "results": results,
+        }
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print("Results written to", args.json)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
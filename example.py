@@ -20,19 +20,19 @@
 #
 
 from pyudmx import pyudmx
+from pyudmx.fixtures import Patch, THINPAR64_7CH
 from time import sleep
 
 
 def send_rgb(dev, red, green, blue, dimmer):
     """
-    Send a set of RGB values to the light
+    Send a set of RGB values to the light.
+    The values are written to the device's universe buffer and
+    flush() sends only the channels that actually changed.
     """
-    cv = [0 for v in range(0, 512)]
-    cv[0] = red
-    cv[1] = green
-    cv[2] = blue
-    cv[6] = dimmer
-    sent = dev.send_multi_value(1, cv)
+    dev.Universe.set_values(1, [red, green, blue])
+    dev.Universe.set_value(7, dimmer)
+    sent = dev.flush()
     return sent
 
 
@@ -89,6 +89,18 @@ def main():
     send_rgb(dev, 0, 0, 255, 128)
     sleep(3.0)
 
+    # With a fixture patch the channels are named instead of numbered.
+    # Selections are compiled once and can be set as often as needed.
+
+    print("And, again with a fixture patch")
+    patch = Patch()
+    par = patch.add("par1", THINPAR64_7CH, 1)
+    rgb = patch.select([par], ("red", "green", "blue", "dimmer"))
+    for color in ((255, 0, 0), (0, 255, 0), (0, 0, 255)):
+        rgb.set(dev.Universe, color + (128,))
+        dev.flush()
+        sleep(3.0)
+
     print("Reset all channels and close..")
     # Turns the light off
     cv = [0 for v in range(0, 512)]
@@ -0,0 +1,182 @@
+# aio.py - asyncio interface for Anyma (and clones) uDMX interfaces
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# USB control transfers block. AsyncUDMXDevice runs them on a dedicated
+# single worker thread so that coroutines never stall the event loop.
+# Requests are queued with bounded backpressure. A write to a channel range
+# that is already queued replaces the queued values, so a slow device
+# never builds up a backlog of stale writes.
+#
+# Usage example
+#
+# dev = AsyncUDMXDevice()
+# await dev.open()
+# await dev.send_single_value(1, 255) # sends the value 255 to DMX channel 1
+# await dev.close()
+#
+
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Union, List  # support type hinting
+from .pyudmx import uDMXDevice, SetSingleChannel, SetMultiChannel
+from .universe import byte_values
+
+
+class AsyncUDMXDevice:
+    def __init__(self, max_pending: int = 64):
+        """
+        Create an asyncio uDMX device.
+        :param max_pending: maximum number of distinct writes that may be
+            queued before send methods wait for the device to catch up.
+        """
+        if max_pending < 1:
+            raise ValueError("max_pending must be at least 1")
+        self._dev = uDMXDevice()
+        self._max_pending = max_pending
+        self._executor = None
+        self._writer = None
+        self._cond = None
+        self._in_flight = False
+        # (channel, length) -> [cmd, payload, futures]
+        self._pending = OrderedDict()
+
+    @property
+    def Device(self) -> uDMXDevice:
+        """
+        Returns the wrapped uDMXDevice instance.
+        Do not call its send methods while the async device is open.
+        """
+        return self._dev
+
+    async def open(self, vendor_id: int = 0x16c0, product_id: int = 0x5dc, bus: int = None,
+                   address: int = None, backend=None) -> bool:
+        """
+        Open the first device that matches the search criteria.
+        See uDMXDevice.open() for the parameters.
+        :return: Returns true if a device was opened. Otherwise, returns false.
+        """
+        loop = asyncio.get_event_loop()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1)
+        opened = await loop.run_in_executor(self._executor, self._dev.open, vendor_id, product_id, bus, address,
+                                            backend)
+        if opened and self._writer is None:
+            self._cond = asyncio.Condition()
+            self._writer = asyncio.ensure_future(self._write_queued())
+        return opened
+
+    async def close(self):
+        """
+        Send everything that is still queued, then close and release the usb device.
+        :return: None
+        """
+        if self._writer is not None:
+            async with self._cond:
+                while self._pending or self._in_flight:
+                    await self._cond.wait()
+            self._writer.cancel()
+            try:
+                await self._writer
+            except asyncio.CancelledError:
+                pass
+            self._writer = None
+        if self._executor is not None:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(self._executor, self._dev.close)
+            self._executor.shutdown()
+            self._executor = None
+
+    async def send_single_value(self, channel: int, value: int) -> int:
+        """
+        Send a single value to the uDMX
+        :param channel: DMX channel number, 1-512
+        :param value: Value to be sent to channel, 0-255
+        :return: number of bytes actually sent
+        """
+        if value < 0 or value > 255:
+            raise ValueError("Value {0} is outside 0-255".format(value))
+        return await self._submit(SetSingleChannel, channel, value, 1)
+
+    async def send_multi_value(self, channel: int, values: Union[List[int], bytearray]) -> int:
+        """
+        Send multiple consecutive bytes to the uDMX
+        :param channel: The starting DMX channel number, 1-512
+        :param values: any sequence of integer values (e.g a list). Each value 0-255.
+        :return: number of bytes actually sent
+        """
+        # The caller is free to reuse its buffer once we return, so a buffer
+        # that belongs to the caller is copied. A list is converted only once.
+        data = byte_values(values)
+        if data is values or isinstance(data, memoryview):
+            data = bytes(data)
+        return await self._submit(SetMultiChannel, channel, data, len(data))
+
+    async def _submit(self, cmd: int, channel: int, payload, length: int) -> int:
+        """
+        Queue a write, collapsing it into a queued write to the same channel range.
+        :return: the result of the transfer that carried the values
+        """
+        if self._writer is None:
+            raise ValueError("No usb device opened")
+        future = asyncio.get_event_loop().create_future()
+        key = (channel, length)
+        async with self._cond:
+            while key not in self._pending and len(self._pending) >= self._max_pending:
+                await self._cond.wait()
+            item = self._pending.get(key)
+            if item is None:
+                self._pending[key] = [cmd, payload, [future]]
+            else:
+                # Latest write wins. Move it to the back of the queue so that
+                # it still lands after any overlapping writes queued before it.
+                item[0] = cmd
+                item[1] = payload
+                item[2].append(future)
+                self._pending.move_to_end(key)
+            self._cond.notify_all()
+        return await future
+
+    def _transfer(self, cmd: int, channel: int, payload) -> int:
+        """
+        Runs on the worker thread.
+        """
+        if cmd == SetSingleChannel:
+            return self._dev.send_single_value(channel, payload)
+        return self._dev.send_multi_value(channel, payload)
+
+    async def _write_queued(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            async with self._cond:
+                while not self._pending:
+                    await self._cond.wait()
+                (channel, length), (cmd, payload, futures) = self._pending.popitem(last=False)
+                self._in_flight = True
+                # There is room in the queue again
+                self._cond.notify_all()
+            try:
+                n = await loop.run_in_executor(self._executor, self._transfer, cmd, channel, payload)
+            except Exception as ex:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(ex)
+            else:
+                for future in futures:
+                    if not future.done():
+                        future.set_result(n)
+            async with self._cond:
+                self._in_flight = False
+                self._cond.notify_all()
@@ -0,0 +1,306 @@
+# bridge.py - Art-Net and sACN (E1.31) receiver bridge for uDMX interfaces
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# The DMXBridge listens for Art-Net ArtDmx and sACN (E1.31) data packets
+# and feeds the slot data of each mapped network universe into the
+# universe of a uDMXDevice.
+#
+# Packets are received with recv_into() into one preallocated buffer and
+# the slot data is copied straight from a memoryview of that buffer into
+# the device's universe, so no per-packet objects are created for the data.
+# The universe only marks the channels that actually changed, and the
+# device's refresh engine sends them at its own frame rate. A console
+# sending faster than the interface can keep up with simply has its
+# intermediate frames merged.
+#
+# Usage example
+#
+# dev = pyudmx.uDMXDevice()
+# dev.open()
+# bridge = DMXBridge(rate=40)
+# bridge.map(ARTNET, 0, dev) # Art-Net port-address 0 -> dev
+# bridge.map(SACN, 1, dev)   # or sACN universe 1
+# bridge.start()
+# ...
+# print(bridge.stats())
+# bridge.stop()
+#
+
+import selectors
+import socket
+import struct
+import threading
+import time
+from typing import Dict, Tuple  # support type hinting
+
+ARTNET = "artnet"
+SACN = "sacn"
+
+ARTNET_PORT = 6454
+SACN_PORT = 5568
+
+# Art-Net ArtDmx packet layout
+ARTNET_ID = b"Art-Net\x00"
+ARTNET_OP_DMX = 0x5000
+ARTNET_HEADER_SIZE = 18
+artdmx_header = struct.Struct("<8sH")  # ID, OpCode (little endian)
+artdmx_fields = struct.Struct(">BBBBH")  # Sequence, Physical, SubUni, Net, Length (big endian)
+
+# sACN (E1.31) data packet layout
+SACN_ID = b"ASC-E1.17\x00\x00\x00"
+SACN_ROOT_VECTOR_DATA = 0x00000004
+SACN_FRAMING_VECTOR_DATA = 0x00000002
+SACN_DMP_VECTOR_SET_PROPERTY = 0x02
+SACN_HEADER_SIZE = 126  # up to and including the DMX start code
+SACN_OPTION_PREVIEW = 0x80
+SACN_OPTION_TERMINATED = 0x40
+
+# Largest packet either protocol sends for 512 slots
+MAX_PACKET_SIZE = 638
+
+
+def sacn_multicast_group(universe: int) -> str:
+    """
+    Returns the multicast group for an sACN universe (239.255.hi.lo).
+    """
+    return "239.255.{0}.{1}".format(universe >> 8, universe & 0xff)
+
+
+class _UniverseStats:
+    __slots__ = ("packets", "duplicates", "gaps", "out_of_order", "sequence", "first", "last")
+
+    def __init__(self):
+        self.packets = 0
+        self.duplicates = 0
+        self.gaps = 0
+        self.out_of_order = 0
+        self.sequence = None
+        self.first = None
+        self.last = None
+
+
+class DMXBridge:
+    def __init__(self, host: str = "0.0.0.0", artnet_port: int = ARTNET_PORT, sacn_port: int = SACN_PORT,
+                 rate: float = 40.0, multicast: bool = True):
+        """
+        :param host: address to listen on
+        :param artnet_port: UDP port for Art-Net, or None to disable Art-Net (0 picks a free port)
+        :param sacn_port: UDP port for sACN, or None to disable sACN (0 picks a free port)
+        :param rate: frame rate for devices that are not already in refresh mode
+        :param multicast: join the sACN multicast group of each mapped sACN universe
+        """
+        self._host = host
+        self._ports = {ARTNET: artnet_port, SACN: sacn_port}
+        self._rate = rate
+        self._multicast = multicast
+        # (protocol, network universe) -> uDMXDevice
+        self._routes = {}
+        self._stats = {}
+        self._malformed = 0
+        self._sockets = {}
+        self._selector = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._buffer = bytearray(MAX_PACKET_SIZE)
+        self._view = memoryview(self._buffer)
+
+    def map(self, protocol: str, universe: int, dev):
+        """
+        Feed a network universe into a device.
+        :param protocol: ARTNET or SACN
+        :param universe: Art-Net 15 bit port-address, or sACN universe 1-63999
+        :param dev: the uDMXDevice that receives the slot data
+        :return: None
+        """
+        if protocol not in (ARTNET, SACN):
+            raise ValueError("Unknown protocol {0}".format(protocol))
+        self._routes[(protocol, universe)] = dev
+        self._stats[(protocol, universe)] = _UniverseStats()
+
+    @property
+    def addresses(self) -> Dict[str, Tuple[str, int]]:
+        """
+        Returns the (host, port) each protocol is listening on.
+        """
+        return {protocol: sock.getsockname() for protocol, sock in self._sockets.items()}
+
+    def start(self):
+        """
+        Open the sockets and start the receiver thread.
+        Mapped devices that are not in refresh mode are started at the bridge's rate.
+        :return: None
+        """
+        if self._thread is not None:
+            return
+        for dev in set(self._routes.values()):
+            if dev.Refresh is None:
+                dev.start_refresh(rate=self._rate)
+
+        self._selector = selectors.DefaultSelector()
+        for protocol, port in self._ports.items():
+            if port is None:
+                continue
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            # A large receive buffer rides out bursts from several universes
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+            sock.bind((self._host, port))
+            sock.setblocking(False)
+            if protocol == SACN and self._multicast:
+                self._join_multicast(sock)
+            self._sockets[protocol] = sock
+            self._selector.register(sock, selectors.EVENT_READ, protocol)
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="uDMX-bridge", daemon=True)
+        self._thread.start()
+
+    def _join_multicast(self, sock: socket.socket):
+        for protocol, universe in self._routes:
+            if protocol == SACN:
+                mreq = struct.pack("4s4s", socket.inet_aton(sacn_multicast_group(universe)),
+                                   socket.inet_aton("0.0.0.0"))
+                try:
+                    sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, mreq)
+                except OSError:
+                    # No multicast route (e.g. loopback only). Unicast still works.
+                    pass
+
+    def stop(self):
+        """
+        Stop the receiver thread and close the sockets.
+        The devices stay in refresh mode.
+        :return: None
+        """
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        for sock in self._sockets.values():
+            self._selector.unregister(sock)
+            sock.close()
+        self._sockets = {}
+        self._selector.close()
+        self._selector = None
+
+    def _run(self):
+        buffer = self._buffer
+        while not self._stop_event.is_set():
+            for key, events in self._selector.select(timeout=0.25):
+                sock = key.fileobj
+                handler = self._artnet_packet if key.data == ARTNET else self._sacn_packet
+                # Drain everything that is queued on the socket
+                while True:
+                    try:
+                        n = sock.recv_into(buffer)
+                    except (BlockingIOError, InterruptedError):
+                        break
+                    except OSError:
+                        break
+                    handler(n)
+
+    def _artnet_packet(self, n: int):
+        buffer = self._buffer
+        if n < ARTNET_HEADER_SIZE:
+            self._malformed += 1
+            return
+        packet_id, opcode = artdmx_header.unpack_from(buffer, 0)
+        if packet_id != ARTNET_ID:
+            self._malformed += 1
+            return
+        if opcode != ARTNET_OP_DMX:
+            # Polls and other Art-Net traffic
+            return
+        sequence, physical, sub_uni, net, length = artdmx_fields.unpack_from(buffer, 12)
+        if length < 1 or length > 512 or ARTNET_HEADER_SIZE + length > n:
+            self._malformed += 1
+            return
+        universe = ((net & 0x7f) << 8) | sub_uni
+        # Art-Net sequence 0 means sequencing is disabled, otherwise it runs 1-255
+        self._deliver((ARTNET, universe), sequence if sequence else None, 255,
+                      self._view[ARTNET_HEADER_SIZE:ARTNET_HEADER_SIZE + length])
+
+    def _sacn_packet(self, n: int):
+        buffer = self._buffer
+        if n < SACN_HEADER_SIZE or buffer[4:16] != SACN_ID:
+            self._malformed += 1
+            return
+        root_vector, = struct.unpack_from(">I", buffer, 18)
+        framing_vector, = struct.unpack_from(">I", buffer, 40)
+        if root_vector != SACN_ROOT_VECTOR_DATA or framing_vector != SACN_FRAMING_VECTOR_DATA:
+            # Synchronization and discovery packets
+            return
+        sequence, options, universe = struct.unpack_from(">BBH", buffer, 111)
+        if options & (SACN_OPTION_PREVIEW | SACN_OPTION_TERMINATED):
+            return
+        vector, count = buffer[117], struct.unpack_from(">H", buffer, 123)[0]
+        start_code = buffer[125]
+        if vector != SACN_DMP_VECTOR_SET_PROPERTY or count < 1 or 125 + count > n:
+            self._malformed += 1
+            return
+        if start_code != 0:
+            # Not dimmer data (e.g. RDM or a per-slot priority)
+            return
+        self._deliver((SACN, universe), sequence, 256, self._view[SACN_HEADER_SIZE:125 + count])
+
+    def _deliver(self, route: tuple, sequence: int, modulus: int, data: memoryview):
+        dev = self._routes.get(route)
+        if dev is None:
+            return
+        stats = self._stats[route]
+        now = time.perf_counter()
+        if stats.first is None:
+            stats.first = now
+        stats.last = now
+        stats.packets += 1
+
+        if sequence is not None and stats.sequence is not None:
+            # Differences are taken modulo the sequence range. A small negative
+            # difference (per E1.31, within 20) is a late packet and is dropped.
+            diff = (sequence - stats.sequence) % modulus
+            if diff == 0 or diff > modulus - 20:
+                stats.out_of_order += 1
+                return
+            stats.gaps += diff - 1
+        if sequence is not None:
+            stats.sequence = sequence
+
+        if not dev.Universe.set_values(1, data):
+            stats.duplicates += 1
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        Returns the receive statistics for each mapped universe, keyed by "protocol:universe".
+            packets: packets received
+            packet_rate: packets per second since the first packet
+            duplicates: packets whose slot data did not change anything
+            gaps: packets missed according to the sequence numbers
+            out_of_order: late or repeated packets that were dropped
+        The "malformed" entry counts packets that could not be parsed.
+        """
+        stats = {"malformed": self._malformed}
+        for (protocol, universe), s in self._stats.items():
+            rate = 0.0
+            if s.packets > 1 and s.last > s.first:
+                rate = (s.packets - 1) / (s.last - s.first)
+            stats["{0}:{1}".format(protocol, universe)] = {
+                "packets": s.packets,
+                "packet_rate": rate,
+                "duplicates": s.duplicates,
+                "gaps": s.gaps,
+                "out_of_order": s.out_of_order,
+            }
+        return stats
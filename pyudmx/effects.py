@@ -0,0 +1,365 @@
+# effects.py - Periodic lighting effects for a uDMX universe
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# An effect (Chase, Rainbow, Strobe, Sine) renders the values of a
+# ChannelGroup as a function of its phase, the position 0.0-1.0 within its
+# period. A group is a list of elements, typically fixtures, and each
+# element has the same number of channels, e.g. 1 for dimmers or 3 for RGB.
+# The group is compiled into an index array once, so placing a rendered
+# frame into the universe is a single scatter.
+#
+# Effects are periodic, so the phase is quantized into a fixed number of
+# steps per period and rendered frames are kept in an LRU cache keyed by
+# (effect, parameters, group shape, step). Once a period has been rendered,
+# each frame costs a cache lookup and a scatter.
+#
+# NumPy is used when it is installed. Otherwise the effects are rendered
+# with plain Python, which the cache makes affordable for most shows.
+#
+# Usage example
+#
+# dev = pyudmx.uDMXDevice()
+# dev.open()
+# effects = EffectEngine(dev)
+# dev.start_refresh(rate=44).add_renderer(effects.step)
+# pars = ChannelGroup([[1, 2, 3], [8, 9, 10], [15, 16, 17]]) # three RGB fixtures
+# effects.add(Rainbow(period=4.0), pars)
+# effects.add(Sine(period=2.0), ChannelGroup([7, 14, 21])) # their dimmers
+#
+
+import colorsys
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Sequence, Callable  # support type hinting
+from .universe import DMX_UNIVERSE_SIZE
+
+try:
+    import numpy  # optional, makes rendering much cheaper
+except ImportError:
+    numpy = None
+
+# Phase steps per period. At 44 frames per second a 4 second period
+# has 176 frames, so 256 steps are smooth for most effects.
+DEFAULT_STEPS = 256
+
+# Rendered frames kept in the cache
+DEFAULT_CACHE_SIZE = 4096
+
+
+class ChannelGroup:
+    def __init__(self, elements: Sequence):
+        """
+        :param elements: the channels of each element. Either a list of channel
+            numbers (one channel per element) or a list of equal length channel
+            lists (e.g. [[1, 2, 3], [8, 9, 10]] for two RGB fixtures).
+        """
+        rows = [list(e) if isinstance(e, (list, tuple)) else [e] for e in elements]
+        if not rows:
+            raise ValueError("A channel group needs at least one element")
+        width = len(rows[0])
+        if width == 0 or any(len(r) != width for r in rows):
+            raise ValueError("Every element of a channel group needs the same number of channels")
+        for channel in (c for r in rows for c in r):
+            if channel < 1 or channel > DMX_UNIVERSE_SIZE:
+                raise ValueError("Channel {0} is outside 1-512".format(channel))
+        self.count = len(rows)
+        self.width = width
+        # Zero based universe indices, element by element
+        self.indices = [c - 1 for r in rows for c in r]
+        if numpy is not None:
+            self.indices = numpy.array(self.indices, dtype=numpy.intp)
+
+    def __len__(self) -> int:
+        return self.count
+
+
+def _color(value, width: int) -> tuple:
+    """
+    Expand a value or color tuple to width channels.
+    """
+    if isinstance(value, (list, tuple)):
+        if len(value) != width:
+            raise ValueError("Color {0} does not match the group's {1} channels".format(value, width))
+        return tuple(value)
+    return (value,) * width
+
+
+def _hashable(value):
+    # Colors are part of the cache key
+    return tuple(value) if isinstance(value, list) else value
+
+
+class Effect:
+    """
+    Base class for periodic effects. Subclasses implement render(), and
+    params() if they have parameters other than the period.
+    """
+    def __init__(self, period: float):
+        """
+        :param period: seconds per cycle
+        """
+        if period <= 0:
+            raise ValueError("An effect's period must be positive")
+        self.period = period
+
+    def params(self) -> tuple:
+        """
+        Returns the parameters that affect the rendered frames (the cache key).
+        """
+        return ()
+
+    def render(self, phase: float, count: int, width: int) -> bytes:
+        """
+        Render the values of a group.
+        :param phase: position in the period, 0.0-1.0
+        :param count: number of elements in the group
+        :param width: channels per element
+        :return: count * width values, element by element
+        """
+        raise NotImplementedError()
+
+
+class Sine(Effect):
+    """
+    Every channel of each element follows a sine wave between low and high.
+    The wave is spread along the group so it travels across the elements.
+    """
+    def __init__(self, period: float, low: int = 0, high: int = 255, spread: float = 1.0):
+        super().__init__(period)
+        self.low = low
+        self.high = high
+        self.spread = spread
+
+    def params(self) -> tuple:
+        return self.low, self.high, self.spread
+
+    def render(self, phase: float, count: int, width: int) -> bytes:
+        amplitude = (self.high - self.low) / 2.0
+        if numpy is not None:
+            angle = 2.0 * math.pi * (phase + numpy.arange(count) * (self.spread / count))
+            values = numpy.rint(self.low + amplitude * (1.0 - numpy.cos(angle))).astype(numpy.uint8)
+            return numpy.repeat(values, width).tobytes()
+        values = bytearray()
+        for i in range(count):
+            angle = 2.0 * math.pi * (phase + i * self.spread / count)
+            values.extend((int(round(self.low + amplitude * (1.0 - math.cos(angle)))),) * width)
+        return bytes(values)
+
+
+class Chase(Effect):
+    """
+    A block of size lit elements steps along the group once per period.
+    """
+    def __init__(self, period: float, color=255, background=0, size: int = 1):
+        super().__init__(period)
+        self.color = _hashable(color)
+        self.background = _hashable(background)
+        self.size = size
+
+    def params(self) -> tuple:
+        return self.color, self.background, self.size
+
+    def render(self, phase: float, count: int, width: int) -> bytes:
+        color = _color(self.color, width)
+        background = _color(self.background, width)
+        head = int(phase * count) % count
+        lit = [(head - i) % count for i in range(min(self.size, count))]
+        if numpy is not None:
+            values = numpy.empty((count, width), dtype=numpy.uint8)
+            values[:] = background
+            values[lit] = color
+            return values.tobytes()
+        values = [background] * count
+        for i in lit:
+            values[i] = color
+        return bytes(v for element in values for v in element)
+
+
+class Strobe(Effect):
+    """
+    Every element flashes together, on for the duty fraction of each period.
+    """
+    def __init__(self, period: float, color=255, duty: float = 0.5):
+        super().__init__(period)
+        self.color = _hashable(color)
+        self.duty = duty
+
+    def params(self) -> tuple:
+        return self.color, self.duty
+
+    def render(self, phase: float, count: int, width: int) -> bytes:
+        if phase < self.duty:
+            return bytes(_color(self.color, width)) * count
+        return bytes(count * width)
+
+
+class Rainbow(Effect):
+    """
+    The hue of each RGB element cycles once per period. The rainbow is spread
+    along the group. Elements need 3 channels (red, green, blue).
+    """
+    def __init__(self, period: float, spread: float = 1.0, saturation: float = 1.0, brightness: int = 255):
+        super().__init__(period)
+        self.spread = spread
+        self.saturation = saturation
+        self.brightness = brightness
+
+    def params(self) -> tuple:
+        return self.spread, self.saturation, self.brightness
+
+    def render(self, phase: float, count: int, width: int) -> bytes:
+        if width != 3:
+            raise ValueError("Rainbow needs RGB elements (3 channels), not {0}".format(width))
+        if numpy is not None:
+            # Vectorized HSV to RGB
+            h = ((phase + numpy.arange(count) * (self.spread / count)) % 1.0) * 6.0
+            s = self.saturation
+            v = float(self.brightness)
+            sector = numpy.floor(h).astype(numpy.intp) % 6
+            f = h - numpy.floor(h)
+            p = numpy.full(count, v * (1.0 - s))
+            q = v * (1.0 - s * f)
+            t = v * (1.0 - s * (1.0 - f))
+            vv = numpy.full(count, v)
+            rgb = numpy.stack([
+                numpy.choose(sector, [vv, q, p, p, t, vv]),
+                numpy.choose(sector, [t, vv, vv, q, p, p]),
+                numpy.choose(sector, [p, p, t, vv, vv, q]),
+            ], axis=1)
+            return numpy.rint(rgb).astype(numpy.uint8).tobytes()
+        values = bytearray()
+        for i in range(count):
+            r, g, b = colorsys.hsv_to_rgb((phase + i * self.spread / count) % 1.0, self.saturation, 1.0)
+            values.extend(int(round(c * self.brightness)) for c in (r, g, b))
+        return bytes(values)
+
+
+class _Layer:
+    __slots__ = ("effect", "group", "start", "steps")
+
+    def __init__(self, effect: Effect, group: ChannelGroup, start: float, steps: int):
+        self.effect = effect
+        self.group = group
+        self.start = start
+        self.steps = steps
+
+
+class EffectEngine:
+    def __init__(self, dev, cache_size: int = DEFAULT_CACHE_SIZE, clock: Callable[[], float] = time.perf_counter):
+        """
+        Create an effect engine that renders into a device's universe.
+        :param dev: the uDMXDevice whose Universe receives the effect values
+        :param cache_size: number of rendered frames to keep
+        :param clock: the time source, in seconds. Must match the frame
+            times passed to step(). The default matches the RefreshEngine.
+        """
+        self._dev = dev
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._layers = []
+        self._cache = OrderedDict()
+        self._cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+
+    def add(self, effect: Effect, group: ChannelGroup, steps: int = DEFAULT_STEPS, now: float = None) -> _Layer:
+        """
+        Run an effect on a group of channels. Effects added later are drawn over
+        earlier ones where their groups overlap.
+        :param effect: the effect
+        :param group: the channels it drives
+        :param steps: phase steps per period
+        :param now: effect start time, defaults to the engine's clock
+        :return: a handle for remove()
+        """
+        if now is None:
+            now = self._clock()
+        layer = _Layer(effect, group, now, steps)
+        with self._lock:
+            self._layers.append(layer)
+        return layer
+
+    def remove(self, layer: _Layer):
+        """
+        Stop an effect. Its channels keep their last values.
+        :return: None
+        """
+        with self._lock:
+            if layer in self._layers:
+                self._layers.remove(layer)
+
+    def clear(self):
+        """
+        Stop every effect.
+        :return: None
+        """
+        with self._lock:
+            self._layers = []
+
+    def _frame(self, layer: _Layer, now: float) -> bytes:
+        effect = layer.effect
+        group = layer.group
+        step = int((now - layer.start) / effect.period * layer.steps) % layer.steps
+        key = (type(effect), effect.period, effect.params(), group.count, group.width, layer.steps, step)
+        cache = self._cache
+        values = cache.get(key)
+        if values is not None:
+            cache.move_to_end(key)
+            self.hits += 1
+            return values
+        self.misses += 1
+        values = effect.render(step / layer.steps, group.count, group.width)
+        cache[key] = values
+        if len(cache) > self._cache_size:
+            cache.popitem(last=False)
+        return values
+
+    def _draw(self, now: float):
+        """
+        Draw every effect at a point in time.
+        :return: (indices, values) of the channels the effects drive. Where
+            groups overlap, the effect added last wins.
+        """
+        with self._lock:
+            layers = list(self._layers)
+        if numpy is not None:
+            out = numpy.zeros(DMX_UNIVERSE_SIZE, dtype=numpy.uint8)
+            driven = numpy.zeros(DMX_UNIVERSE_SIZE, dtype=bool)
+            for layer in layers:
+                out[layer.group.indices] = numpy.frombuffer(self._frame(layer, now), dtype=numpy.uint8)
+                driven[layer.group.indices] = True
+            indices = numpy.flatnonzero(driven)
+            return indices, out[indices]
+        values = {}
+        for layer in layers:
+            values.update(zip(layer.group.indices, self._frame(layer, now)))
+        return list(values), bytes(values.values())
+
+    def step(self, now: float = None):
+        """
+        Render the effects into the device's universe. Only channels that change are sent.
+        Call this once per frame, or add it to a RefreshEngine with add_renderer().
+        :param now: frame time, defaults to the engine's clock
+        :return: None
+        """
+        if not self._layers:
+            return
+        if now is None:
+            now = self._clock()
+        # Only the driven channels are written, so writes to other
+        # channels made while rendering are not lost
+        self._dev.Universe.scatter(*self._draw(now))
@@ -0,0 +1,290 @@
+# fade.py - Fade and crossfade engine for a uDMX universe
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# The FadeEngine keeps the fade state per channel rather than per fade:
+# a start value, a delta, a start time, a duration and an easing curve
+# for each of the 512 channels. A new fade takes over its channels from
+# wherever they are at that moment, so any number of fades can overlap.
+# Rendering a frame interpolates every fading channel at once, so the cost
+# of a frame hardly depends on how many fades are running, and writes only
+# those channels into the universe (see Universe.scatter()).
+#
+# NumPy is used when it is installed. Otherwise the engine falls back to
+# the array module and a loop over the channels that are fading.
+#
+# Usage example
+#
+# dev = pyudmx.uDMXDevice()
+# dev.open()
+# fades = FadeEngine(dev)
+# dev.start_refresh(rate=40).add_renderer(fades.step)
+# fades.fade(1, [255, 0, 0], 2.0) # fade channels 1-3 to red over 2 seconds
+# fades.crossfade([0] * 512, 5.0, curve="s-curve")
+#
+
+import threading
+import time
+from array import array
+from typing import Union, List, Callable  # support type hinting
+from .universe import DMX_UNIVERSE_SIZE
+
+try:
+    import numpy  # optional, makes rendering much cheaper
+except ImportError:
+    numpy = None
+
+
+def linear(p):
+    return p
+
+
+def s_curve(p):
+    return p * p * (3.0 - 2.0 * p)
+
+
+def ease_in(p):
+    return p * p
+
+
+def ease_out(p):
+    return p * (2.0 - p)
+
+
+# Easing curves map fade progress 0.0-1.0 to output 0.0-1.0.
+# When NumPy is installed a curve is called with an array of progress
+# values, otherwise with a single float. Custom curves must handle
+# whichever applies (plain arithmetic works for both).
+CURVES = {
+    "linear": linear,
+    "s-curve": s_curve,
+    "ease-in": ease_in,
+    "ease-out": ease_out,
+}
+
+
+class _NumpyFades:
+    """
+    Per channel fade state held in NumPy arrays.
+    """
+    def __init__(self, size: int):
+        self.start = numpy.zeros(size)
+        self.delta = numpy.zeros(size)
+        self.t0 = numpy.zeros(size)
+        self.inv_duration = numpy.zeros(size)
+        self.curve = numpy.zeros(size, dtype=numpy.int16)
+        self.active = numpy.zeros(size, dtype=bool)
+
+    def any_active(self) -> bool:
+        return bool(self.active.any())
+
+    def _progress(self, indices, now: float, curves: List[Callable]):
+        """
+        :return: (progress, outputs) for fading channels
+        """
+        progress = numpy.clip((now - self.t0[indices]) * self.inv_duration[indices], 0.0, 1.0)
+        eased = progress.copy()
+        curve = self.curve[indices]
+        for curve_id in numpy.unique(curve):
+            if curves[curve_id] is not linear:
+                mask = curve == curve_id
+                eased[mask] = curves[curve_id](progress[mask])
+        return progress, self.start[indices] + self.delta[indices] * eased
+
+    def current(self, now: float, index: int, base: bytes, curves: List[Callable]):
+        """
+        :return: the outputs of the channels from index on, one for each base
+        value, with the base value where no fade is running
+        """
+        values = numpy.frombuffer(base, dtype=numpy.uint8).astype(numpy.float64)
+        fading = numpy.flatnonzero(self.active[index:index + len(values)])
+        values[fading] = self._progress(fading + index, now, curves)[1]
+        return values
+
+    def render(self, now: float, curves: List[Callable]):
+        """
+        Retire the fades that have completed.
+        :return: (indices, values) of the channels that are fading
+        """
+        indices = numpy.flatnonzero(self.active)
+        progress, outputs = self._progress(indices, now, curves)
+        self.active[indices[progress >= 1.0]] = False
+        return indices, numpy.rint(outputs).astype(numpy.uint8)
+
+    def set(self, index: int, start, targets: bytes, now: float, duration: float, curve_id: int):
+        end = index + len(targets)
+        self.start[index:end] = start
+        self.delta[index:end] = numpy.frombuffer(targets, dtype=numpy.uint8) - start
+        self.t0[index:end] = now
+        self.inv_duration[index:end] = 1.0 / duration
+        self.curve[index:end] = curve_id
+        self.active[index:end] = True
+
+    def cancel(self, index: int, count: int):
+        self.active[index:index + count] = False
+
+
+class _ArrayFades:
+    """
+    Per channel fade state held in arrays from the array module.
+    Only the channels that are fading are visited.
+    """
+    def __init__(self, size: int):
+        self.start = array("d", [0.0]) * size
+        self.delta = array("d", [0.0]) * size
+        self.t0 = array("d", [0.0]) * size
+        self.inv_duration = array("d", [0.0]) * size
+        self.curve = array("h", [0]) * size
+        self.active = set()
+
+    def any_active(self) -> bool:
+        return len(self.active) > 0
+
+    def _output(self, i: int, now: float, curves: List[Callable]):
+        """
+        :return: (output, done) for fading channel i
+        """
+        p = (now - self.t0[i]) * self.inv_duration[i]
+        done = p >= 1.0
+        if done:
+            p = 1.0
+        elif p < 0.0:
+            p = 0.0
+        return self.start[i] + self.delta[i] * curves[self.curve[i]](p), done
+
+    def current(self, now: float, index: int, base: bytes, curves: List[Callable]):
+        values = array("d", list(base))
+        for n in range(len(values)):
+            if n + index in self.active:
+                values[n] = self._output(n + index, now, curves)[0]
+        return values
+
+    def render(self, now: float, curves: List[Callable]):
+        indices = sorted(self.active)
+        values = bytearray(len(indices))
+        for n, i in enumerate(indices):
+            output, done = self._output(i, now, curves)
+            values[n] = int(round(output))
+            if done:
+                self.active.discard(i)
+        return indices, values
+
+    def set(self, index: int, start, targets: bytes, now: float, duration: float, curve_id: int):
+        for n, target in enumerate(targets):
+            i = index + n
+            self.start[i] = start[n]
+            self.delta[i] = target - start[n]
+            self.t0[i] = now
+            self.inv_duration[i] = 1.0 / duration
+            self.curve[i] = curve_id
+            self.active.add(i)
+
+    def cancel(self, index: int, count: int):
+        self.active.difference_update(range(index, index + count))
+
+
+class FadeEngine:
+    def __init__(self, dev, clock: Callable[[], float] = time.perf_counter):
+        """
+        Create a fade engine that renders into a device's universe.
+        :param dev: the uDMXDevice whose Universe receives the faded values
+        :param clock: the time source, in seconds. Must match the frame
+            times passed to step(). The default matches the RefreshEngine.
+        """
+        self._dev = dev
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._curves = [linear]
+        self._curve_ids = {linear: 0}
+        if numpy is not None:
+            self._fades = _NumpyFades(DMX_UNIVERSE_SIZE)
+        else:
+            self._fades = _ArrayFades(DMX_UNIVERSE_SIZE)
+
+    @property
+    def is_fading(self) -> bool:
+        """
+        Returns True while any fade is running.
+        """
+        return self._fades.any_active()
+
+    def _curve_id(self, curve: Union[str, Callable]) -> int:
+        if not callable(curve):
+            curve = CURVES[curve]
+        curve_id = self._curve_ids.get(curve)
+        if curve_id is None:
+            curve_id = len(self._curves)
+            self._curves.append(curve)
+            self._curve_ids[curve] = curve_id
+        return curve_id
+
+    def fade(self, channel: int, values: Union[List[int], bytearray], duration: float,
+             curve: Union[str, Callable] = "linear", now: float = None):
+        """
+        Fade a range of consecutive channels from their current values to new values.
+        Any fade already running on these channels is replaced, starting
+        from wherever it has got to.
+        :param channel: The starting DMX channel number, 1-512
+        :param values: target values, any sequence of integers 0-255
+        :param duration: fade time in seconds
+        :param curve: an easing curve name from CURVES or a custom curve function
+        :param now: fade start time, defaults to the engine's clock
+        :return: None
+        """
+        targets = bytes(bytearray(values))
+        if channel < 1 or channel + len(targets) - 1 > DMX_UNIVERSE_SIZE:
+            raise ValueError("Channel range {0}-{1} is outside 1-512".format(channel, channel + len(targets) - 1))
+        if now is None:
+            now = self._clock()
+        duration = max(duration, 1e-6)
+        with self._lock:
+            curve_id = self._curve_id(curve)
+            # Start from the current output, which may be part way through a fade
+            base = self._dev.Universe.get_values(channel, len(targets))
+            start = self._fades.current(now, channel - 1, base, self._curves)
+            self._fades.set(channel - 1, start, targets, now, duration, curve_id)
+
+    def crossfade(self, frame: Union[List[int], bytearray], duration: float,
+                  curve: Union[str, Callable] = "linear", now: float = None):
+        """
+        Fade the whole universe to a new frame.
+        :param frame: 512 target values
+        :return: None
+        """
+        self.fade(1, frame, duration, curve=curve, now=now)
+
+    def cancel(self, channel: int = 1, count: int = DMX_UNIVERSE_SIZE):
+        """
+        Stop fading a range of channels. The channels keep their current values.
+        :return: None
+        """
+        with self._lock:
+            self._fades.cancel(channel - 1, count)
+
+    def step(self, now: float = None):
+        """
+        Render the fades at a point in time into the device's universe.
+        Call this once per frame, or add it to a RefreshEngine with add_renderer().
+        :param now: frame time, defaults to the engine's clock
+        :return: None
+        """
+        if not self._fades.any_active():
+            return
+        if now is None:
+            now = self._clock()
+        with self._lock:
+            indices, values = self._fades.render(now, self._curves)
+            # Only the fading channels are written, so writes to other
+            # channels made while rendering are not lost
+            self._dev.Universe.scatter(indices, values)
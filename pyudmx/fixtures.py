@@ -0,0 +1,258 @@
+# fixtures.py - Fixture profiles and patching for a uDMX universe
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# A FixtureProfile names the channels of a type of light, e.g. red, green,
+# blue and dimmer, by their offset from the fixture's start address. A
+# Patch places fixtures at start addresses in the universe.
+#
+# Patch.select() compiles a set of fixtures and attributes into an index
+# array once. Setting the selection is then a single scatter into the
+# universe, however many fixtures it covers, and the universe sends only
+# the channels that changed. Keep selections around
+# rather than selecting again every frame.
+#
+# Usage example
+#
+# dev = pyudmx.uDMXDevice()
+# dev.open()
+# patch = Patch()
+# pars = patch.add_many("par", THINPAR64_7CH, 1, 4) # par1-par4 at 1, 8, 15, 22
+# rgb = patch.select(pars, ("red", "green", "blue"))
+# patch.select(pars, ("dimmer",)).set(dev.Universe, 255)
+# rgb.set(dev.Universe, (255, 0, 0)) # every par red
+# dev.flush()
+#
+
+from typing import List, Dict, Sequence  # support type hinting
+from .universe import DMX_UNIVERSE_SIZE
+
+try:
+    import numpy  # optional, makes scattering values much cheaper
+except ImportError:
+    numpy = None
+
+
+class FixtureProfile:
+    def __init__(self, name: str, attributes: Dict[str, int], footprint: int = None):
+        """
+        :param name: the fixture type
+        :param attributes: attribute name -> channel offset from the start address (0 based)
+        :param footprint: number of channels the fixture occupies, defaults to
+            one more than the highest offset
+        """
+        if not attributes:
+            raise ValueError("A fixture profile needs at least one attribute")
+        self.name = name
+        self.attributes = dict(attributes)
+        if footprint is None:
+            footprint = max(self.attributes.values()) + 1
+        self.footprint = footprint
+
+    def __repr__(self):
+        return "FixtureProfile({0!r}, {1} channels)".format(self.name, self.footprint)
+
+    def offset(self, attribute: str) -> int:
+        """
+        Returns the channel offset of an attribute.
+        """
+        try:
+            return self.attributes[attribute]
+        except KeyError:
+            raise ValueError("{0} has no attribute {1}".format(self.name, attribute)) from None
+
+
+# Venue ThinPar 64 in 7 channel mode. Mode 0 is RGB mode.
+# http://venuelightingeffects.com/wp-content/uploads/manuals/Venue_Thinpar_64_Manual_HR.pdf
+THINPAR64_7CH = FixtureProfile("Venue ThinPar 64 (7 channel)", {
+    "red": 0,
+    "green": 1,
+    "blue": 2,
+    "macro": 3,
+    "strobe": 4,
+    "mode": 5,
+    "dimmer": 6,
+})
+
+# Generic fixtures
+DIMMER = FixtureProfile("Dimmer", {"dimmer": 0})
+RGB = FixtureProfile("RGB", {"red": 0, "green": 1, "blue": 2})
+
+
+class Fixture:
+    """
+    A fixture placed in a patch. Create fixtures with Patch.add().
+    """
+    def __init__(self, name: str, profile: FixtureProfile, address: int):
+        self.name = name
+        self.profile = profile
+        self.address = address
+
+    def __repr__(self):
+        return "Fixture({0!r}, {1!r}, {2})".format(self.name, self.profile.name, self.address)
+
+    def channel(self, attribute: str) -> int:
+        """
+        Returns the DMX channel (1-512) of an attribute.
+        """
+        return self.address + self.profile.offset(attribute)
+
+
+class Selection:
+    """
+    A compiled set of fixture attributes. Create selections with Patch.select().
+    """
+    def __init__(self, fixtures: List[Fixture], attributes: Sequence[str]):
+        self.fixtures = fixtures
+        self.attributes = tuple(attributes)
+        self.count = len(fixtures)
+        self.width = len(self.attributes)
+        # Zero based universe indices, fixture by fixture
+        rows = [[f.channel(a) - 1 for a in self.attributes] for f in fixtures]
+        if numpy is not None:
+            self.indices = numpy.array(rows, dtype=numpy.intp).reshape(self.count, self.width)
+        else:
+            self.indices = [i for row in rows for i in row]
+
+    def __len__(self) -> int:
+        return self.count
+
+    def channels(self) -> List[List[int]]:
+        """
+        Returns the channels of each fixture, e.g. for an effects.ChannelGroup.
+        """
+        return [[f.channel(a) for a in self.attributes] for f in self.fixtures]
+
+    def group(self):
+        """
+        Returns the selection as an effects.ChannelGroup, one element per fixture.
+        """
+        from .effects import ChannelGroup
+        return ChannelGroup(self.channels())
+
+    def _values(self, values):
+        """
+        Returns one value for each index, see set() for the values.
+        """
+        if numpy is not None:
+            values = numpy.asarray(values)
+            if values.size and (values.min() < 0 or values.max() > 255):
+                raise ValueError("Values must be 0-255")
+            return numpy.broadcast_to(values, self.indices.shape)
+
+        if isinstance(values, int):
+            flat = [values] * (self.count * self.width)
+        elif len(values) == self.width and not isinstance(values[0], (list, tuple)):
+            flat = list(values) * self.count
+        else:
+            try:
+                flat = [v for row in values for v in row]
+            except TypeError:
+                flat = []
+        if len(flat) != len(self.indices):
+            raise ValueError("Expected {0} rows of {1} values".format(self.count, self.width))
+        # bytearray raises ValueError for values outside 0-255
+        return bytearray(flat)
+
+    def set(self, universe, values) -> bool:
+        """
+        Write values into a universe with a single scatter (see Universe.scatter()).
+        Only the selected channels are written.
+        :param universe: a Universe, e.g. uDMXDevice.Universe
+        :param values: one value for every attribute of every fixture, one value per
+            attribute (e.g. an RGB tuple) for every fixture, or a value for each
+            attribute of each fixture (count rows of width values)
+        :return: True if any channel changed
+        """
+        return universe.scatter(self.indices, self._values(values))
+
+
+class Patch:
+    def __init__(self):
+        # Fixture name -> Fixture, in patch order
+        self._fixtures = {}
+        # Channel index -> fixture name, for overlap checks
+        self._used = [None] * DMX_UNIVERSE_SIZE
+
+    @property
+    def fixtures(self) -> List[Fixture]:
+        """
+        Returns the patched fixtures in the order they were added.
+        """
+        return list(self._fixtures.values())
+
+    def fixture(self, name: str) -> Fixture:
+        """
+        Returns a patched fixture by name.
+        """
+        return self._fixtures[name]
+
+    def add(self, name: str, profile: FixtureProfile, address: int) -> Fixture:
+        """
+        Place a fixture at a start address.
+        :param name: a unique name for the fixture
+        :param profile: the fixture's profile
+        :param address: the fixture's start address, 1-512
+        :return: the Fixture
+        """
+        if name in self._fixtures:
+            raise ValueError("Fixture {0} is already patched".format(name))
+        end = address + profile.footprint - 1
+        if address < 1 or end > DMX_UNIVERSE_SIZE:
+            raise ValueError("Channel range {0}-{1} is outside 1-512".format(address, end))
+        for i in range(address - 1, end):
+            if self._used[i] is not None:
+                raise ValueError("Channel {0} is already used by {1}".format(i + 1, self._used[i]))
+        for i in range(address - 1, end):
+            self._used[i] = name
+        fixture = Fixture(name, profile, address)
+        self._fixtures[name] = fixture
+        return fixture
+
+    def add_many(self, prefix: str, profile: FixtureProfile, address: int, count: int,
+                 spacing: int = None) -> List[Fixture]:
+        """
+        Place several fixtures of one type, named prefix1, prefix2 and so on.
+        :param address: start address of the first fixture
+        :param count: number of fixtures
+        :param spacing: channels from one start address to the next, defaults to the footprint
+        :return: the Fixtures
+        """
+        if spacing is None:
+            spacing = profile.footprint
+        return [self.add("{0}{1}".format(prefix, i + 1), profile, address + i * spacing) for i in range(count)]
+
+    def remove(self, name: str):
+        """
+        Remove a fixture from the patch.
+        Selections that include it keep addressing its channels.
+        :return: None
+        """
+        fixture = self._fixtures.pop(name)
+        for i in range(fixture.address - 1, fixture.address - 1 + fixture.profile.footprint):
+            self._used[i] = None
+
+    def select(self, fixtures: Sequence = None, attributes: Sequence[str] = ()) -> Selection:
+        """
+        Compile a selection of fixture attributes.
+        :param fixtures: Fixtures or fixture names, defaults to every patched fixture
+        :param attributes: the attribute names to set, in the order values will be given
+        :return: the Selection
+        """
+        if fixtures is None:
+            fixtures = self.fixtures
+        resolved = [f if isinstance(f, Fixture) else self._fixtures[f] for f in fixtures]
+        if not attributes:
+            raise ValueError("Select at least one attribute")
+        return Selection(resolved, attributes)
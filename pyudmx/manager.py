@@ -0,0 +1,181 @@
+# manager.py - Drive several uDMX interfaces in parallel
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# Most uDMX interfaces do not have a unique serial number (see the
+# Multiple uDMX Issues section of Readme.md), so the manager identifies each
+# interface by its bus/port path. The path stays the same as long as the
+# interface stays plugged into the same port.
+#
+# Each interface runs its own refresh engine (output thread). The USB
+# transfers release the GIL, so the interfaces are driven in parallel.
+#
+# Logical addresses are numbered from 1. By default the interfaces are laid
+# out one universe after another in port path order: addresses 1-512 go to
+# the first interface, 513-1024 to the second and so on. The routing table
+# can be changed with route().
+#
+# Usage example
+#
+# mgr = uDMXManager()
+# mgr.open()
+# mgr.start(rate=40)
+# mgr.set_value(513, 255) # channel 1 of the second interface
+# mgr.close()
+#
+
+from typing import Union, List, Dict, Tuple  # support type hinting
+from .pyudmx import uDMXDevice, find_all, port_path
+from .universe import DMX_UNIVERSE_SIZE, byte_values
+
+
+class uDMXManager:
+    def __init__(self):
+        # universe ID (port path) -> uDMXDevice, in port path order
+        self._devices = {}
+        # logical address -> (universe ID, channel)
+        self._routes = {}
+
+    @property
+    def universe_ids(self) -> List[str]:
+        """
+        Returns the universe IDs (bus/port paths) of the open interfaces.
+        """
+        return list(self._devices.keys())
+
+    @property
+    def routes(self) -> Dict[int, Tuple[str, int]]:
+        """
+        Returns the routing table, logical address -> (universe ID, channel).
+        """
+        return self._routes
+
+    def device(self, universe_id: str) -> uDMXDevice:
+        """
+        Returns the uDMXDevice for a universe ID.
+        """
+        return self._devices[universe_id]
+
+    def open(self, vendor_id: int = 0x16c0, product_id: int = 0x5dc, backend=None) -> int:
+        """
+        Open every uDMX interface that matches the search criteria and
+        build the default routing table.
+        :param vendor_id:
+        :param product_id:
+        :param backend: the device backend, defaults to pyusb
+        :return: the number of interfaces opened
+        """
+        self.close()
+        for usb_dev in find_all(vendor_id, product_id, backend=backend):
+            dev = uDMXDevice()
+            dev.attach(usb_dev, backend=backend)
+            self._devices[port_path(usb_dev)] = dev
+
+        address = 1
+        for universe_id in self._devices:
+            self.route(address, universe_id, 1, DMX_UNIVERSE_SIZE)
+            address += DMX_UNIVERSE_SIZE
+        return len(self._devices)
+
+    def close(self):
+        """
+        Stop all output threads and close every interface.
+        :return: None
+        """
+        for dev in self._devices.values():
+            dev.close()
+        self._devices = {}
+        self._routes = {}
+
+    def route(self, address: int, universe_id: str, channel: int = 1, count: int = 1):
+        """
+        Route a range of logical addresses to consecutive channels of an interface.
+        :param address: first logical address
+        :param universe_id: the interface's universe ID (bus/port path)
+        :param channel: first DMX channel on the interface, 1-512
+        :param count: number of addresses to route
+        :return: None
+        """
+        if universe_id not in self._devices:
+            raise ValueError("Unknown universe ID {0}".format(universe_id))
+        if channel < 1 or channel + count - 1 > DMX_UNIVERSE_SIZE:
+            raise ValueError("Channel range {0}-{1} is outside 1-512".format(channel, channel + count - 1))
+        for i in range(count):
+            self._routes[address + i] = (universe_id, channel + i)
+
+    def start(self, rate: float = 40.0, full_frames: bool = False):
+        """
+        Start one output thread per interface.
+        See uDMXDevice.start_refresh() for the parameters.
+        :return: None
+        """
+        for dev in self._devices.values():
+            dev.start_refresh(rate=rate, full_frames=full_frames)
+
+    def stop(self):
+        """
+        Stop all output threads.
+        :return: None
+        """
+        for dev in self._devices.values():
+            dev.stop_refresh()
+
+    def flush(self) -> int:
+        """
+        Send the changed channels of every interface from the calling thread.
+        Not needed while the output threads are running.
+        :return: number of values actually sent
+        """
+        return sum(dev.flush() for dev in self._devices.values())
+
+    def set_value(self, address: int, value: int):
+        """
+        Set the value of a logical address.
+        :param address: logical address
+        :param value: Value, 0-255
+        :return: None
+        """
+        universe_id, channel = self._routes[address]
+        self._devices[universe_id].Universe.set_value(channel, value)
+
+    def set_values(self, address: int, values: Union[List[int], bytearray]):
+        """
+        Set the values of consecutive logical addresses. Addresses that route to
+        consecutive channels of the same interface are written as one range.
+        :param address: first logical address
+        :param values: any sequence of integer values. Each value 0-255.
+        :return: None
+        """
+        # Slices of the view are copied straight into each universe
+        values = memoryview(byte_values(values))
+        routes = self._routes
+        n = len(values)
+        start = 0
+        while start < n:
+            universe_id, channel = routes[address + start]
+            end = start + 1
+            while end < n and routes.get(address + end) == (universe_id, channel + end - start):
+                end += 1
+            self._devices[universe_id].Universe.set_values(channel, values[start:end])
+            start = end
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        Returns the output thread statistics for each running interface, keyed by universe ID.
+        """
+        stats = {}
+        for universe_id, dev in self._devices.items():
+            if dev.Refresh is not None:
+                stats[universe_id] = dev.Refresh.stats()
+        return stats
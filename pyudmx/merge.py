@@ -0,0 +1,437 @@
+# merge.py - Merge several sources into one uDMX universe
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# The MergeEngine lets several programs (or threads, or network streams)
+# drive the same interface. Each source owns a 512 slot buffer with a
+# priority and an optional timeout. Once per frame the sources are merged
+# channel by channel:
+#
+#   - only the highest priority sources that have set a channel take part
+#   - HTP channels take the highest value among them
+#   - LTP channels take the value that was set most recently
+#
+# A source that has not been updated within its timeout is left out of the
+# merge, as if it had been released, until it is written again.
+#
+# Only the channels some source has set are written to the universe, so
+# channels the merge does not drive can be set by other renderers. A
+# channel no source drives any more goes back to 0 once.
+#
+# With NumPy the source buffers are rows of one array and a frame is merged
+# with a handful of elementwise operations, so the merge cost barely grows
+# with the number of sources. Without NumPy the merge visits each channel
+# a source has set.
+#
+# Usage example
+#
+# dev = pyudmx.uDMXDevice()
+# dev.open()
+# merge = MergeEngine(dev)
+# dev.start_refresh(rate=40).add_renderer(merge.step)
+# console = merge.add_source("console", priority=100)
+# effects = merge.add_source("effects", priority=100, timeout=2.5)
+# console.set_values(1, [255, 0, 0])
+# effects.set_value(1, 128) # HTP: channel 1 stays at 255
+#
+
+import threading
+import time
+from array import array
+from typing import Union, List, Dict, Callable  # support type hinting
+from .universe import DMX_UNIVERSE_SIZE
+
+try:
+    import numpy  # optional, makes merging much cheaper
+except ImportError:
+    numpy = None
+
+HTP = "htp"
+LTP = "ltp"
+
+
+class _NumpyMerge:
+    """
+    Source buffers held as rows of NumPy arrays. Rows 0 to count-1 are in use.
+    """
+    def __init__(self, size: int, capacity: int = 16):
+        self.size = size
+        self.count = 0
+        self.data = numpy.zeros((capacity, size), dtype=numpy.uint8)
+        # Write stamp per channel, 0 where the source has never set the channel
+        self.stamp = numpy.zeros((capacity, size), dtype=numpy.int64)
+        self.priority = numpy.zeros(capacity, dtype=numpy.int32)
+        self.ltp = numpy.zeros(size, dtype=bool)
+        self._channels = numpy.arange(size)
+
+    def add(self, priority: int) -> int:
+        if self.count == len(self.priority):
+            capacity = 2 * self.count
+            self.data = numpy.resize(self.data, (capacity, self.size))
+            self.stamp = numpy.resize(self.stamp, (capacity, self.size))
+            self.priority = numpy.resize(self.priority, capacity)
+        row = self.count
+        self.data[row] = 0
+        self.stamp[row] = 0
+        self.priority[row] = priority
+        self.count += 1
+        return row
+
+    def remove(self, row: int) -> int:
+        """
+        Free a row by moving the last row into it.
+        :return: the old index of the row that moved
+        """
+        last = self.count - 1
+        if row != last:
+            self.data[row] = self.data[last]
+            self.stamp[row] = self.stamp[last]
+            self.priority[row] = self.priority[last]
+        self.count = last
+        return last
+
+    def write(self, row: int, index: int, values: bytes, stamp: int):
+        end = index + len(values)
+        self.data[row, index:end] = numpy.frombuffer(values, dtype=numpy.uint8)
+        self.stamp[row, index:end] = stamp
+
+    def set_priority(self, row: int, priority: int):
+        self.priority[row] = priority
+
+    def set_mode(self, index: int, count: int, ltp: bool):
+        self.ltp[index:index + count] = ltp
+
+    def no_channels(self):
+        return numpy.zeros(self.size, dtype=bool)
+
+    def select(self, frame: bytes, channels):
+        indices = numpy.flatnonzero(channels)
+        return indices, numpy.frombuffer(frame, dtype=numpy.uint8)[indices]
+
+    def merge(self, live: List[bool]):
+        """
+        Merge the rows whose entry in live is True.
+        :return: the merged frame and the mask of channels a merged row has set
+        """
+        n = self.count
+        data = self.data[:n]
+        stamp = self.stamp[:n]
+        written = (stamp > 0) & numpy.array(live, dtype=bool)[:, None]
+        channels = written.any(axis=0)
+        if not channels.any():
+            return bytes(self.size), channels
+        # Effective priority per channel, -1 where the source has not set it
+        priority = numpy.where(written, self.priority[:n, None], -1)
+        eligible = written & (priority == priority.max(axis=0))
+        out = numpy.where(eligible, data, 0).max(axis=0)
+        if self.ltp.any():
+            latest = numpy.where(eligible, stamp, 0).argmax(axis=0)
+            out = numpy.where(self.ltp, data[latest, self._channels], out)
+        return out.astype(numpy.uint8).tobytes(), channels
+
+
+class _ArrayMerge:
+    """
+    Source buffers held in bytearrays with the set channels tracked per source.
+    """
+    def __init__(self, size: int):
+        self.size = size
+        self.count = 0
+        self.data = []
+        self.stamp = []
+        self.written = []
+        self.priority = []
+        self.ltp = bytearray(size)
+
+    def add(self, priority: int) -> int:
+        self.data.append(bytearray(self.size))
+        self.stamp.append(array("q", [0]) * self.size)
+        self.written.append(set())
+        self.priority.append(priority)
+        self.count += 1
+        return self.count - 1
+
+    def remove(self, row: int) -> int:
+        last = self.count - 1
+        for rows in (self.data, self.stamp, self.written, self.priority):
+            rows[row] = rows[last]
+            rows.pop()
+        self.count = last
+        return last
+
+    def write(self, row: int, index: int, values: bytes, stamp: int):
+        end = index + len(values)
+        self.data[row][index:end] = values
+        stamps = self.stamp[row]
+        for i in range(index, end):
+            stamps[i] = stamp
+        self.written[row].update(range(index, end))
+
+    def set_priority(self, row: int, priority: int):
+        self.priority[row] = priority
+
+    def set_mode(self, index: int, count: int, ltp: bool):
+        self.ltp[index:index + count] = (b"\x01" if ltp else b"\x00") * count
+
+    def no_channels(self):
+        return set()
+
+    def select(self, frame: bytes, channels):
+        indices = sorted(channels)
+        return indices, [frame[i] for i in indices]
+
+    def merge(self, live: List[bool]):
+        """
+        Merge the rows whose entry in live is True.
+        :return: the merged frame and the set of channels a merged row has set
+        """
+        size = self.size
+        out = bytearray(size)
+        best_priority = [-1] * size
+        best_stamp = [0] * size
+        ltp = self.ltp
+        channels = set()
+        for data, stamps, written, priority, merged in zip(self.data, self.stamp, self.written, self.priority,
+                                                           live):
+            if not merged:
+                continue
+            channels.update(written)
+            for i in written:
+                if priority > best_priority[i]:
+                    best_priority[i] = priority
+                    best_stamp[i] = stamps[i]
+                    out[i] = data[i]
+                elif priority == best_priority[i]:
+                    if ltp[i]:
+                        if stamps[i] > best_stamp[i]:
+                            best_stamp[i] = stamps[i]
+                            out[i] = data[i]
+                    elif data[i] > out[i]:
+                        out[i] = data[i]
+        return bytes(out), channels
+
+
+class MergeSource:
+    """
+    One input to a MergeEngine. Create sources with MergeEngine.add_source().
+    """
+    def __init__(self, engine, name: str, priority: int, timeout: float):
+        self._engine = engine
+        self.name = name
+        self.priority = priority
+        self.timeout = timeout
+        self.last_update = None
+        self.timed_out = False
+        self._row = None
+
+    @property
+    def active(self) -> bool:
+        """
+        Returns True while the source takes part in the merge: it has not been
+        released and, if it has a timeout, it has been updated within it.
+        """
+        return self._row is not None and not self.timed_out
+
+    def set_value(self, channel: int, value: int):
+        """
+        Set the value of a single channel.
+        :param channel: DMX channel number, 1-512
+        :param value: Value, 0-255
+        :return: None
+        """
+        self._engine._write(self, channel, bytes((value,)))
+
+    def set_values(self, channel: int, values: Union[List[int], bytes, bytearray]):
+        """
+        Set a range of consecutive channels.
+        :param channel: The starting DMX channel number, 1-512
+        :param values: any sequence of integer values. Each value 0-255.
+        :return: None
+        """
+        if not isinstance(values, (bytes, bytearray)):
+            values = bytearray(values)
+        self._engine._write(self, channel, bytes(values))
+
+    def set_priority(self, priority: int):
+        """
+        Change the priority of the source.
+        :return: None
+        """
+        self._engine._set_priority(self, priority)
+
+    def release(self):
+        """
+        Remove the source from the merge. Its channels fall back to the other sources.
+        :return: None
+        """
+        self._engine.remove_source(self)
+
+
+class MergeEngine:
+    def __init__(self, dev, mode: str = HTP, clock: Callable[[], float] = time.perf_counter):
+        """
+        Create a merge engine that renders into a device's universe.
+        :param dev: the uDMXDevice whose Universe receives the merged values
+        :param mode: the merge mode of every channel, HTP or LTP. Change it per
+            channel with set_mode().
+        :param clock: the time source for source timeouts, in seconds. Must match
+            the frame times passed to step(). The default matches the RefreshEngine.
+        """
+        self._dev = dev
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._sources = []
+        self._stamp = 0
+        if numpy is not None:
+            self._merge = _NumpyMerge(DMX_UNIVERSE_SIZE)
+        else:
+            self._merge = _ArrayMerge(DMX_UNIVERSE_SIZE)
+        # The channels step() wrote in the last frame
+        self._channels = self._merge.no_channels()
+        self.set_mode(1, DMX_UNIVERSE_SIZE, mode)
+
+    @property
+    def sources(self) -> List[MergeSource]:
+        """
+        Returns the sources that have been added and not released, including
+        those that have timed out.
+        """
+        return list(self._sources)
+
+    def add_source(self, name: str, priority: int = 100, timeout: float = None) -> MergeSource:
+        """
+        Add a source. A new source has not set any channels.
+        :param name: a name for the source
+        :param priority: sources with a higher priority override lower ones (sACN uses 0-200)
+        :param timeout: leave the source out of the merge when it has not been updated
+            for this many seconds, until it is written again. None keeps it in the
+            merge until it is released.
+        :return: the MergeSource to write to
+        """
+        source = MergeSource(self, name, priority, timeout)
+        with self._lock:
+            source._row = self._merge.add(priority)
+            source.last_update = self._clock()
+            self._sources.append(source)
+        return source
+
+    def remove_source(self, source: MergeSource):
+        """
+        Remove a source. Does nothing if it has already been removed.
+        :return: None
+        """
+        with self._lock:
+            self._remove(source)
+
+    def _remove(self, source: MergeSource):
+        if source._row is None:
+            return
+        moved = self._merge.remove(source._row)
+        for other in self._sources:
+            if other._row == moved:
+                other._row = source._row
+                break
+        source._row = None
+        self._sources.remove(source)
+
+    def _write(self, source: MergeSource, channel: int, values: bytes):
+        n = len(values)
+        if n == 0:
+            return
+        if channel < 1 or channel + n - 1 > DMX_UNIVERSE_SIZE:
+            raise ValueError("Channel range {0}-{1} is outside 1-512".format(channel, channel + n - 1))
+        with self._lock:
+            if source._row is None:
+                raise ValueError("Merge source {0} has been released".format(source.name))
+            self._stamp += 1
+            self._merge.write(source._row, channel - 1, values, self._stamp)
+            source.last_update = self._clock()
+            source.timed_out = False
+
+    def _set_priority(self, source: MergeSource, priority: int):
+        with self._lock:
+            source.priority = priority
+            if source._row is not None:
+                self._merge.set_priority(source._row, priority)
+
+    def set_mode(self, channel: int, count: int, mode: str):
+        """
+        Set the merge mode of a range of channels.
+        :param channel: The starting DMX channel number, 1-512
+        :param count: number of channels
+        :param mode: HTP or LTP
+        :return: None
+        """
+        if mode not in (HTP, LTP):
+            raise ValueError("Unknown merge mode {0}".format(mode))
+        if channel < 1 or channel + count - 1 > DMX_UNIVERSE_SIZE:
+            raise ValueError("Channel range {0}-{1} is outside 1-512".format(channel, channel + count - 1))
+        with self._lock:
+            self._merge.set_mode(channel - 1, count, mode == LTP)
+
+    def expire(self, now: float = None) -> List[MergeSource]:
+        """
+        Leave the sources whose timeout has passed out of the merge. They stay
+        registered and rejoin the merge the next time they are written.
+        :param now: the current time, defaults to the engine's clock
+        :return: the sources that have timed out
+        """
+        if now is None:
+            now = self._clock()
+        with self._lock:
+            stale = []
+            for source in self._sources:
+                source.timed_out = source.timeout is not None and now - source.last_update > source.timeout
+                if source.timed_out:
+                    stale.append(source)
+        return stale
+
+    def _merge_frame(self, now: float):
+        self.expire(now)
+        with self._lock:
+            live = [True] * self._merge.count
+            for source in self._sources:
+                live[source._row] = not source.timed_out
+            return self._merge.merge(live)
+
+    def merge(self, now: float = None) -> bytes:
+        """
+        Merge the sources that have not timed out.
+        :param now: frame time, defaults to the engine's clock
+        :return: the merged 512 channel frame, 0 where no source has set a channel
+        """
+        return self._merge_frame(now)[0]
+
+    def step(self, now: float = None):
+        """
+        Merge the sources into the device's universe. Only the channels a source
+        has set are written, plus those that lost their last source since the
+        previous frame (they go to 0), and only channels that change are sent.
+        Call this once per frame, or add it to a RefreshEngine with add_renderer().
+        :param now: frame time, defaults to the engine's clock
+        :return: None
+        """
+        frame, channels = self._merge_frame(now)
+        self._dev.Universe.scatter(*self._merge.select(frame, channels | self._channels))
+        self._channels = channels
+
+    def stats(self) -> Dict[str, dict]:
+        """
+        Returns the sources keyed by name, with their priority, seconds since the last
+        update and whether they are active (have not timed out).
+        """
+        now = self._clock()
+        with self._lock:
+            return {s.name: {"priority": s.priority, "age": now - s.last_update, "active": s.active}
+                    for s in self._sources}
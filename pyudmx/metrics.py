@@ -0,0 +1,200 @@
+# metrics.py - Transfer metrics for a uDMX interface
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# TransferMetrics counts the transfers made by a uDMXDevice and keeps
+# latency histograms for single and multi-value transfers. Recording a
+# transfer is a couple of additions and a bisect, so it is cheap enough
+# to leave on in production. When metrics are not enabled on a device
+# the only cost is a test for None.
+#
+# Usage example
+#
+# dev = pyudmx.uDMXDevice()
+# dev.open()
+# dev.enable_metrics()
+# dev.start_metrics_server(9109) # Prometheus text at http://127.0.0.1:9109/metrics
+# ...
+# print(dev.stats())
+#
+
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+
+# Histogram bucket upper bounds in seconds. A low speed control transfer
+# takes anywhere from about a millisecond (single value) to tens of
+# milliseconds (a full universe).
+LATENCY_BUCKETS = (0.0005, 0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.25, 1.0, float("inf"))
+
+COMMANDS = ("single", "multi")
+
+
+class TransferMetrics:
+    def __init__(self, window: int = 128):
+        """
+        :param window: number of recent frames used to compute frames per second
+        """
+        self.transfers = [0, 0]
+        self.bytes = [0, 0]
+        self.latency_sum = [0.0, 0.0]
+        self.latency_buckets = [[0] * len(LATENCY_BUCKETS), [0] * len(LATENCY_BUCKETS)]
+        self._frame_times = deque(maxlen=window)
+
+    def record(self, multi: bool, nbytes: int, latency: float):
+        """
+        Record a successful transfer.
+        :param multi: True for a multi-value transfer, False for a single value transfer
+        :param nbytes: number of values transferred
+        :param latency: transfer time in seconds
+        """
+        i = 1 if multi else 0
+        self.transfers[i] += 1
+        self.bytes[i] += nbytes
+        self.latency_sum[i] += latency
+        self.latency_buckets[i][bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def record_frame(self):
+        """
+        Record that a frame was sent.
+        """
+        self._frame_times.append(time.perf_counter())
+
+    def fps(self) -> float:
+        """
+        Returns the frame rate over the recent window.
+        """
+        times = list(self._frame_times)
+        if len(times) > 1 and times[-1] > times[0]:
+            return (len(times) - 1) / (times[-1] - times[0])
+        return 0.0
+
+    def snapshot(self) -> dict:
+        """
+        Returns the metrics as a dictionary.
+        """
+        latency = {}
+        for i, command in enumerate(COMMANDS):
+            count = self.transfers[i]
+            latency[command] = {
+                "count": count,
+                "sum": self.latency_sum[i],
+                "mean": self.latency_sum[i] / count if count else 0.0,
+                "buckets": list(zip(LATENCY_BUCKETS, self.latency_buckets[i])),
+            }
+        return {
+            "transfers": dict(zip(COMMANDS, self.transfers)),
+            "bytes": dict(zip(COMMANDS, self.bytes)),
+            "latency": latency,
+            "fps": self.fps(),
+        }
+
+
+def format_prometheus(stats: dict, labels: str = "") -> str:
+    """
+    Format a uDMXDevice.stats() snapshot in the Prometheus text exposition format.
+    :param stats: the snapshot
+    :param labels: extra labels added to every sample, e.g. 'device="1-1.4"'
+    :return: the text
+    """
+    def label_set(*pairs):
+        items = [p for p in (labels,) + pairs if p]
+        return "{" + ",".join(items) + "}" if items else ""
+
+    lines = []
+
+    def metric(name, kind, help_text):
+        lines.append("# HELP {0} {1}".format(name, help_text))
+        lines.append("# TYPE {0} {1}".format(name, kind))
+
+    metric("udmx_transfer_errors_total", "counter", "Failed transfer attempts by error class.")
+    for kind, count in sorted(stats["errors"].items()):
+        lines.append("udmx_transfer_errors_total{0} {1}".format(label_set('class="{0}"'.format(kind)), count))
+    metric("udmx_transfer_retries_total", "counter", "Transfer retry attempts.")
+    lines.append("udmx_transfer_retries_total{0} {1}".format(label_set(), stats["retries"]))
+    metric("udmx_transfers_dropped_total", "counter", "Transfers abandoned to meet a frame deadline.")
+    lines.append("udmx_transfers_dropped_total{0} {1}".format(label_set(), stats["dropped"]))
+
+    if "latency" in stats:
+        metric("udmx_transfers_total", "counter", "Successful transfers.")
+        for command, count in stats["transfers"].items():
+            lines.append("udmx_transfers_total{0} {1}".format(label_set('command="{0}"'.format(command)), count))
+        metric("udmx_bytes_total", "counter", "Channel values transferred.")
+        for command, count in stats["bytes"].items():
+            lines.append("udmx_bytes_total{0} {1}".format(label_set('command="{0}"'.format(command)), count))
+        metric("udmx_transfer_latency_seconds", "histogram", "Transfer latency.")
+        for command, latency in stats["latency"].items():
+            cmd_label = 'command="{0}"'.format(command)
+            cumulative = 0
+            for bound, count in latency["buckets"]:
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append("udmx_transfer_latency_seconds_bucket{0} {1}".format(
+                    label_set(cmd_label, 'le="{0}"'.format(le)), cumulative))
+            lines.append("udmx_transfer_latency_seconds_sum{0} {1}".format(label_set(cmd_label), latency["sum"]))
+            lines.append("udmx_transfer_latency_seconds_count{0} {1}".format(label_set(cmd_label), latency["count"]))
+        metric("udmx_frames_per_second", "gauge", "Recent frame rate.")
+        lines.append("udmx_frames_per_second{0} {1}".format(label_set(), stats["fps"]))
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Serves a device's stats() in the Prometheus text format at /metrics.
+    """
+    def __init__(self, dev, port: int, host: str = "127.0.0.1"):
+        """
+        :param dev: the uDMXDevice to report on
+        :param port: TCP port to listen on
+        :param host: address to listen on. The default only accepts local connections.
+        """
+        # Imported here so programs that never serve metrics do not pay for loading it
+        from http.server import HTTPServer, BaseHTTPRequestHandler
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/metrics":
+                    self.send_error(404)
+                    return
+                body = format_prometheus(dev.stats()).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # Keep scrapes out of the application's output
+                pass
+
+        self._server = HTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name="uDMX-metrics", daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self) -> int:
+        """
+        Returns the port the server is listening on.
+        """
+        return self._server.server_address[1]
+
+    def close(self):
+        """
+        Stop the server.
+        :return: None
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
@@ -0,0 +1,335 @@
+# osc.py - Control a uDMX universe with OSC over UDP
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# The OSCServer is an asyncio datagram endpoint that maps OSC 1.0 messages
+# onto the universe of a uDMXDevice.
+#
+#   /dmx/<channel> value ...       set channels from channel on
+#   /dmx/<alias> value ...         the same, with a channel alias (e.g. from .uDMXrc)
+#   /dmx/range/<channel> blob      set consecutive channels from a blob of bytes
+#
+# Integer values are 0-255. Float values are 0.0-1.0, as sent by most
+# faders, and are scaled to 0-255. True and False are 255 and 0.
+#
+# Each packet is written to the universe as it arrives, with no queue in
+# between. All the messages of a bundle are written at once, so they go
+# out in the same frame. Bundle time tags are ignored. The device's
+# refresh engine sends the changed channels at its frame rate, so however
+# many messages arrive within a frame (e.g. a fader sweep) they cost one
+# flush. Messages to other addresses are counted and ignored.
+#
+# Usage example
+#
+# dev = pyudmx.uDMXDevice()
+# dev.open()
+# server = OSCServer(dev, port=8000, aliases={"red": 1})
+# await server.start()
+# ...
+# server.close()
+#
+
+import asyncio
+import socket
+import struct
+from typing import Dict, List, Tuple  # support type hinting
+
+# TouchOSC and many other controllers send to port 8000 by default
+OSC_PORT = 8000
+
+BUNDLE_ID = b"#bundle\x00"
+
+_int32 = struct.Struct(">i")
+_float32 = struct.Struct(">f")
+_int64 = struct.Struct(">q")
+_float64 = struct.Struct(">d")
+
+
+def _read_string(data: bytes, pos: int) -> Tuple[str, int]:
+    """
+    Read a null terminated, 4 byte aligned OSC string.
+    :return: (string, position after it)
+    """
+    end = data.find(b"\x00", pos)
+    if end < 0:
+        raise ValueError("Unterminated OSC string")
+    return data[pos:end].decode("ascii", "replace"), (end + 4) & ~3
+
+
+def _read_arguments(data: bytes, pos: int, tags: str) -> list:
+    args = []
+    for tag in tags:
+        if tag == "i":
+            args.append(_int32.unpack_from(data, pos)[0])
+            pos += 4
+        elif tag == "f":
+            args.append(_float32.unpack_from(data, pos)[0])
+            pos += 4
+        elif tag in "sS":
+            value, pos = _read_string(data, pos)
+            args.append(value)
+        elif tag == "b":
+            size = _int32.unpack_from(data, pos)[0]
+            pos += 4
+            if size < 0 or pos + size > len(data):
+                raise ValueError("OSC blob runs past the end of the packet")
+            args.append(data[pos:pos + size])
+            pos = (pos + size + 3) & ~3
+        elif tag == "h":
+            args.append(_int64.unpack_from(data, pos)[0])
+            pos += 8
+        elif tag == "d":
+            args.append(_float64.unpack_from(data, pos)[0])
+            pos += 8
+        elif tag == "T":
+            args.append(True)
+        elif tag == "F":
+            args.append(False)
+        elif tag in "NI[]":
+            continue
+        elif tag in "crmt":
+            # char, RGBA color, MIDI message and time tag have no DMX meaning
+            pos += 8 if tag == "t" else 4
+        else:
+            raise ValueError("Unknown OSC type tag {0}".format(tag))
+    return args
+
+
+def parse_message(data: bytes) -> Tuple[str, list]:
+    """
+    Parse an OSC message.
+    :return: (address, arguments)
+    """
+    try:
+        address, pos = _read_string(data, 0)
+        if pos >= len(data):
+            return address, []
+        tags, pos = _read_string(data, pos)
+        if not tags.startswith(","):
+            raise ValueError("OSC type tags missing")
+        return address, _read_arguments(data, pos, tags[1:])
+    except struct.error:
+        raise ValueError("OSC message is truncated") from None
+
+
+def parse_packet(data: bytes) -> List[Tuple[str, list]]:
+    """
+    Parse an OSC packet, a message or a bundle. Nested bundles are flattened.
+    :return: the (address, arguments) of each message, in order
+    """
+    if not data.startswith(BUNDLE_ID):
+        return [parse_message(data)]
+    messages = []
+    # Skip the ID and the time tag
+    pos = 16
+    while pos < len(data):
+        if pos + 4 > len(data):
+            raise ValueError("OSC bundle is truncated")
+        size = _int32.unpack_from(data, pos)[0]
+        pos += 4
+        if size <= 0 or size % 4 or pos + size > len(data):
+            raise ValueError("OSC bundle element has a bad size")
+        messages.extend(parse_packet(data[pos:pos + size]))
+        pos += size
+    return messages
+
+
+def _pad(data: bytes) -> bytes:
+    return data + b"\x00" * (4 - len(data) % 4)
+
+
+def encode_message(address: str, *args) -> bytes:
+    """
+    Build an OSC message, e.g. to test a server over loopback.
+    ints, floats, strings, bytes (blobs) and bools are supported.
+    """
+    tags = ","
+    payload = b""
+    for arg in args:
+        if isinstance(arg, bool):
+            tags += "T" if arg else "F"
+        elif isinstance(arg, int):
+            tags += "i"
+            payload += _int32.pack(arg)
+        elif isinstance(arg, float):
+            tags += "f"
+            payload += _float32.pack(arg)
+        elif isinstance(arg, str):
+            tags += "s"
+            payload += _pad(arg.encode("ascii"))
+        elif isinstance(arg, (bytes, bytearray)):
+            tags += "b"
+            payload += _int32.pack(len(arg)) + bytes(arg) + b"\x00" * (-len(arg) % 4)
+        else:
+            raise ValueError("Cannot encode {0!r} as an OSC argument".format(arg))
+    return _pad(address.encode("ascii")) + _pad(tags.encode("ascii")) + payload
+
+
+def encode_bundle(*elements: bytes) -> bytes:
+    """
+    Build an OSC bundle (time tag "immediately") from encoded messages or bundles.
+    """
+    return BUNDLE_ID + struct.pack(">Q", 1) + b"".join(_int32.pack(len(e)) + e for e in elements)
+
+
+def _dmx_value(arg) -> int:
+    if isinstance(arg, bool):
+        return 255 if arg else 0
+    if isinstance(arg, float):
+        return int(round(min(max(arg, 0.0), 1.0) * 255))
+    if isinstance(arg, int):
+        if arg < 0 or arg > 255:
+            raise ValueError("Value {0} is outside 0-255".format(arg))
+        return arg
+    raise ValueError("{0!r} is not a DMX value".format(arg))
+
+
+class _OSCProtocol(asyncio.DatagramProtocol):
+    def __init__(self, server):
+        self._server = server
+
+    def datagram_received(self, data: bytes, addr):
+        self._server.handle_packet(data)
+
+
+class OSCServer:
+    def __init__(self, dev, host: str = "0.0.0.0", port: int = OSC_PORT, aliases: Dict[str, int] = None,
+                 prefix: str = "/dmx", rate: float = 40.0):
+        """
+        :param dev: the uDMXDevice whose universe is controlled
+        :param host: address to listen on
+        :param port: UDP port to listen on (0 picks a free port)
+        :param aliases: channel alias -> channel number, e.g. the channel aliases of a .uDMXrc file
+        :param prefix: the address prefix of every DMX message
+        :param rate: frame rate if the device is not already in refresh mode
+        """
+        self._dev = dev
+        self._host = host
+        self._port = port
+        self._aliases = dict(aliases or {})
+        self._prefix = prefix.rstrip("/") + "/"
+        self._range_prefix = self._prefix + "range/"
+        self._rate = rate
+        self._transport = None
+
+        # Statistics
+        self._packets = 0
+        self._messages = 0
+        self._bundles = 0
+        self._malformed = 0
+        self._ignored = 0
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        """
+        Returns the (host, port) the server is listening on.
+        """
+        return self._transport.get_extra_info("sockname")[:2]
+
+    async def start(self):
+        """
+        Start listening. The device is started in refresh mode at the
+        server's rate if it is not already running.
+        :return: None
+        """
+        if self._transport is not None:
+            return
+        if self._dev.Refresh is None:
+            self._dev.start_refresh(rate=self._rate)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # A large receive buffer rides out bursts, e.g. several faders at once
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 20)
+        sock.bind((self._host, self._port))
+        loop = asyncio.get_running_loop()
+        self._transport, _ = await loop.create_datagram_endpoint(lambda: _OSCProtocol(self), sock=sock)
+
+    def close(self):
+        """
+        Stop listening. The device stays in refresh mode.
+        :return: None
+        """
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def _channel(self, name: str) -> int:
+        if name.isdigit():
+            return int(name)
+        return self._aliases.get(name)
+
+    def _span(self, address: str, args: list):
+        """
+        Translate a message into (channel, values), or None if it is not a DMX message.
+        """
+        if address.startswith(self._range_prefix):
+            channel = self._channel(address[len(self._range_prefix):])
+            if channel is None:
+                return None
+            if len(args) != 1 or not isinstance(args[0], bytes):
+                raise ValueError("{0} takes one blob".format(address))
+            return channel, args[0]
+        if address.startswith(self._prefix):
+            channel = self._channel(address[len(self._prefix):])
+            if channel is None:
+                return None
+            if not args:
+                raise ValueError("{0} needs at least one value".format(address))
+            if len(args) == 1 and isinstance(args[0], bytes):
+                return channel, args[0]
+            return channel, bytes([_dmx_value(a) for a in args])
+        return None
+
+    def handle_packet(self, data: bytes) -> bool:
+        """
+        Apply an OSC packet to the universe. A bundle is applied completely or,
+        if any of its messages is malformed, not at all.
+        :param data: the packet
+        :return: True if any channel changed
+        """
+        self._packets += 1
+        try:
+            messages = parse_packet(data)
+            spans = []
+            for address, args in messages:
+                span = self._span(address, args)
+                if span is None:
+                    self._ignored += 1
+                else:
+                    spans.append(span)
+            changed = self._dev.Universe.set_spans(spans) if spans else False
+        except ValueError:
+            self._malformed += 1
+            return False
+        self._messages += len(messages)
+        if len(messages) > 1 or data.startswith(BUNDLE_ID):
+            self._bundles += 1
+        return changed
+
+    def stats(self) -> dict:
+        """
+        Returns the receive statistics.
+            packets: datagrams received
+            messages: messages applied or ignored
+            bundles: bundles applied
+            malformed: packets dropped because they could not be parsed or applied
+            ignored: messages to addresses outside the DMX address space
+        """
+        return {
+            "packets": self._packets,
+            "messages": self._messages,
+            "bundles": self._bundles,
+            "malformed": self._malformed,
+            "ignored": self._ignored,
+        }
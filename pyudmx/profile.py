@@ -0,0 +1,280 @@
+# profile.py - Transfer characterization profiles for uDMX interfaces
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# uDMX clones differ in which transfers they handle reliably. Some overflow
+# randomly on partial blocks and only behave when sent whole 512 channel
+# blocks (see the comments in tryusb.py). characterize() measures the
+# latency and error rate of multi-value transfers across a range of sizes
+# and offsets and derives a DeviceProfile from the results:
+#
+#   max_transfer: the transfer size with the lowest cost per channel,
+#       counting the retries its error rate causes
+#   pad: True if partial transfers fail more often than whole, aligned
+#       max_transfer blocks. Writes are then padded out to whole blocks
+#       with the current universe values.
+#
+# Profiles are saved in a JSON file (~/.uDMXprofiles.json by default) keyed
+# by the interface's port path, and also matched by serial number when the
+# interface has one. A device uses a profile once it has been given one with
+# uDMXDevice.set_profile() or load_profile().
+#
+# Usage example
+#
+# dev = pyudmx.uDMXDevice()
+# dev.open()
+# profile = characterize(dev)
+# save_profile(profile)
+# ...
+# load_profile(dev) # later, on another run
+#
+
+import json
+import os
+import time
+import usb  # the pyusb module is required to be in the current environment
+from typing import List  # support type hinting
+from .universe import DMX_UNIVERSE_SIZE
+from .pyudmx import SetMultiChannel, port_path
+
+DEFAULT_SIZES = (1, 2, 8, 32, 64, 128, 256, 512)
+DEFAULT_OFFSETS = (0, 1, 64, 255)
+# A transfer size is considered reliable up to this error rate
+DEFAULT_THRESHOLD = 0.01
+
+
+def default_profile_path() -> str:
+    """
+    Returns the path of the default profile file.
+    """
+    return os.path.join(os.path.expanduser("~"), ".uDMXprofiles.json")
+
+
+def serial_number(dev) -> str:
+    """
+    Returns the serial number of a usb device, or None if it has none or it cannot be read.
+    """
+    try:
+        return dev.serial_number or None
+    except (usb.core.USBError, ValueError, NotImplementedError):
+        # Reading string descriptors needs permission on some systems
+        return None
+
+
+class DeviceProfile:
+    def __init__(self, key: str, serial: str = None, max_transfer: int = DMX_UNIVERSE_SIZE, pad: bool = False,
+                 measurements: List[dict] = None):
+        """
+        :param key: the interface's port path
+        :param serial: the interface's serial number, if it has one
+        :param max_transfer: largest multi-value transfer to send
+        :param pad: if True, transfers are padded to whole, aligned max_transfer blocks
+        :param measurements: the characterization results the profile was derived from
+        """
+        self.key = key
+        self.serial = serial
+        self.max_transfer = max_transfer
+        self.pad = pad
+        self.measurements = measurements if measurements is not None else []
+
+    def __repr__(self):
+        return "DeviceProfile({0!r}, max_transfer={1}, pad={2})".format(self.key, self.max_transfer, self.pad)
+
+    def fits(self, channel: int, count: int) -> bool:
+        """
+        Returns True if a transfer can be sent as it is.
+        """
+        if count > self.max_transfer:
+            return False
+        if self.pad:
+            return count == self.max_transfer and (channel - 1) % self.max_transfer == 0
+        return True
+
+    def transfers(self, channel: int, count: int) -> List[tuple]:
+        """
+        Split (and pad) a range of channels into the transfers this interface handles best.
+        :param channel: The starting DMX channel number, 1-512
+        :param count: number of channels
+        :return: list of (channel, count) transfers covering at least the range
+        """
+        start = channel - 1
+        end = start + count
+        size = self.max_transfer
+        if self.pad:
+            start = start // size * size
+            end = min(-(-end // size) * size, DMX_UNIVERSE_SIZE)
+        return [(s + 1, min(size, end - s)) for s in range(start, end, size)]
+
+    def to_dict(self) -> dict:
+        return {
+            "key": self.key,
+            "serial": self.serial,
+            "max_transfer": self.max_transfer,
+            "pad": self.pad,
+            "measurements": self.measurements,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict):
+        return cls(d["key"], serial=d.get("serial"), max_transfer=d["max_transfer"], pad=d["pad"],
+                   measurements=d.get("measurements"))
+
+
+def measure_transfer(dev, size: int, offset: int, repeats: int) -> dict:
+    """
+    Send the same multi-value transfer repeatedly without retries.
+    The current universe values are sent, so the output does not change.
+    :return: a measurement dictionary
+    """
+    data = bytearray(dev.Universe.frame[offset:offset + size])
+    latencies = []
+    errors = 0
+    for i in range(repeats):
+        started = time.perf_counter()
+        try:
+            dev._send_control_message(SetMultiChannel, value_or_length=size, channel=offset + 1,
+                                      data_or_length=data)
+        except usb.core.USBError:
+            errors += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+    return {
+        "size": size,
+        "offset": offset,
+        "attempts": repeats,
+        "errors": errors,
+        "error_rate": errors / repeats,
+        "latency": sum(latencies) / len(latencies) if latencies else None,
+        "latency_max": max(latencies) if latencies else None,
+    }
+
+
+def derive_profile(key: str, serial: str, measurements: List[dict],
+                   threshold: float = DEFAULT_THRESHOLD) -> DeviceProfile:
+    """
+    Choose the transfer size and padding for a set of measurements.
+    """
+    by_size = {}
+    for m in measurements:
+        by_size.setdefault(m["size"], []).append(m)
+
+    def cost(size):
+        # Expected seconds per channel, counting retries
+        ms = [m for m in by_size[size] if m["latency"] is not None]
+        if not ms:
+            return float("inf")
+        latency = sum(m["latency"] for m in ms) / len(ms)
+        error_rate = sum(m["errors"] for m in by_size[size]) / sum(m["attempts"] for m in by_size[size])
+        if error_rate >= 1.0:
+            return float("inf")
+        return latency / size / (1.0 - error_rate)
+
+    def aligned_error_rate(size):
+        ms = [m for m in by_size[size] if m["offset"] % size == 0]
+        return max(m["error_rate"] for m in ms) if ms else 1.0
+
+    # The cheapest size among those whose aligned transfers are reliable,
+    # or the cheapest size overall if none are
+    reliable = [s for s in by_size if aligned_error_rate(s) <= threshold]
+    candidates = reliable if reliable else list(by_size)
+    max_transfer = min(candidates, key=lambda s: (cost(s), -s)) if candidates else DMX_UNIVERSE_SIZE
+
+    # Pad when partial transfers are less reliable than whole blocks
+    partial = [m["error_rate"] for m in measurements
+               if m["size"] < max_transfer or m["offset"] % max_transfer != 0]
+    pad = bool(partial) and max(partial) > threshold and max(partial) > aligned_error_rate(max_transfer)
+    return DeviceProfile(key, serial=serial, max_transfer=max_transfer, pad=pad, measurements=measurements)
+
+
+def characterize(dev, sizes=DEFAULT_SIZES, offsets=DEFAULT_OFFSETS, repeats: int = 20,
+                 threshold: float = DEFAULT_THRESHOLD, progress=None) -> DeviceProfile:
+    """
+    Measure the latency and error rate of multi-value transfers on an open device
+    and derive its profile. Retries are turned off while measuring.
+    :param dev: an open uDMXDevice
+    :param sizes: transfer sizes to measure
+    :param offsets: starting channel offsets (0-511) to measure each size at
+    :param repeats: transfers per size and offset
+    :param threshold: highest error rate still considered reliable
+    :param progress: optional function called with each measurement as it completes
+    :return: the DeviceProfile
+    """
+    max_retries = dev.max_retries
+    dev.max_retries = 0
+    measurements = []
+    try:
+        for size in sizes:
+            for offset in offsets:
+                if offset + size > DMX_UNIVERSE_SIZE:
+                    continue
+                m = measure_transfer(dev, size, offset, repeats)
+                measurements.append(m)
+                if progress is not None:
+                    progress(m)
+    finally:
+        dev.max_retries = max_retries
+    return derive_profile(port_path(dev.Device), serial_number(dev.Device), measurements, threshold)
+
+
+def load_profiles(path: str = None) -> dict:
+    """
+    Returns the saved profiles keyed by port path. Returns an empty dictionary if there is no profile file.
+    """
+    if path is None:
+        path = default_profile_path()
+    try:
+        with open(path, "r") as pf:
+            return {key: DeviceProfile.from_dict(d) for key, d in json.load(pf).items()}
+    except FileNotFoundError:
+        return {}
+
+
+def save_profile(profile: DeviceProfile, path: str = None):
+    """
+    Add a profile to the profile file, replacing any profile with the same key.
+    :return: None
+    """
+    if path is None:
+        path = default_profile_path()
+    profiles = load_profiles(path)
+    profiles[profile.key] = profile
+    with open(path, "w") as pf:
+        json.dump({key: p.to_dict() for key, p in profiles.items()}, pf, indent=2)
+
+
+def find_profile(usb_dev, path: str = None) -> DeviceProfile:
+    """
+    Find the saved profile for a usb device, first by port path and then by serial number.
+    Returns None if there is none.
+    """
+    profiles = load_profiles(path)
+    profile = profiles.get(port_path(usb_dev))
+    if profile is None:
+        serial = serial_number(usb_dev)
+        if serial is not None:
+            for p in profiles.values():
+                if p.serial == serial:
+                    return p
+    return profile
+
+
+def load_profile(dev, path: str = None) -> DeviceProfile:
+    """
+    Find the saved profile for an open uDMXDevice and start using it.
+    :return: the profile, or None if there is none
+    """
+    profile = find_profile(dev.Device, path)
+    if profile is not None:
+        dev.set_profile(profile)
+    return profile
@@ -24,13 +24,167 @@
 # dev.close()
 #
 
+import errno
+import threading
+import time
 import usb  # the pyusb module is required to be in the current environment
+from array import array
 from typing import Union, List  # support type hinting
+from .universe import Universe, byte_values, check_range
+from .refresh import RefreshEngine
+from .metrics import TransferMetrics, MetricsServer
+from .recorder import Recorder, DEFAULT_KEYFRAME_INTERVAL
+
+# uDMX vendor requests
+SetSingleChannel = 1
+SetMultiChannel = 2
+
+
+class PyUSBBackend:
+    """
+    The default device backend: real interfaces found through pyusb.
+    A backend provides find(), with the same arguments as usb.core.find(),
+    and dispose() to release a device. See simulator.py for another backend.
+    """
+    def find(self, **kwargs):
+        return usb.core.find(**kwargs)
+
+    def dispose(self, dev):
+        usb.util.dispose_resources(dev)
+
+
+default_backend = PyUSBBackend()
+
+
+def find_all(vendor_id: int = 0x16c0, product_id: int = 0x5dc, backend=None) -> List[usb.core.Device]:
+    """
+    Find every uDMX interface that matches the search criteria.
+    :param vendor_id:
+    :param product_id:
+    :param backend: the device backend to search, defaults to pyusb
+    :return: a list of usb.core.Device instances sorted by port path
+    """
+    if backend is None:
+        backend = default_backend
+    kwargs = {}
+    if vendor_id:
+        kwargs["idVendor"] = vendor_id
+    if product_id:
+        kwargs["idProduct"] = product_id
+    devices = list(backend.find(find_all=True, **kwargs))
+    devices.sort(key=port_path)
+    return devices
+
+
+def port_path(dev: usb.core.Device) -> str:
+    """
+    Returns the bus/port path of a usb device, e.g. "1-1.4" for port 4 of
+    the hub plugged into port 1 of bus 1. Unlike the device address, the
+    port path stays the same when an interface is replugged into the same port.
+    If the backend does not report port numbers, "bus:address" is returned.
+    """
+    ports = getattr(dev, "port_numbers", None)
+    if ports:
+        return "{0}-{1}".format(dev.bus, ".".join(str(p) for p in ports))
+    return "{0}:{1}".format(dev.bus, dev.address)
+
+
+# libusb error codes, as reported in USBError.backend_error_code
+LIBUSB_ERROR_ACCESS = -3
+LIBUSB_ERROR_NO_DEVICE = -4
+LIBUSB_ERROR_TIMEOUT = -7
+LIBUSB_ERROR_OVERFLOW = -8
+LIBUSB_ERROR_PIPE = -9
+
+# Transfer error classes
+ERROR_TIMEOUT = "timeout"
+ERROR_PIPE = "pipe"  # stall or overflow, seen randomly on clones sending partial blocks
+ERROR_NO_DEVICE = "no-device"
+ERROR_ACCESS = "access"
+ERROR_OTHER = "other"
+
+# Errors that are worth retrying
+TRANSIENT_ERRORS = (ERROR_TIMEOUT, ERROR_PIPE)
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when a failed transfer is not retried because the retry would
+    miss the frame deadline. The values are left for the next frame.
+    """
+    pass
+
+
+def classify_error(ex: Exception) -> str:
+    """
+    Classify an exception raised by a control transfer.
+    :return: one of ERROR_TIMEOUT, ERROR_PIPE, ERROR_NO_DEVICE, ERROR_ACCESS or ERROR_OTHER
+    """
+    if not isinstance(ex, usb.core.USBError):
+        return ERROR_OTHER
+    code = ex.backend_error_code
+    if ex.errno == errno.ETIMEDOUT or code == LIBUSB_ERROR_TIMEOUT:
+        return ERROR_TIMEOUT
+    if ex.errno in (errno.EPIPE, errno.EOVERFLOW) or code in (LIBUSB_ERROR_PIPE, LIBUSB_ERROR_OVERFLOW):
+        return ERROR_PIPE
+    if ex.errno == errno.ENODEV or code == LIBUSB_ERROR_NO_DEVICE:
+        return ERROR_NO_DEVICE
+    if ex.errno in (errno.EACCES, errno.EPERM) or code == LIBUSB_ERROR_ACCESS:
+        return ERROR_ACCESS
+    return ERROR_OTHER
+
+
+def is_disconnect_error(ex: Exception) -> bool:
+    """
+    Returns True if an exception raised by a transfer means the device is gone.
+    """
+    return classify_error(ex) == ERROR_NO_DEVICE
 
 
 class uDMXDevice:
-    def __init__(self):
+    # Reconnect backoff in seconds
+    RECONNECT_MIN_DELAY = 0.02
+    RECONNECT_MAX_DELAY = 0.5
+
+    def __init__(self, auto_reconnect: bool = False, max_retries: int = 3):
+        """
+        :param auto_reconnect: if True, a device that disconnects is reopened in the
+            background and the universe is replayed to it. Until then, sends
+            return 0 instead of raising.
+        :param max_retries: number of times a transfer that fails with a
+            transient error (timeout, pipe/overflow) is retried
+        """
+        self.max_retries = max_retries
+        self._metrics = None
+        self._metrics_server = None
+        self._recorder = None
+        self._retry_stats = {
+            "transfers": 0,
+            "retries": 0,
+            "recovered": 0,
+            "failed": 0,
+            "dropped": 0,
+            "errors": {},
+        }
         self._dev = None
+        self._universe = Universe()
+        self._refresh = None
+        self._profile = None
+        # Preallocated multi-value transfer buffers by length, see _send_values()
+        self._buffers = {}
+        # Serializes transfers (and the universe updates that follow them)
+        # so the device can be shared by several threads
+        self._transfer_lock = threading.RLock()
+        # While refresh mode runs, send_*() may write to the universe instead, see start_refresh()
+        self._coalesce = False
+        self._auto_reconnect = auto_reconnect
+        # The search criteria and location of the last device opened
+        self._backend = default_backend
+        self._find_kwargs = None
+        self._location = None
+        self._reconnect_lock = threading.Lock()
+        self._reconnect_thread = None
+        self._reconnect_stop = threading.Event()
 
     @property
     def Device(self) -> usb.core.Device:
@@ -40,7 +194,52 @@ class uDMXDevice:
         """
         return self._dev
 
-    def open(self, vendor_id: int = 0x16c0, product_id: int = 0x5dc, bus: int = None, address: int = None) -> bool:
+    @property
+    def Universe(self) -> Universe:
+        """
+        Returns the universe buffer holding the channel values for this device.
+        Values written to the universe are sent by flush().
+        """
+        return self._universe
+
+    @property
+    def Refresh(self) -> RefreshEngine:
+        """
+        Returns the RefreshEngine while refresh mode is running. Otherwise, returns None.
+        """
+        return self._refresh
+
+    @property
+    def Profile(self):
+        """
+        Returns the transfer profile in use (see profile.py), or None.
+        """
+        return self._profile
+
+    def set_profile(self, profile):
+        """
+        Split and pad multi-value transfers according to a transfer profile.
+        :param profile: a profile.DeviceProfile, or None to send transfers as they are
+        :return: None
+        """
+        self._profile = profile
+
+    @property
+    def Location(self) -> tuple:
+        """
+        Returns (bus, address, port path) of the last device opened, or None.
+        """
+        return self._location
+
+    @property
+    def reconnecting(self) -> bool:
+        """
+        Returns True while a disconnected device is being reopened in the background.
+        """
+        return self._reconnect_thread is not None
+
+    def open(self, vendor_id: int = 0x16c0, product_id: int = 0x5dc, bus: int = None, address: int = None,
+             backend=None) -> bool:
         """
         Open the first device that matches the search criteria. Th default parameters
         are set up for the likely most common case of a single uDMX interface.
@@ -51,8 +250,16 @@ class uDMXDevice:
         :param product_id:
         :param bus: USB bus number 1-n
         :param address: USB device address 1-n
+        :param backend: the device backend, defaults to pyusb. For example,
+            a simulator.SimulatedBackend for working without hardware.
         :return: Returns true if a device was opened. Otherwise, returns false.
         """
+        if backend is None:
+            backend = default_backend
+        if backend is not self._backend:
+            # The last device opened belongs to a different backend
+            self._location = None
+            self._backend = backend
         kwargs = {}
         if vendor_id:
             kwargs["idVendor"] = vendor_id
@@ -62,35 +269,139 @@ class uDMXDevice:
             kwargs["bus"] = bus
         if address:
             kwargs["address"] = address
-        # Find the uDMX interface
-        self._dev = usb.core.find(**kwargs)
+
+        # Reopening with the same search criteria tries the device that
+        # was opened last time before searching the whole bus.
+        dev = None
+        if kwargs == self._find_kwargs and self._location is not None:
+            dev = self._find_last()
+        if dev is None:
+            # Find the uDMX interface
+            dev = self._backend.find(**kwargs)
+        self._dev = dev
+        self._find_kwargs = kwargs
+        if dev is not None:
+            self._remember(dev)
         return self._dev is not None
 
+    def _find_last(self) -> usb.core.Device:
+        """
+        Find the device opened last time, first at its old bus/address and
+        then at its old port path (a replugged device gets a new address).
+        """
+        bus, address, path = self._location
+        kwargs = dict(self._find_kwargs)
+        kwargs["bus"] = bus
+        kwargs["address"] = address
+        dev = self._backend.find(**kwargs)
+        if dev is not None and port_path(dev) == path:
+            return dev
+        del kwargs["address"]
+        return self._backend.find(custom_match=lambda d: port_path(d) == path, **kwargs)
+
+    def _remember(self, dev: usb.core.Device):
+        self._location = (dev.bus, dev.address, port_path(dev))
+
+    def attach(self, dev: usb.core.Device, backend=None):
+        """
+        Use a usb device that has already been found, for example one returned by find_all().
+        :param dev: a usb.core.Device for a uDMX interface
+        :param backend: the backend that found the device, defaults to pyusb
+        :return: None
+        """
+        self.close()
+        self._backend = backend if backend is not None else default_backend
+        self._dev = dev
+        self._find_kwargs = {"idVendor": dev.idVendor, "idProduct": dev.idProduct}
+        self._remember(dev)
+
     def close(self):
         """
         Close and release the current usb device.
         :return: None
         """
+        self.stop_refresh()
+        self.stop_recording()
+        self.stop_metrics_server()
+        self._stop_reconnect()
         # This may not be absolutely necessary, but it is safe.
         # It's the closest thing to a close() method.
         if self._dev is not None:
-            usb.util.dispose_resources(self._dev)
+            self._backend.dispose(self._dev)
             self._dev = None
 
+    def _start_reconnect(self):
+        """
+        Drop the disconnected device and start reopening it in the background.
+        """
+        with self._reconnect_lock:
+            if self._reconnect_thread is not None:
+                return
+            dev = self._dev
+            self._dev = None
+            if dev is not None:
+                try:
+                    self._backend.dispose(dev)
+                except usb.core.USBError:
+                    pass
+            self._reconnect_stop.clear()
+            self._reconnect_thread = threading.Thread(target=self._reconnect, name="uDMX-reconnect", daemon=True)
+            self._reconnect_thread.start()
+
+    def _stop_reconnect(self):
+        thread = self._reconnect_thread
+        if thread is not None:
+            self._reconnect_stop.set()
+            if thread is not threading.current_thread():
+                thread.join()
+
+    def _reconnect(self):
+        """
+        Reopen the device with bounded exponential backoff, then replay the universe.
+        Runs on the reconnect thread.
+        """
+        delay = self.RECONNECT_MIN_DELAY
+        while not self._reconnect_stop.is_set():
+            try:
+                dev = self._find_last()
+            except usb.core.USBError:
+                dev = None
+            if dev is not None:
+                self._dev = dev
+                self._remember(dev)
+                self._universe.mark_dirty()
+                try:
+                    self.flush()
+                    break
+                except usb.core.USBError:
+                    # Gone again (or still settling). Keep trying.
+                    self._dev = None
+            self._reconnect_stop.wait(delay)
+            delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+        self._reconnect_thread = None
+
     def _send_control_message(self, cmd: int, value_or_length: int = 1, channel: int = 1,
-                              data_or_length: Union[int, bytearray] = 1) -> int:
+                              data_or_length: Union[int, bytearray] = 1, deadline: float = None) -> int:
         """
         Sends a control transfer to the current device.
+        Transfers that fail with a transient error (see classify_error()) are retried
+        up to max_retries times. Other errors are raised immediately.
         :param cmd: 1 for single value transfer, 2 for multi-value transfer
         :param value_or_length: for single value transfer, the value. For multi-value transfer,
-            the length of the data bytearray.
+            the number of values.
         :param channel: DMX channel number, 1- 512
         :param data_or_length: for a single value transfer it should be 1.
-            For a multi-value transfer, a bytearray containing the values.
+            For a multi-value transfer, the values (see _send_values()).
+        :param deadline: optional time.perf_counter() value by which the transfer must be done.
+            A retry that would run past it is not attempted and DeadlineExceeded is raised instead.
         :return: number of bytes sent.
         """
 
-        if self._dev is None:
+        dev = self._dev
+        if dev is None:
+            if self._reconnect_thread is not None:
+                # The values are kept in the universe and replayed on reconnect
+                return 0
             raise ValueError("No usb device opened")
 
         # All data transfers use this request type. This is more for
@@ -113,38 +424,336 @@ class uDMXDevice:
             Data:           iterable object containing values (we use a bytearray)
         """
 
-        n = self._dev.ctrl_transfer(bmRequestType, cmd, wValue=value_or_length, wIndex=channel - 1,
-                                    data_or_wLength=data_or_length)
+        with self._transfer_lock:
+            return self._transfer(dev, bmRequestType, cmd, value_or_length, channel, data_or_length, deadline)
+
+    def _transfer(self, dev, bmRequestType: int, cmd: int, value_or_length: int, channel: int,
+                  data_or_length: Union[int, bytearray], deadline: float) -> int:
+        """
+        Run a control transfer with retries. Called with the transfer lock held.
+        """
+        stats = self._retry_stats
+        stats["transfers"] += 1
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                n = dev.ctrl_transfer(bmRequestType, cmd, wValue=value_or_length, wIndex=channel - 1,
+                                      data_or_wLength=data_or_length)
+                metrics = self._metrics
+                if metrics is not None:
+                    metrics.record(cmd == SetMultiChannel, value_or_length if cmd == SetMultiChannel else 1,
+                                   time.perf_counter() - started)
+                break
+            except usb.core.USBError as ex:
+                kind = classify_error(ex)
+                stats["errors"][kind] = stats["errors"].get(kind, 0) + 1
+                if kind in TRANSIENT_ERRORS and attempt < self.max_retries:
+                    # Assume a retry takes as long as the failed attempt did.
+                    # If it would miss the frame deadline, give up on this
+                    # transfer and let the next frame carry the values.
+                    now = time.perf_counter()
+                    if deadline is not None and now + (now - started) > deadline:
+                        stats["dropped"] += 1
+                        raise DeadlineExceeded("Transfer dropped to meet the frame deadline") from ex
+                    attempt += 1
+                    stats["retries"] += 1
+                    continue
+                stats["failed"] += 1
+                # The reconnect thread handles its own failures
+                if self._auto_reconnect and kind == ERROR_NO_DEVICE and self._location is not None \
+                        and threading.current_thread() is not self._reconnect_thread:
+                    self._start_reconnect()
+                    return 0
+                raise
+        if attempt:
+            stats["recovered"] += 1
 
         # For a single value transfer the return value is the data_or_length value.
         # For a multi-value transfer the return value is the number of values transfer
         # which should be the number of values in the data_or_length bytearray.
         return n
 
+    def _send_values(self, channel: int, values, deadline: float = None) -> int:
+        """
+        Send a multi-value transfer without allocating.
+        pyusb passes an array('B') to the backend as it is and converts anything
+        else to a new one, and the backend takes the transfer length from the
+        array. So an array('B') is sent directly and other buffers are copied into
+        a preallocated array of the same length.
+        :param channel: The starting DMX channel number, 1-512
+        :param values: the values as a bytes-like object (see byte_values())
+        :param deadline: see _send_control_message()
+        :return: number of bytes sent
+        """
+        n = len(values)
+        if isinstance(values, array):
+            return self._send_control_message(SetMultiChannel, value_or_length=n, channel=channel,
+                                              data_or_length=values, deadline=deadline)
+        with self._transfer_lock:
+            buffer = self._buffers.get(n)
+            if buffer is None:
+                data = array("B", bytes(n))
+                buffer = self._buffers[n] = (data, memoryview(data))
+            data, view = buffer
+            view[:] = values
+            return self._send_control_message(SetMultiChannel, value_or_length=n, channel=channel,
+                                              data_or_length=data, deadline=deadline)
+
     def send_single_value(self, channel: int, value: int) -> int:
         """
         Send a single value to the uDMX
         :param channel: DMX channel number, 1-512
         :param value: Value to be sent to channel, 0-255
-        :return: number of bytes actually sent
+        :return: number of bytes actually sent. In coalescing mode (see start_refresh())
+            the value is written to the universe instead and 1 is returned.
         """
-        SetSingleChannel = 1
-        n = self._send_control_message(SetSingleChannel, value_or_length=value, channel=channel, data_or_length=1)
+        # Check before sending. The interface would take the low byte of a
+        # bad value and the firmware stalls on a bad channel.
+        check_range(channel)
+        if value < 0 or value > 255:
+            raise ValueError("Value {0} is outside 0-255".format(value))
+        if self._coalesce:
+            self._universe.set_value(channel, value)
+            return 1
+        with self._transfer_lock:
+            n = self._send_control_message(SetSingleChannel, value_or_length=value, channel=channel,
+                                           data_or_length=1)
+            self._universe.commit(channel, (value,))
+            recorder = self._recorder
+            if recorder is not None:
+                recorder.record([(channel, bytes((value,)))])
         return n
 
-    def send_multi_value(self, channel: int, values: Union[List[int], bytearray]) -> int:
+    def send_multi_value(self, channel: int, values: Union[List[int], bytes, bytearray, memoryview, array]) -> int:
         """
         Send multiple consecutive bytes to the uDMX
         :param channel: The starting DMX channel number, 1-512
-        :param values: any sequence of integer values that can be converted
-        to a bytearray (e.g a list). Each value 0-255.
-        :return: number of bytes actually sent
-        """
-        SetMultiChannel = 2
-        if isinstance(values, bytearray):
-            ba = values
-        else:
-            ba = bytearray(values)
-        n = self._send_control_message(SetMultiChannel, value_or_length=len(ba),
-                                       channel=channel, data_or_length=ba)
+        :param values: any sequence of integer values (e.g a list). Each value 0-255.
+        Buffers of unsigned bytes (bytes, bytearray, memoryview slices, array('B'),
+        uint8 NumPy arrays) are sent without being converted.
+        :return: number of bytes actually sent. In coalescing mode (see start_refresh())
+            the values are written to the universe instead and their count is returned.
+        """
+        values = byte_values(values)
+        count = len(values)
+        if self._coalesce:
+            self._universe.set_values(channel, values)
+            return count
+        check_range(channel, max(count, 1))
+        with self._transfer_lock:
+            profile = self._profile
+            if profile is not None and not profile.fits(channel, count):
+                # Pad with the universe's values. Some of them may not have been
+                # flushed yet, once sent they no longer need to be.
+                frame = bytearray(self._universe.frame)
+                frame[channel - 1:channel - 1 + count] = values
+                view = memoryview(frame)
+                sent = []
+                for c, length in profile.transfers(channel, count):
+                    block = view[c - 1:c - 1 + length]
+                    self._send_values(c, block)
+                    self._universe.mark_sent(c, block)
+                    sent.append((c, bytes(block)))
+                n = count
+            else:
+                n = self._send_values(channel, values)
+                sent = [(channel, bytes(values))]
+            self._universe.commit(channel, values)
+            recorder = self._recorder
+            if recorder is not None:
+                recorder.record(sent)
         return n
+
+    def flush(self, deadline: float = None) -> int:
+        """
+        Send every universe channel that has changed since the last flush.
+        Dirty channels are sent with the fewest SetSingleChannel/SetMultiChannel
+        transfers (see Universe.plan()).
+        :param deadline: optional time.perf_counter() value for the end of the frame.
+            If a failed transfer cannot be retried before the deadline, the rest
+            of the frame is left pending for the next flush instead.
+        :return: number of values actually sent
+        """
+        with self._transfer_lock:
+            return self._flush(deadline)
+
+    def _flush(self, deadline: float) -> int:
+        """
+        flush() with the transfer lock held, so no other send can slip in
+        between the swap and the transfers.
+        """
+        universe = self._universe
+        frame, transfers = universe.swap()
+        if not transfers:
+            return 0
+        profile = self._profile
+        if profile is not None:
+            # Split or pad the multi-value transfers to suit the interface.
+            # Padding comes from the swapped frame, where every channel outside
+            # the plan was clean, so it repeats what the interface already has.
+            planned = []
+            for channel, count in transfers:
+                if count == 1 or profile.fits(channel, count):
+                    planned.append((channel, count))
+                else:
+                    # Neighbouring spans can pad out to the same block
+                    planned.extend(t for t in profile.transfers(channel, count) if t not in planned[-1:])
+            transfers = planned
+
+        sent = 0
+        view = memoryview(frame)
+        for i, (channel, count) in enumerate(transfers):
+            try:
+                if count == 1:
+                    self._send_control_message(SetSingleChannel, value_or_length=frame[channel - 1],
+                                               channel=channel, data_or_length=1, deadline=deadline)
+                else:
+                    self._send_values(channel, view[channel - 1:channel - 1 + count], deadline=deadline)
+            except DeadlineExceeded:
+                # The newer frame will carry these values
+                for c, n in transfers[i:]:
+                    universe.mark_dirty(c, n)
+                self._record_partial(frame, transfers[:i])
+                return sent
+            except Exception:
+                # Whatever was not sent is still pending
+                for c, n in transfers[i:]:
+                    universe.mark_dirty(c, n)
+                self._record_partial(frame, transfers[:i])
+                raise
+            sent += count
+        if self._metrics is not None:
+            self._metrics.record_frame()
+        recorder = self._recorder
+        if recorder is not None:
+            # The clean channels already hold what the interface has
+            recorder.record([(1, frame)])
+        return sent
+
+    def _record_partial(self, frame: bytes, transfers: list):
+        """
+        Record the transfers of a frame that were sent before a flush stopped.
+        """
+        recorder = self._recorder
+        if recorder is not None and transfers:
+            recorder.record([(c, frame[c - 1:c - 1 + n]) for c, n in transfers])
+
+    def retry_stats(self) -> dict:
+        """
+        Returns a snapshot of the transfer retry counters.
+            transfers: transfers attempted
+            retries: retry attempts made
+            recovered: transfers that succeeded after one or more retries
+            failed: transfers that raised an error
+            dropped: transfers abandoned to meet a frame deadline
+            errors: count of failed attempts by error class (see classify_error())
+        """
+        stats = dict(self._retry_stats)
+        stats["errors"] = dict(stats["errors"])
+        return stats
+
+    def enable_metrics(self):
+        """
+        Start collecting transfer metrics (see metrics.py). Metrics are off by default.
+        :return: None
+        """
+        if self._metrics is None:
+            self._metrics = TransferMetrics()
+
+    def disable_metrics(self):
+        """
+        Stop collecting transfer metrics and discard the ones collected.
+        :return: None
+        """
+        self._metrics = None
+
+    def stats(self) -> dict:
+        """
+        Returns a snapshot of the device's transfer statistics. This always
+        includes the retry_stats() counters. While metrics are enabled it also includes
+            transfers: successful transfers by command (single, multi)
+            bytes: channel values transferred by command
+            latency: per command count, sum, mean and histogram buckets in seconds
+            fps: recent frames (flushes) per second
+        """
+        stats = self.retry_stats()
+        metrics = self._metrics
+        if metrics is not None:
+            stats.update(metrics.snapshot())
+        return stats
+
+    def start_metrics_server(self, port: int, host: str = "127.0.0.1") -> MetricsServer:
+        """
+        Serve stats() in the Prometheus text format at http://host:port/metrics.
+        Metrics are enabled if they are not already.
+        :param port: TCP port to listen on (0 picks a free port)
+        :param host: address to listen on. The default only accepts local connections.
+        :return: the MetricsServer
+        """
+        self.enable_metrics()
+        self.stop_metrics_server()
+        self._metrics_server = MetricsServer(self, port, host)
+        return self._metrics_server
+
+    def stop_metrics_server(self):
+        """
+        Stop the metrics server if it is running.
+        :return: None
+        """
+        if self._metrics_server is not None:
+            self._metrics_server.close()
+            self._metrics_server = None
+
+    def start_recording(self, path: str, keyframe_interval: float = DEFAULT_KEYFRAME_INTERVAL) -> Recorder:
+        """
+        Record every value sent to the interface into a log file (see recorder.py).
+        The send path only queues the values. A background thread writes the log.
+        :param path: the log file. An existing file is replaced.
+        :param keyframe_interval: seconds between keyframes (seek points)
+        :return: the Recorder
+        """
+        self.stop_recording()
+        self._recorder = Recorder(path, keyframe_interval=keyframe_interval, initial=self._universe.frame)
+        return self._recorder
+
+    def stop_recording(self):
+        """
+        Stop recording, if recording, and finish the log file.
+        :return: None
+        """
+        recorder = self._recorder
+        if recorder is not None:
+            self._recorder = None
+            recorder.close()
+
+    def start_refresh(self, rate: float = 40.0, full_frames: bool = False, coalesce: bool = False) -> RefreshEngine:
+        """
+        Start refresh mode. An output thread sends the universe at a fixed
+        frame rate, so writes to the Universe never block on a USB transfer.
+        :param rate: frame rate in frames per second (e.g. 30-44)
+        :param full_frames: if True, every frame sends the entire universe.
+            Otherwise only the channels that changed are sent.
+        :param coalesce: if True, send_single_value() and send_multi_value() write
+            to the universe and return at once. However many threads call them, the
+            output thread sends each frame's changes in the fewest transfers and a
+            channel written several times within a frame goes out once.
+        :return: the RefreshEngine driving the output thread. Use its stats()
+        method to see the achieved frame rate, missed deadlines and jitter.
+        """
+        self.stop_refresh()
+        self._refresh = RefreshEngine(self, rate=rate, full_frames=full_frames)
+        self._refresh.start()
+        self._coalesce = coalesce
+        return self._refresh
+
+    def stop_refresh(self):
+        """
+        Stop refresh mode if it is running. Coalesced writes that have not
+        been sent yet are left in the universe for the next flush().
+        :return: None
+        """
+        self._coalesce = False
+        if self._refresh is not None:
+            self._refresh.stop()
+            self._refresh = None
@@ -0,0 +1,417 @@
+# recorder.py - Record what is sent to a uDMX interface and play it back
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# A Recorder captures the channel values a uDMXDevice actually sends,
+# frame by frame, into a compact binary log. The send path only hands the
+# sent values to a queue. A writer thread keeps an image of the interface's
+# channels and appends a record whenever it changes.
+#
+# Log format (little endian)
+#
+#   header   magic "uDMXREC1", channel count (H), start time (d, time.time())
+#   records  kind (B), time since start in microseconds (q), payload length (H), payload
+#              keyframe: every channel value
+#              delta: runs of changed channels, each start index (H), count (H), values
+#   index    one time (q), file offset (Q) pair per keyframe
+#   trailer  index offset (Q), keyframe count (I), end time (q), magic "uDMXIDX1"
+#
+# A keyframe is written every keyframe_interval seconds so a Player can
+# seek to any time by binary searching the index and applying at most one
+# interval of deltas. A log that was not closed (e.g. after a crash) has no
+# index. The Player rebuilds it by scanning the records.
+#
+# Usage example
+#
+# dev = pyudmx.uDMXDevice()
+# dev.open()
+# dev.start_recording("show.udmxrec")
+# ... run the show ...
+# dev.stop_recording()
+#
+# player = Player("show.udmxrec")
+# player.play(dev, start=60.0)  # replay from one minute in
+# player.close()
+#
+
+import bisect
+import mmap
+import queue
+import struct
+import threading
+import time
+from typing import Iterator, List, Tuple, Callable  # support type hinting
+from .universe import DMX_UNIVERSE_SIZE, _diff_mask
+
+MAGIC = b"uDMXREC1"
+INDEX_MAGIC = b"uDMXIDX1"
+
+HEADER = struct.Struct("<8sHd")
+RECORD = struct.Struct("<BqH")
+RUN = struct.Struct("<HH")
+INDEX_ENTRY = struct.Struct("<qQ")
+TRAILER = struct.Struct("<QIq8s")
+
+# Record kinds
+KEYFRAME = 1
+DELTA = 2
+
+# Seconds between keyframes
+DEFAULT_KEYFRAME_INTERVAL = 1.0
+
+
+def _runs(old: bytes, new: bytes) -> List[Tuple[int, int]]:
+    """
+    Find the runs of channels that differ between two frames.
+    Runs separated by fewer unchanged channels than a run header
+    are merged, since sending the gap costs less than a new run.
+    :return: a list of (index, count) tuples, index 0 based
+    """
+    mask = _diff_mask(old, new)
+    runs = []
+    start = mask.find(1)
+    while start >= 0:
+        end = mask.find(0, start)
+        if end < 0:
+            end = len(mask)
+        if runs and start - (runs[-1][0] + runs[-1][1]) < RUN.size:
+            runs[-1] = (runs[-1][0], end - runs[-1][0])
+        else:
+            runs.append((start, end - start))
+        start = mask.find(1, end)
+    return runs
+
+
+class Recorder:
+    def __init__(self, path: str, keyframe_interval: float = DEFAULT_KEYFRAME_INTERVAL,
+                 initial: bytes = None, clock: Callable[[], float] = time.perf_counter):
+        """
+        Create a recorder writing to a new log file.
+        :param path: the log file. An existing file is replaced.
+        :param keyframe_interval: seconds between keyframes
+        :param initial: the channel values the interface has when recording
+            starts (e.g. the device's Universe.frame). Defaults to all zeros.
+        :param clock: the time source, in seconds
+        """
+        self._clock = clock
+        self._interval = int(keyframe_interval * 1000000)
+        self._image = bytearray(initial if initial is not None else bytes(DMX_UNIVERSE_SIZE))
+        self._queue = queue.SimpleQueue()
+        self._file = open(path, "wb")
+        self._file.write(HEADER.pack(MAGIC, DMX_UNIVERSE_SIZE, time.time()))
+        self._start = clock()
+        self._index = []
+        self._end = 0
+        self._frames = 0
+        self._bytes = HEADER.size
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name="uDMX-recorder", daemon=True)
+        self._thread.start()
+
+    @property
+    def recording(self) -> bool:
+        """
+        Returns True until the recorder is closed.
+        """
+        return self._thread is not None
+
+    def record(self, pieces: List[Tuple[int, bytes]]):
+        """
+        Record values that were sent to the interface. Never blocks.
+        Called from the send path, see uDMXDevice.start_recording().
+        :param pieces: (channel, values) tuples, channel 1-512. The values
+            must not change afterwards (e.g. bytes).
+        :return: None
+        """
+        self._queue.put((self._clock(), pieces))
+
+    def _write(self, kind: int, t: int, payload: bytes):
+        self._file.write(RECORD.pack(kind, t, len(payload)))
+        self._file.write(payload)
+        self._bytes += RECORD.size + len(payload)
+        self._end = t
+        self._frames += 1
+
+    def _run(self):
+        image = self._image
+        last = bytes(image)
+        next_key = 0
+        start = self._start
+        write = self._write
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            now, pieces = item
+            for channel, values in pieces:
+                image[channel - 1:channel - 1 + len(values)] = values
+            if image == last and self._frames:
+                continue
+            t = int((now - start) * 1000000)
+            try:
+                if t >= next_key:
+                    self._index.append((t, self._bytes))
+                    write(KEYFRAME, t, bytes(image))
+                    next_key = t + self._interval
+                else:
+                    payload = bytearray()
+                    for index, count in _runs(last, image):
+                        payload += RUN.pack(index, count)
+                        payload += image[index:index + count]
+                    write(DELTA, t, payload)
+            except OSError as ex:
+                # e.g. the disk is full. Keep draining so senders are unaffected.
+                self._error = ex
+            last = bytes(image)
+
+    def close(self):
+        """
+        Write everything still queued, add the keyframe index and close the log.
+        :return: None
+        """
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        index_offset = self._bytes
+        for t, offset in self._index:
+            self._file.write(INDEX_ENTRY.pack(t, offset))
+        self._file.write(TRAILER.pack(index_offset, len(self._index), self._end, INDEX_MAGIC))
+        self._file.close()
+
+    def stats(self) -> dict:
+        """
+        Returns a snapshot of the recording.
+            frames: records written
+            keyframes: keyframes written
+            bytes: size of the log so far, excluding the index
+            seconds: time covered by the log
+            last_error: the most recent write error, or None
+        """
+        return {
+            "frames": self._frames,
+            "keyframes": len(self._index),
+            "bytes": self._bytes,
+            "seconds": self._end / 1000000.0,
+            "last_error": self._error,
+        }
+
+
+class Player:
+    def __init__(self, path: str):
+        """
+        Open a log written by a Recorder.
+        :param path: the log file
+        """
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError("{0} is not a uDMX recording".format(path)) from None
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise ValueError("{0} is not a uDMX recording".format(path))
+        magic, self.channels, self.start_time = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("{0} is not a uDMX recording".format(path))
+        self._times = []
+        self._offsets = []
+        if not self._read_index():
+            self._scan()
+
+    def _read_index(self) -> bool:
+        """
+        Load the keyframe index from the trailer.
+        :return: False if the log has no trailer
+        """
+        size = len(self._map)
+        if size < HEADER.size + TRAILER.size:
+            return False
+        index_offset, count, end, magic = TRAILER.unpack_from(self._map, size - TRAILER.size)
+        if magic != INDEX_MAGIC or index_offset + count * INDEX_ENTRY.size != size - TRAILER.size:
+            return False
+        for i in range(count):
+            t, offset = INDEX_ENTRY.unpack_from(self._map, index_offset + i * INDEX_ENTRY.size)
+            self._times.append(t)
+            self._offsets.append(offset)
+        self._records_end = index_offset
+        self._end = end
+        return True
+
+    def _scan(self):
+        """
+        Rebuild the keyframe index of a log that was not closed.
+        A record cut off at the end of the file is ignored.
+        """
+        data = self._map
+        size = len(data)
+        offset = HEADER.size
+        self._end = 0
+        while offset + RECORD.size <= size:
+            kind, t, length = RECORD.unpack_from(data, offset)
+            if offset + RECORD.size + length > size:
+                break
+            if kind == KEYFRAME:
+                self._times.append(t)
+                self._offsets.append(offset)
+            self._end = t
+            offset += RECORD.size + length
+        self._records_end = offset
+
+    @property
+    def duration(self) -> float:
+        """
+        Returns the time covered by the log in seconds.
+        """
+        return self._end / 1000000.0
+
+    @property
+    def keyframes(self) -> int:
+        """
+        Returns the number of keyframes in the log.
+        """
+        return len(self._times)
+
+    def close(self):
+        """
+        Close the log.
+        :return: None
+        """
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def frames(self, start: float = 0.0) -> Iterator[Tuple[float, bytes]]:
+        """
+        Iterate over the frames of the log from a point in time.
+        The first frame is the state of the channels at the start time.
+        :param start: seconds from the start of the log
+        :return: an iterator of (time in seconds, channel values) tuples
+        """
+        if not self._times:
+            return
+        start_us = int(start * 1000000)
+        # The last keyframe at or before the start time
+        i = max(bisect.bisect_right(self._times, start_us) - 1, 0)
+        data = self._map
+        offset = self._offsets[i]
+        end = self._records_end
+        image = bytearray(self.channels)
+        seeking = True
+        while offset < end:
+            kind, t, length = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            if seeking and t > start_us:
+                seeking = False
+                yield max(start_us, self._times[i]) / 1000000.0, bytes(image)
+            if kind == KEYFRAME:
+                image[:] = data[offset:offset + length]
+            else:
+                pos = offset
+                stop = offset + length
+                while pos < stop:
+                    index, count = RUN.unpack_from(data, pos)
+                    pos += RUN.size
+                    image[index:index + count] = data[pos:pos + count]
+                    pos += count
+            offset += length
+            if not seeking:
+                yield t / 1000000.0, bytes(image)
+        if seeking:
+            yield max(start_us, self._times[i]) / 1000000.0, bytes(image)
+
+    def frame_at(self, t: float) -> bytes:
+        """
+        Returns the channel values at a point in time.
+        :param t: seconds from the start of the log
+        """
+        for _, frame in self.frames(t):
+            return frame
+        return bytes(self.channels)
+
+    def play(self, dev, start: float = 0.0, end: float = None, speed: float = 1.0,
+             stop: threading.Event = None, clock: Callable[[], float] = time.perf_counter) -> dict:
+        """
+        Replay the log onto a device with the recorded timing.
+        Each frame is due at an absolute time from the start of playback, so
+        sleep error does not accumulate. Frames that are already overdue when
+        a later frame is also due are skipped, since every frame carries the
+        full state of the channels. If the device's refresh engine is running
+        it sends the frames, otherwise each frame is flushed.
+        :param dev: the uDMXDevice
+        :param start: seconds from the start of the log
+        :param end: seconds from the start of the log to stop at, defaults to the end
+        :param speed: playback speed, 2.0 plays twice as fast
+        :param stop: an optional Event that ends playback when set
+        :param clock: the time source, in seconds
+        :return: playback statistics (frames, skipped, max_lateness_ms)
+        """
+        if speed <= 0:
+            raise ValueError("Playback speed must be positive")
+        universe = dev.Universe
+        frames = 0
+        skipped = 0
+        max_lateness = 0.0
+        anchor = clock()
+        pending = None
+        pending_due = anchor
+        for t, frame in self.frames(start):
+            if end is not None and t > end:
+                break
+            due = anchor + (t - start) / speed
+            if pending is not None:
+                if due <= clock():
+                    # The held frame is overdue and a newer one is due already
+                    skipped += 1
+                else:
+                    if not self._wait(pending_due, stop, clock):
+                        pending = None
+                        break
+                    max_lateness = max(max_lateness, clock() - pending_due)
+                    self._output(dev, universe, pending)
+                    frames += 1
+            pending = frame
+            pending_due = due
+        if pending is not None and self._wait(pending_due, stop, clock):
+            max_lateness = max(max_lateness, clock() - pending_due)
+            self._output(dev, universe, pending)
+            frames += 1
+        return {
+            "frames": frames,
+            "skipped": skipped,
+            "max_lateness_ms": max_lateness * 1000.0,
+        }
+
+    @staticmethod
+    def _wait(due: float, stop: threading.Event, clock: Callable[[], float]) -> bool:
+        """
+        Sleep until a frame is due.
+        :return: False if playback was stopped
+        """
+        wait = due - clock()
+        if stop is not None:
+            return not stop.wait(max(wait, 0.0))
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    @staticmethod
+    def _output(dev, universe, frame: bytes):
+        universe.set_values(1, frame)
+        if dev.Refresh is None:
+            dev.flush()
@@ -0,0 +1,189 @@
+# refresh.py - Fixed rate background refresh for a uDMX interface
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# The RefreshEngine runs an output thread that pushes a device's universe
+# to the uDMX at a fixed frame rate. Applications write channel values into
+# the device's Universe (the back buffer) and never wait for a USB transfer.
+# On every frame the output thread swaps the universe into a private
+# snapshot (the front buffer) and sends it, so the latest write always wins.
+#
+# Usage example
+#
+# dev = pyudmx.uDMXDevice()
+# dev.open()
+# engine = RefreshEngine(dev, rate=40)
+# engine.start()
+# dev.Universe.set_values(1, [255, 0, 0])  # sent on the next frame
+# ...
+# engine.stop()
+# dev.close()
+#
+
+import threading
+import time
+from collections import deque
+from .scheduler import FrameScheduler, DEFAULT_SPIN_US
+
+
+class RefreshEngine:
+    def __init__(self, dev, rate: float = 40.0, full_frames: bool = False, window: int = 256,
+                 spin_us: int = DEFAULT_SPIN_US):
+        """
+        Create a refresh engine for an open uDMXDevice.
+        :param dev: the uDMXDevice to be refreshed
+        :param rate: frame rate in frames per second (e.g. 30-44)
+        :param full_frames: if True, every frame sends the entire universe.
+            Otherwise only the channels that changed are sent.
+        :param window: number of recent frames used for the FPS and jitter statistics
+        :param spin_us: see FrameScheduler
+        """
+        if rate <= 0:
+            raise ValueError("Frame rate must be greater than 0")
+        self._dev = dev
+        self._scheduler = FrameScheduler(rate, spin_us=spin_us, window=window)
+        self._full_frames = full_frames
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._renderers = []
+
+        # Statistics
+        self._frames = 0
+        self._errors = 0
+        self._last_error = None
+        self._frame_times = deque(maxlen=window)
+
+    @property
+    def rate(self) -> float:
+        """
+        Returns the target frame rate in frames per second.
+        """
+        return self._scheduler.rate
+
+    @property
+    def Scheduler(self) -> FrameScheduler:
+        """
+        Returns the FrameScheduler that paces the output thread, e.g. to sync() it to timecode.
+        """
+        return self._scheduler
+
+    @property
+    def running(self) -> bool:
+        """
+        Returns True if the output thread is running.
+        """
+        return self._thread is not None and self._thread.is_alive()
+
+    def add_renderer(self, renderer):
+        """
+        Add a function that is called on the output thread at the start of
+        every frame, before the universe is swapped. Renderers (e.g. a
+        FadeEngine's step method) write the frame's values into the universe.
+        :param renderer: a callable that takes the frame time (time.perf_counter() seconds)
+        :return: None
+        """
+        self._renderers.append(renderer)
+
+    def remove_renderer(self, renderer):
+        """
+        Remove a renderer added by add_renderer().
+        :return: None
+        """
+        self._renderers.remove(renderer)
+
+    def start(self):
+        """
+        Start the output thread.
+        :return: None
+        """
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="uDMX-refresh", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """
+        Stop the output thread. Anything still pending in the universe
+        is left for the next flush().
+        :param timeout: maximum time in seconds to wait for the thread to end
+        :return: None
+        """
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _send_frame(self, now: float, deadline: float):
+        """
+        Render, swap the universe and send it. Runs on the output thread.
+        Retries that would run past the deadline are dropped.
+        """
+        for renderer in list(self._renderers):
+            try:
+                renderer(now)
+            except Exception as ex:
+                self._errors += 1
+                self._last_error = ex
+        if self._full_frames:
+            self._dev.Universe.mark_dirty()
+        try:
+            self._dev.flush(deadline=deadline)
+        except Exception as ex:
+            self._errors += 1
+            self._last_error = ex
+
+    def _run(self):
+        scheduler = self._scheduler
+        scheduler.reset()
+        # The scheduler works on absolute deadlines so that sleep error does
+        # not accumulate. If sending overran one or more frames, they are
+        # skipped rather than caught up with a burst of transfers.
+        while scheduler.wait(self._stop_event):
+            now = time.perf_counter()
+            self._frame_times.append(now)
+            self._send_frame(now, (scheduler.deadline_ns + scheduler.period_ns) / 1e9)
+            self._frames += 1
+
+    def stats(self) -> dict:
+        """
+        Returns a snapshot of the engine's performance.
+            frames: frames sent since the engine was created
+            fps: achieved frame rate over the recent window
+            missed_deadlines: frames skipped because sending overran the frame period
+            jitter_ms: standard deviation of frame start lateness over the recent window
+            max_lateness_ms: worst frame start lateness over the recent window
+            lateness_p50_ms, lateness_p95_ms, lateness_p99_ms: frame start lateness
+                percentiles over the recent window
+            errors: number of frames where sending raised an exception
+            last_error: the most recent exception, or None
+        """
+        times = list(self._frame_times)
+        fps = 0.0
+        if len(times) > 1 and times[-1] > times[0]:
+            fps = (len(times) - 1) / (times[-1] - times[0])
+        timing = self._scheduler.stats()
+        return {
+            "frames": self._frames,
+            "fps": fps,
+            "missed_deadlines": timing["missed_deadlines"],
+            "jitter_ms": timing["jitter_ms"],
+            "max_lateness_ms": timing["max_lateness_ms"],
+            "lateness_p50_ms": timing["lateness_p50_ms"],
+            "lateness_p95_ms": timing["lateness_p95_ms"],
+            "lateness_p99_ms": timing["lateness_p99_ms"],
+            "errors": self._errors,
+            "last_error": self._last_error,
+        }
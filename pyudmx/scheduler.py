@@ -0,0 +1,246 @@
+# scheduler.py - Frame timing for uDMX output
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# A FrameScheduler paces a frame loop. Frame n is due at a fixed point on
+# a timeline measured in integer nanoseconds (time.perf_counter_ns), so
+# sleep error and the time spent sending never accumulate as drift. Most
+# of the wait is an ordinary sleep. The last spin_us microseconds are spent
+# polling the clock, because a sleep on a loaded system (e.g. a Raspberry Pi)
+# often wakes up a millisecond or more late.
+#
+# The timeline can follow an external clock, e.g. incoming timecode. Call
+# sync() with the external time whenever it is received. Small differences
+# are slewed in over several frames, large ones are stepped.
+#
+# The lateness of every frame (how long after its deadline it started) is
+# kept for a window of recent frames and reported as percentiles.
+#
+# Usage example
+#
+# scheduler = FrameScheduler(rate=44)
+# while running:
+#     if not scheduler.wait(stop_event):
+#         break
+#     ... render and flush the frame ...
+# print(scheduler.stats())
+#
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Callable  # support type hinting
+
+# Time spent polling the clock at the end of a wait, in microseconds
+DEFAULT_SPIN_US = 1000
+
+# Largest external clock correction applied per frame, as a fraction of
+# the frame period. Larger differences than a whole period are stepped.
+SLEW_FRACTION = 0.05
+
+
+def _percentile(ordered: list, p: float) -> float:
+    """
+    Returns the p-th percentile (0-100) of a sorted list, nearest rank.
+    """
+    if not ordered:
+        return 0.0
+    rank = max(int(math.ceil(p / 100.0 * len(ordered))) - 1, 0)
+    return ordered[rank]
+
+
+class FrameScheduler:
+    def __init__(self, rate: float, spin_us: int = DEFAULT_SPIN_US, window: int = 1024,
+                 clock_ns: Callable[[], int] = time.perf_counter_ns):
+        """
+        :param rate: frame rate in frames per second (e.g. 30-44)
+        :param spin_us: the last part of each wait, in microseconds, is spent
+            polling the clock instead of sleeping. 0 only sleeps.
+        :param window: number of recent frames used for the statistics
+        :param clock_ns: the time source, in nanoseconds
+        """
+        if rate <= 0:
+            raise ValueError("Frame rate must be greater than 0")
+        self._clock_ns = clock_ns
+        self._period = 1e9 / rate
+        self._spin = spin_us * 1000
+        # External time minus local time, applied and requested
+        self._offset = 0
+        self._target_offset = None
+        self._frame = 0
+        self._deadline = 0
+
+        # Statistics
+        self._frames = 0
+        self._missed = 0
+        self._lateness = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    @property
+    def rate(self) -> float:
+        """
+        Returns the frame rate in frames per second.
+        """
+        return 1e9 / self._period
+
+    @property
+    def period_ns(self) -> float:
+        """
+        Returns the frame period in nanoseconds.
+        """
+        return self._period
+
+    @property
+    def deadline_ns(self) -> int:
+        """
+        Returns the local clock time the current frame was due.
+        """
+        return self._deadline
+
+    @property
+    def frame(self) -> int:
+        """
+        Returns the number of the current frame on the timeline.
+        """
+        return self._frame
+
+    def external_time_ns(self, local_ns: int = None) -> int:
+        """
+        Convert a local clock time to the timeline's (external) time.
+        :param local_ns: local clock time, defaults to now
+        """
+        if local_ns is None:
+            local_ns = self._clock_ns()
+        return local_ns + self._offset
+
+    def reset(self, start_ns: int = None):
+        """
+        Start the timeline. The first frame is due at start_ns.
+        Unless sync() is called, the timeline starts at 0.
+        :param start_ns: local clock time of the first frame, defaults to now
+        :return: None
+        """
+        if start_ns is None:
+            start_ns = self._clock_ns()
+        with self._lock:
+            self._offset = -start_ns
+            self._target_offset = None
+            self._frame = -1
+
+    def sync(self, external_ns: int, local_ns: int = None):
+        """
+        Align the timeline with an external clock, e.g. received timecode.
+        Frames are then due on multiples of the period of external time.
+        :param external_ns: the external clock time in nanoseconds
+        :param local_ns: the local clock time the external time was read, defaults to now
+        :return: None
+        """
+        if local_ns is None:
+            local_ns = self._clock_ns()
+        with self._lock:
+            self._target_offset = external_ns - local_ns
+
+    def _due(self, frame: int) -> int:
+        return int(frame * self._period) - self._offset
+
+    def _adjust_offset(self, now: int):
+        """
+        Move the applied offset towards the one requested by sync().
+        """
+        with self._lock:
+            target = self._target_offset
+            if target is None:
+                return
+            error = target - self._offset
+            if abs(error) > self._period:
+                # Step, and pick up the timeline at the frame that is due next
+                self._offset = target
+                self._target_offset = None
+                self._frame = int((now + target) // self._period)
+                return
+            step = self._period * SLEW_FRACTION
+            if abs(error) <= step:
+                self._offset = target
+                self._target_offset = None
+            else:
+                self._offset += int(math.copysign(step, error))
+
+    def wait(self, stop: threading.Event = None) -> bool:
+        """
+        Wait for the next frame's deadline. If the previous frame overran one
+        or more deadlines, those frames are skipped rather than sent in a burst.
+        :param stop: an optional Event that ends the wait when set
+        :return: False if stop was set, otherwise True
+        """
+        clock = self._clock_ns
+        now = clock()
+        self._adjust_offset(now)
+        frame = self._frame + 1
+        deadline = self._due(frame)
+        if now > deadline:
+            missed = int((now - deadline) // self._period) + 1
+            if self._frames:
+                self._missed += missed
+            else:
+                # The first frame starts late, not missed
+                missed = 0
+            frame += missed
+            deadline = self._due(frame)
+
+        # Sleep through most of the wait, then poll the clock
+        remaining = deadline - now - self._spin
+        if remaining > 0:
+            if stop is not None:
+                if stop.wait(remaining / 1e9):
+                    return False
+            else:
+                time.sleep(remaining / 1e9)
+        elif stop is not None and stop.is_set():
+            return False
+        while clock() < deadline:
+            # Releases the GIL so other threads keep running
+            time.sleep(0)
+
+        self._lateness.append(clock() - deadline)
+        self._frame = frame
+        self._deadline = deadline
+        self._frames += 1
+        return True
+
+    def stats(self) -> dict:
+        """
+        Returns a snapshot of the frame timing over the recent window.
+            frames: frames started
+            missed_deadlines: frames skipped because a frame overran
+            lateness_p50_ms, lateness_p95_ms, lateness_p99_ms, max_lateness_ms:
+                how long after its deadline each frame started
+            jitter_ms: standard deviation of the lateness
+            offset_ms: external time minus local time
+        """
+        lateness = sorted(self._lateness)
+        jitter = 0.0
+        if lateness:
+            mean = sum(lateness) / len(lateness)
+            jitter = math.sqrt(sum((x - mean) ** 2 for x in lateness) / len(lateness))
+        return {
+            "frames": self._frames,
+            "missed_deadlines": self._missed,
+            "lateness_p50_ms": _percentile(lateness, 50) / 1e6,
+            "lateness_p95_ms": _percentile(lateness, 95) / 1e6,
+            "lateness_p99_ms": _percentile(lateness, 99) / 1e6,
+            "max_lateness_ms": (lateness[-1] if lateness else 0) / 1e6,
+            "jitter_ms": jitter / 1e6,
+            "offset_ms": self._offset / 1e6,
+        }
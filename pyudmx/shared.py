@@ -0,0 +1,384 @@
+# shared.py - Share uDMX universes between processes through shared memory
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# Only one process can hold a uDMX interface. A SharedUniverseOwner runs in
+# that process and publishes the universe of one or more uDMXDevices in a
+# multiprocessing.shared_memory segment. Other processes attach to the
+# segment by name with SharedUniverse and write channel values straight
+# into it. Nothing is serialized or sent over a socket.
+#
+# Each universe in the segment has a sequence counter (a seqlock). A writer
+# makes the counter odd, writes, then makes it even again. Writers in
+# different processes take turns through an flock() on a lock file. The
+# owner never takes the lock. On every frame it copies a universe whose
+# counter has moved and keeps the copy if the counter was even and did not
+# change while copying. The copy goes into the device's universe, which
+# sends only the channels that changed. If a writer dies part way through
+# a write, its lock is released but the counter stays odd. The next writer
+# makes it even again and the values the dead writer left, possibly only
+# some of them, go out with that write.
+#
+# Segment layout
+#
+#   header     magic "uDMXSHM1", universe count (H), 6 bytes padding
+#   counters   one sequence counter (Q) per universe
+#   universes  512 channel values per universe
+#
+# Usage example
+#
+# # Owner process
+# dev = pyudmx.uDMXDevice()
+# dev.open()
+# owner = SharedUniverseOwner([dev], name="show")
+# owner.start()
+#
+# # Any other process
+# su = SharedUniverse("show")
+# su.set_values(1, [255, 0, 0])  # sent on the owner's next frame
+# with su.batch():
+#     su.set_value(7, 255)
+#     su.set_value(14, 255)
+# su.close()
+#
+
+import os
+import struct
+import sys
+import tempfile
+from contextlib import contextmanager
+from multiprocessing import shared_memory, resource_tracker
+from typing import Union, List  # support type hinting
+from .universe import DMX_UNIVERSE_SIZE, byte_values
+
+try:
+    import fcntl  # POSIX only
+except ImportError:
+    fcntl = None
+
+MAGIC = b"uDMXSHM1"
+HEADER = struct.Struct("<8sH6x")
+
+# Attempts the owner makes to copy a universe while a writer is busy
+# before leaving it for the next frame
+READ_ATTEMPTS = 3
+
+
+def _layout(count: int) -> tuple:
+    """
+    Returns (counters offset, universes offset, segment size) for count universes.
+    """
+    counters = HEADER.size
+    universes = counters + 8 * count
+    return counters, universes, universes + DMX_UNIVERSE_SIZE * count
+
+
+def lock_file_path(name: str) -> str:
+    """
+    Returns the path of the lock file that serializes writers to a segment.
+    """
+    return os.path.join(tempfile.gettempdir(), "uDMX-{0}.lock".format(name.lstrip("/")))
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to an existing segment without registering it with this process's
+    resource tracker, which would remove the owner's segment when this process exits.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+
+    def skip_shared_memory(resource, rtype):
+        if rtype != "shared_memory":
+            register(resource, rtype)
+    resource_tracker.register = skip_shared_memory
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class SharedUniverseOwner:
+    def __init__(self, devices: List, name: str = None, rate: float = 40.0):
+        """
+        Create a shared memory segment holding the universes of open devices.
+        The segment starts out with the devices' current universe values.
+        :param devices: the uDMXDevices to publish. Writers select one by its index.
+        :param name: the segment name, defaults to a generated name (see name)
+        :param rate: frame rate for devices that are not already in refresh mode
+        """
+        if fcntl is None:
+            raise OSError("Shared universes need POSIX file locking (fcntl)")
+        if not devices:
+            raise ValueError("Publish at least one device")
+        self._devices = list(devices)
+        self._rate = rate
+        count = len(self._devices)
+        counters, universes, size = _layout(count)
+        self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        buf = self._shm.buf
+        HEADER.pack_into(buf, 0, MAGIC, count)
+        self._counters = buf[counters:universes].cast("Q")
+        self._universes = [buf[universes + i * DMX_UNIVERSE_SIZE:universes + (i + 1) * DMX_UNIVERSE_SIZE]
+                           for i in range(count)]
+        for view, dev in zip(self._universes, self._devices):
+            view[:] = dev.Universe.frame
+        # Counter values already copied into each device
+        self._seen = [0] * count
+        self._lock_path = lock_file_path(self._shm.name)
+        open(self._lock_path, "a").close()
+        self._renderers = []
+
+        # Statistics
+        self._updates = 0
+        self._retries = 0
+        self._deferred = 0
+
+    @property
+    def name(self) -> str:
+        """
+        Returns the segment name that SharedUniverse attaches to.
+        """
+        return self._shm.name
+
+    def start(self):
+        """
+        Copy the segment into the devices on every frame.
+        Devices that are not in refresh mode are started at the owner's rate.
+        :return: None
+        """
+        if self._renderers:
+            return
+        for index, dev in enumerate(self._devices):
+            if dev.Refresh is None:
+                dev.start_refresh(rate=self._rate)
+            renderer = self._renderer(index)
+            dev.Refresh.add_renderer(renderer)
+            self._renderers.append((dev, renderer))
+
+    def _renderer(self, index: int):
+        def pull(now: float):
+            self.pull(index)
+        return pull
+
+    def stop(self):
+        """
+        Stop copying the segment into the devices. The devices stay in refresh mode.
+        :return: None
+        """
+        for dev, renderer in self._renderers:
+            if dev.Refresh is not None:
+                try:
+                    dev.Refresh.remove_renderer(renderer)
+                except ValueError:
+                    pass
+        self._renderers = []
+
+    def pull(self, index: int = 0) -> bool:
+        """
+        Copy a universe from the segment into its device if a writer changed it.
+        Runs on the device's output thread once started (see start()).
+        :param index: the universe index
+        :return: True if the universe was copied
+        """
+        counters = self._counters
+        seq = counters[index]
+        if seq == self._seen[index]:
+            return False
+        view = self._universes[index]
+        for attempt in range(READ_ATTEMPTS):
+            if attempt:
+                self._retries += 1
+            seq = counters[index]
+            if seq & 1:
+                # A writer is part way through
+                continue
+            frame = bytes(view)
+            if counters[index] == seq:
+                self._seen[index] = seq
+                self._devices[index].Universe.set_values(1, frame)
+                self._updates += 1
+                return True
+        # Leave it for the next frame rather than wait for the writer
+        self._deferred += 1
+        return False
+
+    def close(self):
+        """
+        Stop, then remove the segment and its lock file.
+        Attached writers keep their mapping until they close.
+        :return: None
+        """
+        if self._shm is None:
+            return
+        self.stop()
+        self._counters.release()
+        for view in self._universes:
+            view.release()
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+        try:
+            os.remove(self._lock_path)
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        """
+        Returns a snapshot of the owner's activity.
+            updates: universes copied into devices
+            retries: copies repeated because a writer was busy
+            deferred: frames where a universe was left for the next frame
+        """
+        return {
+            "updates": self._updates,
+            "retries": self._retries,
+            "deferred": self._deferred,
+        }
+
+
+class SharedUniverse:
+    def __init__(self, name: str, universe: int = 0):
+        """
+        Attach to a universe published by a SharedUniverseOwner.
+        :param name: the segment name (SharedUniverseOwner.name)
+        :param universe: the index of the universe in the segment
+        """
+        if fcntl is None:
+            raise OSError("Shared universes need POSIX file locking (fcntl)")
+        self._shm = _attach(name)
+        buf = self._shm.buf
+        magic, count = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            self._shm.close()
+            raise ValueError("{0} is not a shared uDMX universe".format(name))
+        if universe < 0 or universe >= count:
+            self._shm.close()
+            raise ValueError("Universe {0} is outside 0-{1}".format(universe, count - 1))
+        counters, universes, _ = _layout(count)
+        self._index = universe
+        self._counters = buf[counters:universes].cast("Q")
+        start = universes + universe * DMX_UNIVERSE_SIZE
+        self._data = buf[start:start + DMX_UNIVERSE_SIZE]
+        self._lock_file = open(lock_file_path(name), "a")
+        self._depth = 0
+        # Writes left unfinished by writers that died, see _begin()
+        self.recovered = 0
+
+    @contextmanager
+    def batch(self):
+        """
+        Group several writes so the owner sends them in the same frame.
+        Other writers wait until the batch ends, so keep it short.
+        """
+        self._begin()
+        try:
+            yield self
+        finally:
+            self._end()
+
+    def _begin(self):
+        if self._depth == 0:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            seq = self._counters[self._index]
+            if seq & 1:
+                # The last writer died part way through a write. Its values may
+                # be torn. Make the counter even again, or every later write
+                # would leave it odd and the owner would never copy the universe.
+                seq += 1
+                self.recovered += 1
+            self._counters[self._index] = seq + 1
+        self._depth += 1
+
+    def _end(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._counters[self._index] += 1
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _check_range(self, channel: int, count: int = 1):
+        if channel < 1 or channel + count - 1 > DMX_UNIVERSE_SIZE:
+            raise ValueError("Channel range {0}-{1} is outside 1-512".format(channel, channel + count - 1))
+
+    def set_value(self, channel: int, value: int):
+        """
+        Set a single channel.
+        :param channel: DMX channel number, 1-512
+        :param value: Value for the channel, 0-255
+        :return: None
+        """
+        self._check_range(channel)
+        if value < 0 or value > 255:
+            raise ValueError("Value {0} is outside 0-255".format(value))
+        self._begin()
+        try:
+            self._data[channel - 1] = value
+        finally:
+            self._end()
+
+    def set_values(self, channel: int, values: Union[List[int], bytes, bytearray, memoryview]):
+        """
+        Set a range of consecutive channels.
+        :param channel: The starting DMX channel number, 1-512
+        :param values: any sequence of integer values (e.g a list). Each value 0-255.
+        :return: None
+        """
+        values = byte_values(values)
+        n = len(values)
+        self._check_range(channel, n)
+        self._begin()
+        try:
+            self._data[channel - 1:channel - 1 + n] = values
+        finally:
+            self._end()
+
+    def get_values(self, channel: int = 1, count: int = DMX_UNIVERSE_SIZE) -> bytes:
+        """
+        Returns the current values of a range of consecutive channels.
+        :param channel: The starting DMX channel number, 1-512
+        :param count: number of channels, defaults to the whole universe
+        """
+        self._check_range(channel, count)
+        view = self._data[channel - 1:channel - 1 + count]
+        if self._depth:
+            # Inside a batch no one else can write
+            return bytes(view)
+        counters = self._counters
+        for attempt in range(READ_ATTEMPTS):
+            seq = counters[self._index]
+            if not seq & 1:
+                values = bytes(view)
+                if counters[self._index] == seq:
+                    return values
+        # A writer is busy, or died part way through. Read while holding the
+        # lock, which waits for a busy writer and keeps other writers out.
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            return bytes(view)
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def close(self):
+        """
+        Detach from the segment.
+        :return: None
+        """
+        if self._shm is None:
+            return
+        self._counters.release()
+        self._data.release()
+        self._shm.close()
+        self._shm = None
+        self._lock_file.close()
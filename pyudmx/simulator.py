@@ -0,0 +1,205 @@
+# simulator.py - Simulated uDMX interface for working without hardware
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# SimulatedDevice stands in for the usb.core.Device of a uDMX interface.
+# It implements the SetSingleChannel and SetMultiChannel vendor requests
+# with the same wValue/wIndex semantics as the uDMX firmware and keeps the
+# resulting 512 channel universe where it can be inspected.
+#
+# Transfer timing follows the low speed USB model used by universe.py: a
+# transfer costs transfer_packets(length) packets and each packet takes
+# packet_time seconds. With realtime=True the simulator actually sleeps for
+# that long (releasing the GIL like a real transfer), so frame rates and
+# channel counts can be sized before buying hardware. The default packet
+# time is an estimate; use the numbers measured on a real interface (see
+# tryusb.py --probe) for serious capacity planning.
+#
+# Overflow and disconnect errors can be injected to exercise the retry
+# and reconnect paths of uDMXDevice.
+#
+# Usage example
+#
+# backend = SimulatedBackend()
+# dev = pyudmx.uDMXDevice()
+# dev.open(backend=backend)
+# dev.send_single_value(1, 255)
+# print(backend.devices[0].universe[0]) # 255
+#
+
+import errno
+import random
+import time
+import usb  # the pyusb module is required to be in the current environment
+from typing import List  # support type hinting
+from .universe import DMX_UNIVERSE_SIZE, transfer_packets
+from .pyudmx import (SetSingleChannel, SetMultiChannel, LIBUSB_ERROR_NO_DEVICE, LIBUSB_ERROR_OVERFLOW,
+                     LIBUSB_ERROR_PIPE)
+
+# Estimated time per low speed control transfer packet in seconds.
+# A full universe (66 packets) then takes about 33 ms.
+DEFAULT_PACKET_TIME = 0.0005
+
+
+class SimulatedDevice:
+    idVendor = 0x16c0
+    idProduct = 0x5dc
+    manufacturer = "www.anyma.ch"
+    product = "uDMX"
+
+    def __init__(self, bus: int = 1, address: int = 1, port_numbers: tuple = (1,), serial_number: str = "sim",
+                 packet_time: float = DEFAULT_PACKET_TIME, realtime: bool = True,
+                 overflow_rate: float = 0.0, disconnect_after: int = None, seed: int = None):
+        """
+        :param bus: USB bus number
+        :param address: USB device address
+        :param port_numbers: port path from the root hub
+        :param serial_number: reported serial number
+        :param packet_time: seconds per low speed packet
+        :param realtime: if True, transfers take as long as the timing model says
+        :param overflow_rate: probability (0.0-1.0) that a transfer fails with an overflow error
+        :param disconnect_after: if set, the device disconnects after this many transfers
+        :param seed: random seed for repeatable error injection
+        """
+        self.bus = bus
+        self.address = address
+        self.port_numbers = port_numbers
+        self.serial_number = serial_number
+        self.packet_time = packet_time
+        self.realtime = realtime
+        self.overflow_rate = overflow_rate
+        self.disconnect_after = disconnect_after
+        self.connected = True
+        self._random = random.Random(seed)
+
+        # Inspectable state
+        self.universe = bytearray(DMX_UNIVERSE_SIZE)
+        self.transfers = 0
+        self.bytes = 0
+        self.errors = 0
+        self.busy_time = 0.0
+
+    def __str__(self):
+        return "SimulatedDevice {0:04x}:{1:04x} bus {2} address {3}".format(self.idVendor, self.idProduct,
+                                                                           self.bus, self.address)
+
+    def transfer_time(self, length: int) -> float:
+        """
+        Returns the modelled duration in seconds of a transfer of length channels.
+        """
+        return transfer_packets(length) * self.packet_time
+
+    def disconnect(self):
+        """
+        Simulate unplugging the interface.
+        """
+        self.connected = False
+
+    def _spend(self, duration: float):
+        self.busy_time += duration
+        if self.realtime:
+            time.sleep(duration)
+
+    def ctrl_transfer(self, bmRequestType, bRequest, wValue=0, wIndex=0, data_or_wLength=None, timeout=None):
+        """
+        Perform a uDMX vendor request. See usb.core.Device.ctrl_transfer().
+        """
+        if not self.connected:
+            raise usb.core.USBError("No such device (it may have been disconnected)", LIBUSB_ERROR_NO_DEVICE,
+                                    errno.ENODEV)
+        if self.disconnect_after is not None and self.transfers >= self.disconnect_after:
+            self.connected = False
+            raise usb.core.USBError("No such device (it may have been disconnected)", LIBUSB_ERROR_NO_DEVICE,
+                                    errno.ENODEV)
+
+        if bRequest == SetSingleChannel:
+            length = 1
+        elif bRequest == SetMultiChannel:
+            length = wValue
+        else:
+            # The firmware stalls on requests it does not know
+            raise usb.core.USBError("Pipe error", LIBUSB_ERROR_PIPE, errno.EPIPE)
+
+        self.transfers += 1
+        self._spend(self.transfer_time(length))
+        if self.overflow_rate and self._random.random() < self.overflow_rate:
+            self.errors += 1
+            raise usb.core.USBError("Overflow", LIBUSB_ERROR_OVERFLOW, errno.EOVERFLOW)
+
+        if bRequest == SetSingleChannel:
+            if wIndex >= DMX_UNIVERSE_SIZE:
+                raise usb.core.USBError("Pipe error", LIBUSB_ERROR_PIPE, errno.EPIPE)
+            self.universe[wIndex] = wValue & 0xff
+            self.bytes += 1
+            # pyusb returns the data_or_wLength value for a transfer without data
+            return data_or_wLength
+
+        data = bytes(data_or_wLength)
+        if wValue < 1 or wIndex + wValue > DMX_UNIVERSE_SIZE or len(data) < wValue:
+            raise usb.core.USBError("Pipe error", LIBUSB_ERROR_PIPE, errno.EPIPE)
+        self.universe[wIndex:wIndex + wValue] = data[:wValue]
+        self.bytes += wValue
+        return len(data)
+
+
+class SimulatedBackend:
+    """
+    A device backend (see pyudmx.PyUSBBackend) that finds SimulatedDevices.
+    """
+    def __init__(self, devices: List[SimulatedDevice] = None, **kwargs):
+        """
+        :param devices: the simulated interfaces that are plugged in. By default
+            a single SimulatedDevice is created using any keyword arguments given.
+        """
+        if devices is None:
+            devices = [SimulatedDevice(**kwargs)]
+        self.devices = list(devices)
+
+    def find(self, find_all: bool = False, custom_match=None, **kwargs):
+        """
+        Find plugged in devices. Takes the same arguments as usb.core.find().
+        """
+        def matches(dev):
+            if not dev.connected:
+                return False
+            for name, value in kwargs.items():
+                if getattr(dev, name, None) != value:
+                    return False
+            return custom_match is None or custom_match(dev)
+
+        found = [dev for dev in self.devices if matches(dev)]
+        if find_all:
+            return iter(found)
+        return found[0] if found else None
+
+    def dispose(self, dev):
+        pass
+
+    def plug(self, dev: SimulatedDevice):
+        """
+        Plug an interface (back) in.
+        A replugged interface keeps its port path but gets a new address.
+        """
+        if dev in self.devices:
+            dev.address = max(d.address for d in self.devices) + 1
+        else:
+            self.devices.append(dev)
+        dev.connected = True
+        dev.disconnect_after = None
+
+    def unplug(self, dev: SimulatedDevice):
+        """
+        Unplug an interface.
+        """
+        dev.disconnect()
@@ -0,0 +1,389 @@
+# universe.py - DMX universe buffer with dirty range tracking
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+# A Universe holds the 512 channel values last written by the application
+# along with a mask of the channels that have changed since they were
+# last sent to the uDMX. The uDMXDevice uses the mask to work out the
+# smallest set of control transfers needed to bring the interface up to date.
+#
+# Usage example
+#
+# dev = pyudmx.uDMXDevice()
+# dev.open()
+# dev.Universe.set_value(1, 255)
+# dev.Universe.set_values(5, [128, 0, 64])
+# dev.flush() # sends only the channels that changed
+# dev.close()
+#
+
+import sys
+import threading
+from array import array
+from typing import Union, List, Tuple  # support type hinting
+
+# Number of channels in a DMX universe
+DMX_UNIVERSE_SIZE = 512
+
+# The uDMX is a low speed USB device. Control transfers move data in
+# 8 byte packets and every transfer pays for a setup and a status stage.
+PACKET_SIZE = 8
+TRANSFER_OVERHEAD_PACKETS = 2
+
+# Translation table that maps any non-zero byte to 1
+_CHANGED = bytes([0] + [1] * 255)
+
+
+def transfer_packets(length: int) -> int:
+    """
+    Estimate the cost of a control transfer in low speed USB packets.
+    A single channel transfer carries its value in the setup stage and
+    has no data stage. A multi-channel transfer adds one data packet
+    for every 8 values.
+    :param length: number of channels in the transfer
+    :return: number of packets needed for the transfer
+    """
+    if length == 1:
+        return TRANSFER_OVERHEAD_PACKETS
+    return TRANSFER_OVERHEAD_PACKETS + (length + PACKET_SIZE - 1) // PACKET_SIZE
+
+
+def _diff_mask(old: bytes, new: bytes) -> bytes:
+    """
+    Compare two equal length byte sequences.
+    :return: a bytes object containing 1 where the sequences differ, otherwise 0.
+    """
+    n = len(new)
+    x = int.from_bytes(old, "big") ^ int.from_bytes(new, "big")
+    return x.to_bytes(n, "big").translate(_CHANGED)
+
+
+def check_range(channel: int, count: int = 1, size: int = DMX_UNIVERSE_SIZE):
+    """
+    Raise ValueError unless count channels starting at channel fit in a universe.
+    :param channel: The starting DMX channel number, 1-512
+    :param count: number of channels
+    :param size: number of channels in the universe
+    """
+    if channel < 1 or channel + count - 1 > size:
+        raise ValueError("Channel range {0}-{1} is outside 1-{2}".format(channel, channel + count - 1, size))
+
+
+def byte_values(values) -> Union[bytes, bytearray, memoryview, array]:
+    """
+    Returns channel values as a buffer of unsigned bytes, without copying
+    when they already are one: bytes, bytearray, array('B'), or any other
+    one dimensional buffer of unsigned bytes (e.g. a memoryview slice or a
+    uint8 NumPy array). Anything else is converted in a single pass, which
+    also checks that every value is 0-255.
+    :param values: a buffer or any sequence of integer values
+    :return: the values as bytes-like object
+    """
+    if isinstance(values, (bytes, bytearray)):
+        return values
+    # bytearray() raises ValueError if any value is outside 0-255
+    if isinstance(values, (list, tuple)):
+        return bytearray(values)
+    if isinstance(values, array) and values.typecode == "B":
+        return values
+    try:
+        view = memoryview(values)
+    except TypeError:
+        # Other sequences and iterables
+        return bytearray(values)
+    if view.ndim == 1 and view.format == "B":
+        return view
+    # Buffers of other item types (e.g. array('h') or int NumPy arrays)
+    return bytearray(view.tolist())
+
+
+class Universe:
+    def __init__(self, size: int = DMX_UNIVERSE_SIZE):
+        self._size = size
+        self._data = bytearray(size)
+        # One byte per channel, 1 if the channel needs to be sent
+        self._dirty = bytearray(size)
+        # Zeros for clearing the dirty mask without allocating
+        self._clean = memoryview(bytes(size))
+        # Writers and swap() may run on different threads
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def frame(self) -> bytes:
+        """
+        Returns a copy of the current channel values.
+        Index 0 holds the value for DMX channel 1.
+        """
+        return bytes(self._data)
+
+    @property
+    def is_dirty(self) -> bool:
+        """
+        Returns True if any channel has changed since it was last sent.
+        """
+        return self._dirty.find(1) >= 0
+
+    def _check_range(self, channel: int, count: int = 1):
+        check_range(channel, count, self._size)
+
+    def get_value(self, channel: int) -> int:
+        """
+        Returns the current value of a channel.
+        :param channel: DMX channel number, 1-512
+        """
+        self._check_range(channel)
+        return self._data[channel - 1]
+
+    def get_values(self, channel: int, count: int) -> bytes:
+        """
+        Returns the current values of a range of consecutive channels.
+        :param channel: The starting DMX channel number, 1-512
+        :param count: number of channels
+        """
+        self._check_range(channel, count)
+        return bytes(self._data[channel - 1:channel - 1 + count])
+
+    def set_value(self, channel: int, value: int):
+        """
+        Set a single channel. The channel is marked dirty only if its value changes.
+        :param channel: DMX channel number, 1-512
+        :param value: Value for the channel, 0-255
+        :return: None
+        """
+        self._check_range(channel)
+        if value < 0 or value > 255:
+            raise ValueError("Value {0} is outside 0-255".format(value))
+        index = channel - 1
+        with self._lock:
+            if self._data[index] != value:
+                self._data[index] = value
+                self._dirty[index] = 1
+
+    def set_values(self, channel: int, values: Union[List[int], bytes, bytearray, memoryview]) -> bool:
+        """
+        Set a range of consecutive channels. Only the channels whose
+        values change are marked dirty.
+        :param channel: The starting DMX channel number, 1-512
+        :param values: any sequence of integer values (e.g a list). Each value 0-255.
+        A buffer of unsigned bytes (see byte_values()) is copied straight into the universe.
+        :return: True if any channel changed
+        """
+        values = byte_values(values)
+        if len(values) == 0:
+            return False
+        self._check_range(channel, len(values))
+        with self._lock:
+            return self._write(channel - 1, values)
+
+    def set_spans(self, spans: List[Tuple[int, Union[List[int], bytes, bytearray, memoryview]]]) -> bool:
+        """
+        Set several ranges of channels at once. A swap() sees either none or all
+        of them, e.g. for the messages of an OSC bundle. Later spans override
+        earlier ones where they overlap.
+        :param spans: (channel, values) tuples, see set_values()
+        :return: True if any channel changed
+        """
+        spans = [(channel, byte_values(values)) for channel, values in spans]
+        for channel, values in spans:
+            self._check_range(channel, max(len(values), 1))
+        changed = False
+        with self._lock:
+            for channel, values in spans:
+                if len(values) and self._write(channel - 1, values):
+                    changed = True
+        return changed
+
+    def scatter(self, indices, values) -> bool:
+        """
+        Set channels that need not be consecutive, e.g. the channels of a
+        fixture selection or the channels a renderer is driving. Only these
+        channels are written, so writes other threads make to the rest of the
+        universe in the meantime are kept. Only the channels whose values
+        change are marked dirty.
+        :param indices: zero based channel indices (index 0 is DMX channel 1),
+            a sequence of integers or a NumPy integer array
+        :param values: one value 0-255 for each index
+        :return: True if any channel changed
+        """
+        # NumPy is not imported here, it is slow to load and the send path
+        # does not need it. Index arrays can only come from callers that
+        # have imported it already.
+        numpy = sys.modules.get("numpy")
+        if numpy is not None and isinstance(indices, numpy.ndarray):
+            indices = indices.ravel()
+            values = numpy.asarray(values).ravel()
+            if len(values) != len(indices):
+                raise ValueError("Expected {0} values, got {1}".format(len(indices), len(values)))
+            if len(indices) == 0:
+                return False
+            if indices.min() < 0 or indices.max() >= self._size:
+                raise ValueError("Channel index is outside 0-{0}".format(self._size - 1))
+            if values.dtype != numpy.uint8:
+                if values.min() < 0 or values.max() > 255:
+                    raise ValueError("Values must be 0-255")
+                values = values.astype(numpy.uint8)
+            with self._lock:
+                data = numpy.frombuffer(self._data, dtype=numpy.uint8)
+                changed = indices[data[indices] != values]
+                if len(changed) == 0:
+                    return False
+                data[indices] = values
+                numpy.frombuffer(self._dirty, dtype=numpy.uint8)[changed] = 1
+            return True
+
+        values = byte_values(values)
+        if len(values) != len(indices):
+            raise ValueError("Expected {0} values, got {1}".format(len(indices), len(values)))
+        if len(indices) == 0:
+            return False
+        if min(indices) < 0 or max(indices) >= self._size:
+            raise ValueError("Channel index is outside 0-{0}".format(self._size - 1))
+        data = self._data
+        dirty = self._dirty
+        changed = False
+        with self._lock:
+            for index, value in zip(indices, values):
+                if data[index] != value:
+                    data[index] = value
+                    dirty[index] = 1
+                    changed = True
+        return changed
+
+    def _write(self, start: int, values) -> bool:
+        """
+        Write values at a zero based index and mark the changed channels dirty.
+        Called with the lock held.
+        """
+        end = start + len(values)
+        old = self._data[start:end]
+        if old == values:
+            return False
+        changed = _diff_mask(old, values)
+        dirty = int.from_bytes(self._dirty[start:end], "big") | int.from_bytes(changed, "big")
+        self._dirty[start:end] = dirty.to_bytes(end - start, "big")
+        self._data[start:end] = values
+        return True
+
+    def commit(self, channel: int, values: Union[List[int], bytes, bytearray]):
+        """
+        Record values that were sent to the uDMX outside of a flush.
+        The channels take on the values and are marked clean.
+        :param channel: The starting DMX channel number, 1-512
+        :param values: the values that were sent
+        :return: None
+        """
+        n = len(values)
+        self._check_range(channel, n)
+        start = channel - 1
+        with self._lock:
+            self._data[start:start + n] = values
+            self._dirty[start:start + n] = self._clean[:n]
+
+    def mark_sent(self, channel: int, values: Union[List[int], bytes, bytearray, memoryview]):
+        """
+        Record values that went out to the uDMX with others, e.g. as padding
+        around a transfer. Channels that still hold the value sent are marked
+        clean. Channels written since then keep their new value and stay dirty.
+        :param channel: The starting DMX channel number, 1-512
+        :param values: the values that were sent
+        :return: None
+        """
+        n = len(values)
+        self._check_range(channel, n)
+        start = channel - 1
+        with self._lock:
+            data = self._data
+            dirty = self._dirty
+            for i, value in enumerate(values, start):
+                if data[i] == value:
+                    dirty[i] = 0
+
+    def mark_dirty(self, channel: int = 1, count: int = None):
+        """
+        Force a range of channels to be sent on the next flush.
+        By default the whole universe is marked.
+        :param channel: The starting DMX channel number, 1-512
+        :param count: number of channels, defaults to the rest of the universe
+        :return: None
+        """
+        if count is None:
+            count = self._size - channel + 1
+        self._check_range(channel, count)
+        with self._lock:
+            self._dirty[channel - 1:channel - 1 + count] = b"\x01" * count
+
+    def mark_clean(self):
+        """
+        Clear the dirty mask without sending anything.
+        :return: None
+        """
+        with self._lock:
+            self._dirty[:] = self._clean
+
+    def dirty_runs(self) -> List[Tuple[int, int]]:
+        """
+        Returns the runs of consecutive dirty channels.
+        :return: a list of (channel, count) tuples where channel is 1-512
+        """
+        runs = []
+        dirty = self._dirty
+        start = dirty.find(1)
+        while start >= 0:
+            end = dirty.find(0, start)
+            if end < 0:
+                end = self._size
+            runs.append((start + 1, end - start))
+            start = dirty.find(1, end)
+        return runs
+
+    def swap(self) -> Tuple[bytes, List[Tuple[int, int]]]:
+        """
+        Atomically take a snapshot of the universe for sending.
+        The universe acts as the back buffer that applications write into
+        and the snapshot is the front buffer handed to the uDMX. Writes that
+        arrive after the swap are picked up by the next one.
+        :return: (frame, transfers) where frame is a copy of the channel
+        values and transfers is the plan() for the dirty channels.
+        The dirty mask is cleared.
+        """
+        with self._lock:
+            transfers = self.plan()
+            if not transfers:
+                return b"", transfers
+            frame = bytes(self._data)
+            self._dirty[:] = self._clean
+        return frame, transfers
+
+    def plan(self) -> List[Tuple[int, int]]:
+        """
+        Work out the transfers needed to send all dirty channels.
+        Neighbouring runs are merged into one transfer whenever the merged
+        transfer costs no more packets than sending the runs separately.
+        The clean channels that end up inside a merged transfer are simply
+        sent again with their current values.
+        :return: a list of (channel, count) tuples, one per transfer
+        """
+        transfers = []
+        for channel, count in self.dirty_runs():
+            if transfers:
+                last_channel, last_count = transfers[-1]
+                merged = channel + count - last_channel
+                if transfer_packets(merged) <= transfer_packets(last_count) + transfer_packets(count):
+                    transfers[-1] = (last_channel, merged)
+                    continue
+            transfers.append((channel, count))
+        return transfers
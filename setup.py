@@ -46,6 +46,7 @@ setup(
     include_package_data=True,
     packages=find_packages(exclude=['tests*']),
     install_requires=['pyusb>=1.0.2'],
+    extras_require={'numpy': ['numpy']},
     classifiers = [
         "Programming Language :: Python :: 3",
         "Operating System :: OS Independent"
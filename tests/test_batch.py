@@ -0,0 +1,78 @@
+# test_batch.py - uDMX.py --batch tests
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+import uDMX
+from pyudmx import pyudmx
+from pyudmx.simulator import SimulatedBackend
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = SimulatedBackend(realtime=False)
+        self.sim = self.backend.devices[0]
+        fd, self.path = tempfile.mkstemp(suffix=".batch")
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def run_batch(self, text: str, path: str = None, ok: bool = True) -> str:
+        with open(self.path, "w") as f:
+            f.write(text)
+        output = io.StringIO()
+        with mock.patch.object(pyudmx, "default_backend", self.backend), \
+                mock.patch.object(uDMX, "pyudmx", pyudmx), contextlib.redirect_stdout(output):
+            self.assertEqual(uDMX.run_batch(path or self.path), ok)
+        return output.getvalue()
+
+    def test_writes_matching_a_fresh_universe_are_sent(self):
+        # The interface still has values from an earlier run
+        self.sim.universe[0:2] = b"\xff\xff"
+        self.run_batch("1 0\n2 0 0\nwait 10\n")
+        self.assertEqual(self.sim.universe[:3], bytes(3))
+
+    def test_range_is_checked_up_to_the_last_value(self):
+        output = self.run_batch("1 5\n510 1 2 3 4\n512 9\n")
+        self.assertIn("Line 2", output)
+        self.assertEqual(self.sim.universe[0], 5)
+        self.assertEqual(self.sim.universe[509:], b"\x00\x00\x09")
+
+    def test_frames_between_waits(self):
+        self.run_batch("# comment\n1 1\n1 2\nwait 0\n1 3\n")
+        # The first frame sends only the latest value of channel 1
+        self.assertEqual(self.sim.transfers, 2)
+        self.assertEqual(self.sim.universe[0], 3)
+
+    def test_missing_batch_file(self):
+        output = self.run_batch("", path=self.path + ".missing", ok=False)
+        self.assertIn("Unable to read batch file", output)
+
+    def test_device_error_is_not_reported_as_a_file_error(self):
+        # USBError is an OSError
+        with mock.patch.object(pyudmx.uDMXDevice, "flush", side_effect=pyudmx.usb.core.USBError("Pipe error")):
+            output = self.run_batch("1 1\n", ok=False)
+        self.assertIn("uDMX interface error", output)
+        self.assertNotIn("batch file", output)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+# test_bridge.py - Art-Net and sACN bridge tests over loopback
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import socket
+import struct
+import time
+import unittest
+from pyudmx import pyudmx
+from pyudmx.bridge import DMXBridge, ARTNET, SACN, ARTNET_ID, ARTNET_OP_DMX, SACN_ID
+from pyudmx.simulator import SimulatedBackend
+
+
+def artdmx(universe: int, sequence: int, data: bytes) -> bytes:
+    """
+    Build an ArtDmx packet.
+    """
+    return ARTNET_ID + struct.pack("<H", ARTNET_OP_DMX) + struct.pack(">HBBBBH", 14, sequence, 0,
+                                                                        universe & 0xff, universe >> 8, len(data)) + data
+
+
+def sacn_data(universe: int, sequence: int, data: bytes, options: int = 0, start_code: int = 0) -> bytes:
+    """
+    Build an E1.31 data packet.
+    """
+    count = len(data) + 1
+    dmp = struct.pack(">HBBHHH", 0x7000 | (10 + count), 0x02, 0xa1, 0, 1, count) + bytes([start_code]) + data
+    framing = struct.pack(">HI64sBHBBH", 0x7000 | (77 + len(dmp)), 0x00000002, b"test", 100, 0, sequence,
+                          options, universe) + dmp
+    root = struct.pack(">HI16s", 0x7000 | (22 + len(framing)), 0x00000004, bytes(16)) + framing
+    return struct.pack(">HH", 0x0010, 0) + SACN_ID + root
+
+
+class BridgeTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = SimulatedBackend(realtime=False)
+        self.dev = pyudmx.uDMXDevice()
+        self.dev.open(backend=self.backend)
+        self.bridge = DMXBridge(host="127.0.0.1", artnet_port=0, sacn_port=0, rate=100, multicast=False)
+        self.bridge.map(ARTNET, 1, self.dev)
+        self.bridge.map(SACN, 2, self.dev)
+        self.bridge.start()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def tearDown(self):
+        self.sock.close()
+        self.bridge.stop()
+        self.dev.close()
+
+    def send(self, protocol: str, *packets: bytes):
+        address = self.bridge.addresses[protocol]
+        for packet in packets:
+            self.sock.sendto(packet, address)
+
+    def wait_for_packets(self, key: str, packets: int, malformed: int = 0) -> dict:
+        end = time.perf_counter() + 2.0
+        while time.perf_counter() < end:
+            stats = self.bridge.stats()
+            if stats[key]["packets"] >= packets and stats["malformed"] >= malformed:
+                return stats
+            time.sleep(0.005)
+        self.fail("Bridge did not receive the packets: {0}".format(self.bridge.stats()))
+
+    def test_artdmx(self):
+        self.send(ARTNET, artdmx(1, 1, b"\x01\x02\x03"), artdmx(1, 2, b"\x01\x02\x03"),
+                  artdmx(1, 5, b"\x04"), artdmx(1, 4, b"\x09"), artdmx(7, 1, b"\x09"))
+        stats = self.wait_for_packets("artnet:1", 4)["artnet:1"]
+        self.assertEqual(stats["duplicates"], 1)
+        self.assertEqual(stats["gaps"], 2)
+        self.assertEqual(stats["out_of_order"], 1)
+        self.assertEqual(self.dev.Universe.get_values(1, 3), b"\x04\x02\x03")
+
+    def test_sacn(self):
+        self.send(SACN, sacn_data(2, 254, b"\x10\x20"), sacn_data(2, 255, b"\x10\x20"),
+                  sacn_data(2, 1, b"\x30"), sacn_data(2, 0, b"\x40"),
+                  sacn_data(2, 2, b"\x50", options=0x80), sacn_data(2, 3, b"\x60", start_code=0xdd))
+        stats = self.wait_for_packets("sacn:2", 4)["sacn:2"]
+        self.assertEqual(stats["duplicates"], 1)
+        # 255 -> 1 skips 0, which then arrives late
+        self.assertEqual(stats["gaps"], 1)
+        self.assertEqual(stats["out_of_order"], 1)
+        self.assertEqual(self.dev.Universe.get_values(1, 2), b"\x30\x20")
+
+    def test_malformed_packets(self):
+        self.send(ARTNET, b"Art-Net\x00", artdmx(1, 1, b"\x01")[:-1], b"x" * 20)
+        good = artdmx(1, 1, b"\x07")
+        # A length field larger than the data
+        bad = good[:16] + struct.pack(">H", 10) + good[18:]
+        self.send(ARTNET, bad, good)
+        stats = self.wait_for_packets("artnet:1", 1, malformed=4)
+        self.assertEqual(stats["malformed"], 4)
+        self.assertEqual(self.dev.Universe.get_value(1), 7)
+
+    def test_data_reaches_interface(self):
+        self.send(ARTNET, artdmx(1, 0, bytes(range(1, 11))))
+        self.wait_for_packets("artnet:1", 1)
+        sim = self.backend.devices[0]
+        end = time.perf_counter() + 2.0
+        while sim.universe[:10] != bytes(range(1, 11)) and time.perf_counter() < end:
+            time.sleep(0.005)
+        self.assertEqual(sim.universe[:10], bytes(range(1, 11)))
+
+
+if __name__ == "__main__":
+    unittest.main()
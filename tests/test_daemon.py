@@ -0,0 +1,70 @@
+# test_daemon.py - uDMX.py daemon socket tests
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import socket
+import stat
+import tempfile
+import unittest
+from unittest import mock
+import uDMX
+
+
+@unittest.skipUnless(hasattr(socket, "AF_UNIX"), "Unix domain sockets are not available")
+class DaemonSocketTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        # No XDG_RUNTIME_DIR and a temp directory of our own
+        environ = {k: v for k, v in os.environ.items() if k != "XDG_RUNTIME_DIR"}
+        for patcher in (mock.patch.dict(os.environ, environ, clear=True),
+                        mock.patch.object(tempfile, "tempdir", self.tmp.name),
+                        mock.patch.object(uDMX, "config", {})):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.private = os.path.join(self.tmp.name, "uDMX-{0}".format(os.getuid()))
+
+    def test_runtime_dir(self):
+        with mock.patch.dict(os.environ, {"XDG_RUNTIME_DIR": self.tmp.name}):
+            self.assertEqual(uDMX.daemon_socket_path(), os.path.join(self.tmp.name, "uDMX.sock"))
+
+    def test_private_temp_dir(self):
+        # A client does not create the directory
+        with self.assertRaises(OSError):
+            uDMX.daemon_socket_path()
+        path = uDMX.daemon_socket_path(create=True)
+        self.assertEqual(path, os.path.join(self.private, "uDMX.sock"))
+        self.assertEqual(stat.S_IMODE(os.stat(self.private).st_mode), 0o700)
+        self.assertEqual(uDMX.daemon_socket_path(), path)
+
+    def test_shared_temp_dir_is_refused(self):
+        os.mkdir(self.private, 0o777)
+        os.chmod(self.private, 0o777)
+        with self.assertRaises(PermissionError):
+            uDMX.daemon_socket_path(create=True)
+        # A client falls back to opening the interface itself
+        self.assertIsNone(uDMX.send_requests_to_daemon([b""]))
+
+    def test_socket_is_private(self):
+        path = uDMX.daemon_socket_path(create=True)
+        server = uDMX.daemon_listen(path)
+        self.addCleanup(server.close)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+        self.assertTrue(uDMX.can_connect(path))
+
+
+if __name__ == "__main__":
+    unittest.main()
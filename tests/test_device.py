@@ -0,0 +1,218 @@
+# test_device.py - uDMXDevice send path tests
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import errno
+import threading
+import time
+import unittest
+import urllib.request
+import usb
+from pyudmx import pyudmx
+from pyudmx.aio import AsyncUDMXDevice
+from pyudmx.profile import DeviceProfile
+from pyudmx.simulator import SimulatedBackend, SimulatedDevice
+
+
+class FlakyDevice(SimulatedDevice):
+    """
+    A simulated interface whose next failures transfers fail with an overflow.
+    """
+    def __init__(self, **kwargs):
+        super().__init__(realtime=False, **kwargs)
+        self.failures = 0
+
+    def ctrl_transfer(self, *args, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            self.transfers += 1
+            raise usb.core.USBError("Overflow", pyudmx.LIBUSB_ERROR_OVERFLOW, errno.EOVERFLOW)
+        return super().ctrl_transfer(*args, **kwargs)
+
+
+def wait_for(condition, timeout: float = 2.0) -> bool:
+    end = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > end:
+            return False
+        time.sleep(0.005)
+    return True
+
+
+class DeviceTestCase(unittest.TestCase):
+    def setUp(self):
+        self.sim = FlakyDevice()
+        self.backend = SimulatedBackend([self.sim])
+        self.dev = pyudmx.uDMXDevice()
+        self.assertTrue(self.dev.open(backend=self.backend))
+
+    def tearDown(self):
+        self.dev.close()
+
+
+class SendTest(DeviceTestCase):
+    def test_send_values(self):
+        self.assertEqual(self.dev.send_single_value(1, 255), 1)
+        self.assertEqual(self.dev.send_multi_value(510, [1, 2, 3]), 3)
+        self.assertEqual(self.sim.universe[0], 255)
+        self.assertEqual(self.sim.universe[509:], b"\x01\x02\x03")
+        # Sent values are clean in the universe
+        self.assertEqual(self.dev.Universe.get_values(510, 3), b"\x01\x02\x03")
+        self.assertFalse(self.dev.Universe.is_dirty)
+
+    def test_invalid_single_value_is_not_sent(self):
+        for channel, value in ((1, 300), (1, -1), (0, 7), (513, 7), (600, 5)):
+            with self.assertRaises(ValueError):
+                self.dev.send_single_value(channel, value)
+        self.assertEqual(self.sim.transfers, 0)
+        self.assertEqual(self.sim.universe, bytearray(512))
+        self.assertEqual(self.dev.Universe.frame, bytes(512))
+
+    def test_invalid_multi_value_is_not_sent(self):
+        with self.assertRaises(ValueError):
+            self.dev.send_multi_value(510, [1, 2, 3, 4])
+        with self.assertRaises(ValueError):
+            self.dev.send_multi_value(1, [1, 256])
+        self.assertEqual(self.sim.transfers, 0)
+
+    def test_coalesced_send_accepts_iterables(self):
+        self.dev.start_refresh(rate=100, coalesce=True)
+        self.assertEqual(self.dev.send_multi_value(1, (v for v in (5, 6, 7))), 3)
+        self.assertEqual(self.dev.send_single_value(4, 8), 1)
+        self.assertTrue(wait_for(lambda: self.sim.universe[:4] == b"\x05\x06\x07\x08"))
+
+    def test_padding_sends_pending_values_once(self):
+        self.dev.set_profile(DeviceProfile("1-1.4", max_transfer=8, pad=True))
+        # Written but not flushed, inside the block channel 2 is padded out to
+        self.dev.Universe.set_value(5, 9)
+        self.dev.send_multi_value(2, [1, 2])
+        self.assertEqual(self.sim.universe[:8], bytes([0, 1, 2, 0, 9, 0, 0, 0]))
+        # Channel 5 went out as padding, the next flush has nothing left to send
+        self.assertFalse(self.dev.Universe.is_dirty)
+        transfers = self.sim.transfers
+        self.assertEqual(self.dev.flush(), 0)
+        self.assertEqual(self.sim.transfers, transfers)
+
+    def test_flush_pads_blocks(self):
+        self.dev.set_profile(DeviceProfile("1-1.4", max_transfer=8, pad=True))
+        self.dev.Universe.set_values(10, [1, 2])
+        self.assertEqual(self.dev.flush(), 8)
+        self.assertEqual(self.sim.universe[8:12], bytes([0, 1, 2, 0]))
+        self.assertFalse(self.dev.Universe.is_dirty)
+
+
+class MetricsTest(DeviceTestCase):
+    def test_metrics_server(self):
+        server = self.dev.start_metrics_server(0)
+        self.dev.send_multi_value(1, [1, 2, 3])
+        with urllib.request.urlopen("http://127.0.0.1:{0}/metrics".format(server.port)) as response:
+            body = response.read().decode("utf-8")
+        self.assertIn("udmx_transfers_total", body)
+        self.dev.stop_metrics_server()
+
+
+class RetryTest(DeviceTestCase):
+    def test_transient_error_is_retried(self):
+        self.sim.failures = 2
+        self.assertEqual(self.dev.send_single_value(1, 9), 1)
+        self.assertEqual(self.sim.universe[0], 9)
+        stats = self.dev.retry_stats()
+        self.assertEqual(stats["retries"], 2)
+        self.assertEqual(stats["recovered"], 1)
+        self.assertEqual(stats["errors"], {pyudmx.ERROR_PIPE: 2})
+
+    def test_retries_are_bounded(self):
+        self.sim.failures = 10
+        with self.assertRaises(usb.core.USBError):
+            self.dev.send_single_value(1, 9)
+        self.assertEqual(self.sim.transfers, self.dev.max_retries + 1)
+        self.assertEqual(self.dev.retry_stats()["failed"], 1)
+        # Nothing was sent, so the universe still has the old value
+        self.assertEqual(self.dev.Universe.get_value(1), 0)
+
+    def test_deadline_leaves_values_for_next_frame(self):
+        universe = self.dev.Universe
+        universe.set_values(1, [1, 2, 3])
+        self.sim.failures = 1
+        self.assertEqual(self.dev.flush(deadline=time.perf_counter() - 1.0), 0)
+        self.assertEqual(self.dev.retry_stats()["dropped"], 1)
+        self.assertEqual(universe.dirty_runs(), [(1, 3)])
+        self.assertEqual(self.dev.flush(), 3)
+        self.assertEqual(self.sim.universe[:3], b"\x01\x02\x03")
+
+    def test_deadline_exceeded_is_raised_by_transfer(self):
+        self.sim.failures = 1
+        with self.assertRaises(pyudmx.DeadlineExceeded):
+            self.dev._send_control_message(pyudmx.SetSingleChannel, value_or_length=5, channel=1,
+                                           deadline=time.perf_counter() - 1.0)
+
+
+class ReconnectTest(unittest.TestCase):
+    def test_replug_replays_universe(self):
+        sim = SimulatedDevice(realtime=False, port_numbers=(1, 4))
+        backend = SimulatedBackend([sim])
+        dev = pyudmx.uDMXDevice(auto_reconnect=True)
+        try:
+            self.assertTrue(dev.open(backend=backend))
+            dev.send_multi_value(1, [1, 2, 3])
+            old_address = sim.address
+
+            backend.unplug(sim)
+            # Sends do not raise while the device is gone. The values are kept.
+            self.assertEqual(dev.send_single_value(4, 4), 0)
+            self.assertTrue(dev.reconnecting)
+            dev.Universe.set_value(5, 5)
+
+            backend.plug(sim)
+            self.assertTrue(wait_for(lambda: not dev.reconnecting))
+            self.assertNotEqual(sim.address, old_address)
+            self.assertEqual(sim.universe[:5], b"\x01\x02\x03\x04\x05")
+            self.assertEqual(dev.Location[2], "1-1.4")
+        finally:
+            dev.close()
+
+    def test_reopen_finds_replugged_device_by_port(self):
+        sim = SimulatedDevice(realtime=False, port_numbers=(2, 1))
+        other = SimulatedDevice(realtime=False, address=5, port_numbers=(3,))
+        backend = SimulatedBackend([sim, other])
+        dev = pyudmx.uDMXDevice()
+        dev.open(bus=1, address=1, backend=backend)
+        dev.close()
+        backend.unplug(sim)
+        backend.plug(sim)
+        # The old address is gone, the port path is not
+        self.assertTrue(dev.open(bus=1, address=1, backend=backend))
+        self.assertIs(dev.Device, sim)
+        dev.close()
+
+
+class AsyncDeviceTest(unittest.TestCase):
+    def test_async_device_on_simulator(self):
+        backend = SimulatedBackend(realtime=False)
+
+        async def run():
+            dev = AsyncUDMXDevice()
+            self.assertTrue(await dev.open(backend=backend))
+            results = await asyncio.gather(dev.send_single_value(1, 10), dev.send_multi_value(2, [20, 30]))
+            await dev.close()
+            return results
+
+        self.assertEqual(asyncio.run(run()), [1, 2])
+        self.assertEqual(backend.devices[0].universe[:3], b"\x0a\x14\x1e")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+# test_imports.py - Import cost tests
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import subprocess
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def loaded_after_import(module: str, names: list) -> list:
+    """
+    Import a module in a fresh interpreter.
+    :return: those of names that were loaded along with it
+    """
+    code = "import sys, {0}; print(' '.join(n for n in {1!r} if n in sys.modules))".format(module, names)
+    output = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+    return output.split()
+
+
+class ImportTest(unittest.TestCase):
+    def test_send_path_does_not_load_optional_modules(self):
+        # uDMX.py imports pyudmx for every message it sends
+        self.assertEqual(loaded_after_import("pyudmx.pyudmx", ["numpy", "http.server"]), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
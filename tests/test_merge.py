@@ -0,0 +1,101 @@
+# test_merge.py - MergeEngine tests
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import unittest
+from unittest import mock
+from pyudmx import merge, pyudmx
+from pyudmx.merge import MergeEngine, LTP
+from pyudmx.simulator import SimulatedBackend
+
+
+class MergeTest(unittest.TestCase):
+    def setUp(self):
+        self.dev = pyudmx.uDMXDevice()
+        self.dev.open(backend=SimulatedBackend(realtime=False))
+        self.universe = self.dev.Universe
+
+    def tearDown(self):
+        self.dev.close()
+
+    def engine(self) -> MergeEngine:
+        return MergeEngine(self.dev, clock=lambda: 0.0)
+
+    def test_htp_and_ltp(self):
+        engine = self.engine()
+        engine.set_mode(2, 1, LTP)
+        a = engine.add_source("a")
+        b = engine.add_source("b")
+        a.set_values(1, [200, 10])
+        b.set_values(1, [100, 20])
+        a.set_value(2, 5)
+        self.assertEqual(engine.merge(0.0)[:3], bytes([200, 5, 0]))
+
+    def test_higher_priority_overrides(self):
+        engine = self.engine()
+        low = engine.add_source("low", priority=50)
+        high = engine.add_source("high", priority=150)
+        low.set_values(1, [255, 255])
+        high.set_value(1, 10)
+        self.assertEqual(engine.merge(0.0)[:2], bytes([10, 255]))
+
+    def test_timed_out_source_rejoins_when_written(self):
+        engine = self.engine()
+        console = engine.add_source("console")
+        fx = engine.add_source("fx", timeout=1.0)
+        console.set_value(1, 50)
+        fx.set_value(1, 200)
+        self.assertEqual(engine.expire(2.0), [fx])
+        self.assertFalse(fx.active)
+        self.assertIn(fx, engine.sources)
+        self.assertEqual(engine.merge(2.0)[0], 50)
+        # Writing again brings it back instead of raising
+        fx.set_value(1, 220)
+        self.assertTrue(fx.active)
+        self.assertEqual(engine.merge(0.5)[0], 220)
+
+    def test_step_writes_only_driven_channels(self):
+        engine = self.engine()
+        source = engine.add_source("a", timeout=1.0)
+        source.set_value(1, 100)
+        # Set by another renderer, the merge does not drive it
+        self.universe.set_value(100, 42)
+        engine.step(0.0)
+        self.assertEqual(self.universe.get_value(1), 100)
+        self.assertEqual(self.universe.get_value(100), 42)
+        self.assertEqual(self.universe.dirty_runs(), [(1, 1), (100, 1)])
+        # When its source times out the channel goes back to 0, once
+        engine.step(2.0)
+        self.assertEqual(self.universe.get_value(1), 0)
+        self.universe.set_value(1, 7)
+        engine.step(3.0)
+        self.assertEqual(self.universe.get_value(1), 7)
+        self.assertEqual(self.universe.get_value(100), 42)
+
+
+@unittest.skipIf(merge.numpy is None, "NumPy is not installed")
+class ArrayMergeTest(MergeTest):
+    """
+    The same tests without NumPy.
+    """
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(merge, "numpy", None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+if __name__ == "__main__":
+    unittest.main()
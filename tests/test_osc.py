@@ -0,0 +1,133 @@
+# test_osc.py - OSC server tests
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import asyncio
+import socket
+import time
+import unittest
+from pyudmx import pyudmx
+from pyudmx.osc import OSCServer, encode_message, encode_bundle, parse_packet
+from pyudmx.simulator import SimulatedBackend
+
+
+class OSCTestCase(unittest.TestCase):
+    def setUp(self):
+        self.backend = SimulatedBackend(realtime=False)
+        self.dev = pyudmx.uDMXDevice()
+        self.dev.open(backend=self.backend)
+        self.universe = self.dev.Universe
+        self.server = OSCServer(self.dev, host="127.0.0.1", port=0, aliases={"red": 10, "green": 11})
+
+    def tearDown(self):
+        self.server.close()
+        self.dev.close()
+
+
+class ParseTest(unittest.TestCase):
+    def test_round_trip(self):
+        packet = encode_bundle(encode_message("/dmx/1", 255, 0.5, True, "x", b"\x01\x02"),
+                               encode_bundle(encode_message("/dmx/2")))
+        messages = parse_packet(packet)
+        self.assertEqual(messages, [("/dmx/1", [255, 0.5, True, "x", b"\x01\x02"]), ("/dmx/2", [])])
+
+    def test_truncated(self):
+        with self.assertRaises(ValueError):
+            parse_packet(encode_message("/dmx/1", 255)[:-2])
+        with self.assertRaises(ValueError):
+            parse_packet(encode_bundle(encode_message("/dmx/1", 255))[:-4])
+
+
+class HandlePacketTest(OSCTestCase):
+    def test_channel_values(self):
+        self.assertTrue(self.server.handle_packet(encode_message("/dmx/1", 1, 2, 3)))
+        self.assertEqual(self.universe.get_values(1, 3), b"\x01\x02\x03")
+
+    def test_float_scaling(self):
+        self.server.handle_packet(encode_message("/dmx/1", 0.0, 0.5, 1.0, 1.5, -0.2, 0.25))
+        self.assertEqual(list(self.universe.get_values(1, 6)), [0, 128, 255, 255, 0, 64])
+
+    def test_bools(self):
+        self.server.handle_packet(encode_message("/dmx/1", True, False))
+        self.assertEqual(self.universe.get_values(1, 2), b"\xff\x00")
+
+    def test_alias(self):
+        self.server.handle_packet(encode_message("/dmx/red", 200, 100))
+        self.assertEqual(self.universe.get_values(10, 2), bytes([200, 100]))
+        # Unknown aliases and other address spaces are ignored
+        self.assertFalse(self.server.handle_packet(encode_message("/dmx/blue", 1)))
+        self.assertFalse(self.server.handle_packet(encode_message("/other/1", 1)))
+        self.assertEqual(self.server.stats()["ignored"], 2)
+        self.assertEqual(self.server.stats()["malformed"], 0)
+
+    def test_range(self):
+        self.server.handle_packet(encode_message("/dmx/range/20", bytes(range(1, 101))))
+        self.assertEqual(self.universe.get_values(20, 100), bytes(range(1, 101)))
+        self.server.handle_packet(encode_message("/dmx/range/red", b"\x07"))
+        self.assertEqual(self.universe.get_value(10), 7)
+
+    def test_bundle_is_applied_at_once(self):
+        bundle = encode_bundle(encode_message("/dmx/1", 10), encode_message("/dmx/red", 20),
+                               encode_message("/dmx/range/100", b"\x30\x40"))
+        self.assertTrue(self.server.handle_packet(bundle))
+        frame, transfers = self.universe.swap()
+        self.assertEqual((frame[0], frame[9], frame[99], frame[100]), (10, 20, 0x30, 0x40))
+        self.assertEqual(self.server.stats()["bundles"], 1)
+
+    def test_malformed_bundle_is_dropped_whole(self):
+        for bad in (encode_message("/dmx/2", 300),          # value out of range
+                    encode_message("/dmx/512", 1, 2),       # past channel 512
+                    encode_message("/dmx/range/1", 5),      # range without a blob
+                    encode_message("/dmx/3")):              # no value
+            bundle = encode_bundle(encode_message("/dmx/1", 10), bad)
+            self.assertFalse(self.server.handle_packet(bundle))
+        self.assertFalse(self.server.handle_packet(encode_bundle(encode_message("/dmx/1", 10))[:-3]))
+        self.assertEqual(self.universe.get_value(1), 0)
+        self.assertFalse(self.universe.is_dirty)
+        stats = self.server.stats()
+        self.assertEqual(stats["malformed"], 5)
+        self.assertEqual(stats["bundles"], 0)
+
+
+class LoopbackTest(OSCTestCase):
+    def test_messages_over_udp(self):
+        async def run():
+            await self.server.start()
+            host, port = self.server.address
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            try:
+                sock.sendto(encode_message("/dmx/red", 0.5), (host, port))
+                sock.sendto(encode_bundle(encode_message("/dmx/1", 1), encode_message("/dmx/2", 2)), (host, port))
+                end = time.perf_counter() + 2.0
+                while self.server.stats()["packets"] < 2 and time.perf_counter() < end:
+                    await asyncio.sleep(0.005)
+            finally:
+                sock.close()
+                self.server.close()
+
+        asyncio.run(run())
+        self.assertEqual(self.server.stats()["packets"], 2)
+        self.assertEqual(self.universe.get_value(10), 128)
+        self.assertEqual(self.universe.get_values(1, 2), b"\x01\x02")
+        # The server started refresh mode, which sends the values
+        sim = self.backend.devices[0]
+        end = time.perf_counter() + 2.0
+        while sim.universe[9] != 128 and time.perf_counter() < end:
+            time.sleep(0.005)
+        self.assertEqual(sim.universe[:2] + sim.universe[9:10], b"\x01\x02\x80")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,153 @@
+# test_recorder.py - Recorder and Player tests
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import os
+import shutil
+import tempfile
+import unittest
+from pyudmx import pyudmx
+from pyudmx.recorder import Recorder, Player, HEADER
+from pyudmx.simulator import SimulatedBackend
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class RecorderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "show.udmxrec")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def record_show(self, close: bool = True):
+        """
+        Record channel 1 stepping up by one every 100 ms for 3 seconds, with
+        channel 10 set once at 1.55 seconds.
+        :return: the expected frame at each recorded time
+        """
+        clock = FakeClock()
+        recorder = Recorder(self.path, keyframe_interval=1.0, clock=clock)
+        expected = []
+        frame = bytearray(512)
+        for step in range(31):
+            clock.now = step / 10.0
+            frame[0] = step
+            pieces = [(1, bytes([step]))]
+            if step == 15:
+                clock.now = 1.55
+                frame[9] = 200
+                pieces.append((10, b"\xc8"))
+            recorder.record(pieces)
+            expected.append((clock.now, bytes(frame)))
+        if close:
+            recorder.close()
+            stats = recorder.stats()
+            self.assertEqual(stats["frames"], 31)
+            self.assertEqual(stats["keyframes"], 4)
+        else:
+            # Let the writer thread catch up, then abandon the log
+            recorder._queue.put(None)
+            recorder._thread.join()
+            recorder._file.close()
+        return expected
+
+
+class RoundTripTest(RecorderTestCase):
+    def test_frames_match_recording(self):
+        expected = self.record_show()
+        player = Player(self.path)
+        try:
+            self.assertEqual(player.keyframes, 4)
+            self.assertAlmostEqual(player.duration, 3.0)
+            frames = list(player.frames())
+            self.assertEqual([f for _, f in frames], [f for _, f in expected])
+            for (t, _), (expected_t, _) in zip(frames, expected):
+                self.assertAlmostEqual(t, expected_t, places=5)
+        finally:
+            player.close()
+
+    def test_seek(self):
+        expected = self.record_show()
+        player = Player(self.path)
+        try:
+            # Between records the state is the earlier record's
+            self.assertEqual(player.frame_at(1.57), expected[15][1])
+            self.assertEqual(player.frame_at(2.05), expected[20][1])
+            t, frame = next(player.frames(2.05))
+            # Times are kept in microseconds
+            self.assertAlmostEqual(t, 2.05, places=5)
+            self.assertEqual(frame[9], 200)
+            self.assertEqual(player.frame_at(99.0), expected[-1][1])
+        finally:
+            player.close()
+
+    def test_unclosed_log_is_scanned(self):
+        expected = self.record_show(close=False)
+        # Cut the last record short, as a crash might
+        with open(self.path, "r+b") as f:
+            f.truncate(os.path.getsize(self.path) - 1)
+        player = Player(self.path)
+        try:
+            self.assertEqual(player.keyframes, 3)
+            self.assertAlmostEqual(player.duration, 2.9)
+            self.assertEqual(player.frame_at(2.95), expected[-2][1])
+        finally:
+            player.close()
+
+    def test_not_a_recording(self):
+        with open(self.path, "wb") as f:
+            f.write(b"x" * HEADER.size)
+        with self.assertRaises(ValueError):
+            Player(self.path)
+
+
+class DeviceRecordingTest(RecorderTestCase):
+    def test_record_and_play_back_onto_device(self):
+        backend = SimulatedBackend(realtime=False)
+        dev = pyudmx.uDMXDevice()
+        dev.open(backend=backend)
+        dev.start_recording(self.path)
+        dev.send_single_value(1, 10)
+        dev.send_multi_value(2, [20, 30])
+        dev.Universe.set_value(512, 40)
+        dev.flush()
+        dev.stop_recording()
+        sent = bytes(backend.devices[0].universe)
+        dev.close()
+
+        player = Player(self.path)
+        try:
+            self.assertEqual(player.frame_at(player.duration), sent)
+            other = SimulatedBackend(realtime=False)
+            dev = pyudmx.uDMXDevice()
+            dev.open(backend=other)
+            stats = player.play(dev, speed=1000.0)
+            self.assertGreaterEqual(stats["frames"], 1)
+            self.assertEqual(bytes(other.devices[0].universe), sent)
+        finally:
+            player.close()
+            dev.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
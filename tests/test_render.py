@@ -0,0 +1,135 @@
+# test_render.py - Fade, effect and fixture rendering tests
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import unittest
+from unittest import mock
+from pyudmx import fade, pyudmx
+from pyudmx.effects import EffectEngine, ChannelGroup, Chase, Strobe
+from pyudmx.fade import FadeEngine
+from pyudmx.fixtures import Patch, THINPAR64_7CH
+from pyudmx.simulator import SimulatedBackend
+
+
+class RenderTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dev = pyudmx.uDMXDevice()
+        self.dev.open(backend=SimulatedBackend(realtime=False))
+        self.universe = self.dev.Universe
+
+    def tearDown(self):
+        self.dev.close()
+
+
+class FadeTest(RenderTestCase):
+    def test_fade(self):
+        fades = FadeEngine(self.dev)
+        fades.fade(1, [255, 100], 1.0, now=0.0)
+        fades.fade(5, [200], 2.0, curve="s-curve", now=0.0)
+        fades.step(0.5)
+        self.assertEqual(self.universe.get_values(1, 5), bytes([128, 50, 0, 0, 31]))
+        fades.step(2.0)
+        self.assertEqual(self.universe.get_values(1, 5), bytes([255, 100, 0, 0, 200]))
+        self.assertFalse(fades.is_fading)
+
+    def test_new_fade_starts_where_the_running_one_got_to(self):
+        for numpy in (fade.numpy, None):
+            with mock.patch.object(fade, "numpy", numpy):
+                self.universe.set_values(1, [0, 50])
+                fades = FadeEngine(self.dev)
+                fades.fade(1, [200, 250], 1.0, now=0.0)
+                # Replaced half way, before a frame was rendered
+                fades.fade(1, [0], 1.0, now=0.5)
+                fades.step(1.0)
+                self.assertEqual(self.universe.get_values(1, 2), bytes([50, 250]))
+
+    def test_step_keeps_concurrent_writes(self):
+        fades = FadeEngine(self.dev)
+        fades.fade(1, [255], 1.0, now=0.0)
+        render = fades._fades.render
+
+        def render_while_writing(now, curves):
+            # Another thread writes while the frame is rendered
+            self.universe.set_value(100, 42)
+            return render(now, curves)
+        fades._fades.render = render_while_writing
+        fades.step(0.5)
+        self.assertEqual(self.universe.get_value(100), 42)
+        self.assertEqual(self.universe.dirty_runs(), [(1, 1), (100, 1)])
+
+
+class EffectTest(RenderTestCase):
+    def test_step_writes_only_driven_channels(self):
+        effects = EffectEngine(self.dev)
+        effects.add(Strobe(1.0), ChannelGroup([[1, 2, 3], [4, 5, 6]]), now=0.0)
+        effects.add(Chase(1.0, background=100), ChannelGroup([3, 10]), now=0.0)
+        self.universe.set_values(7, [9, 9, 9])
+        effects.step(0.2)
+        self.assertEqual(self.universe.get_values(1, 10), bytes([255] * 6 + [9, 9, 9, 100]))
+        # Where groups overlap the effect added last wins
+        effects.step(0.7)
+        self.assertEqual(self.universe.get_values(1, 10), bytes([0, 0, 100, 0, 0, 0, 9, 9, 9, 255]))
+        self.assertEqual(self.universe.get_value(11), 0)
+
+    def test_step_keeps_concurrent_writes(self):
+        effects = EffectEngine(self.dev)
+        effects.add(Chase(1.0), ChannelGroup([1, 2]), now=0.0)
+        frame = effects._frame
+
+        def frame_while_writing(layer, now):
+            self.universe.set_value(100, 42)
+            return frame(layer, now)
+        effects._frame = frame_while_writing
+        effects.step(0.0)
+        self.assertEqual(self.universe.get_value(100), 42)
+        self.assertEqual(self.universe.get_values(1, 2), b"\xff\x00")
+
+
+class SelectionTest(RenderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.patch = Patch()
+        self.pars = self.patch.add_many("par", THINPAR64_7CH, 1, 3)
+
+    def test_set_writes_only_selected_channels(self):
+        rgb = self.patch.select(self.pars, ("red", "green", "blue"))
+        self.universe.set_value(4, 9)
+        self.universe.mark_clean()
+        self.assertTrue(rgb.set(self.universe, (255, 0, 10)))
+        self.assertEqual(self.universe.dirty_runs(), [(1, 1), (3, 1), (8, 1), (10, 1), (15, 1), (17, 1)])
+        self.assertEqual(self.universe.get_values(1, 4), b"\xff\x00\x0a\x09")
+        self.assertFalse(rgb.set(self.universe, (255, 0, 10)))
+
+    def test_value_shapes(self):
+        rgb = self.patch.select(self.pars, ("red", "green", "blue"))
+        dimmers = self.patch.select(self.pars, ("dimmer",))
+        rgb.set(self.universe, [[1, 2, 3], [4, 5, 6], [7, 8, 9]])
+        dimmers.set(self.universe, 200)
+        self.assertEqual(self.universe.get_values(1, 21), bytes([1, 2, 3, 0, 0, 0, 200, 4, 5, 6, 0, 0, 0, 200,
+                                                                 7, 8, 9, 0, 0, 0, 200]))
+        rgb.set(self.universe, (0, 255, 0))
+        self.assertEqual(self.universe.get_values(1, 21), bytes([0, 255, 0, 0, 0, 0, 200] * 3))
+
+    def test_bad_values(self):
+        rgb = self.patch.select(self.pars, ("red", "green", "blue"))
+        with self.assertRaises(ValueError):
+            rgb.set(self.universe, 300)
+        with self.assertRaises(ValueError):
+            rgb.set(self.universe, (1, 2))
+        self.assertFalse(self.universe.is_dirty)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+# test_scheduler.py - FrameScheduler tests
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import unittest
+from pyudmx.scheduler import FrameScheduler, SLEW_FRACTION
+
+MS = 1000000
+START = 1000 * MS
+
+
+class FakeClock:
+    """
+    A clock that only moves when a wait sleeps or the test advances it.
+    Passed as both the scheduler's clock and its stop event.
+    """
+    def __init__(self, t: int = START):
+        self.t = t
+
+    def __call__(self) -> int:
+        return self.t
+
+    def wait(self, seconds: float) -> bool:
+        self.t += int(round(seconds * 1e9))
+        return False
+
+    def is_set(self) -> bool:
+        return False
+
+
+class FrameSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        # No spin tail, the fake clock does not move while it is polled
+        self.scheduler = FrameScheduler(50, spin_us=0, clock_ns=self.clock)
+        self.scheduler.reset()
+
+    def deadlines(self, frames: int) -> list:
+        result = []
+        for _ in range(frames):
+            self.assertTrue(self.scheduler.wait(self.clock))
+            self.assertEqual(self.clock.t, self.scheduler.deadline_ns)
+            result.append(self.scheduler.deadline_ns)
+        return result
+
+    def test_frames_are_due_on_the_timeline(self):
+        self.assertEqual(self.deadlines(4), [START + n * 20 * MS for n in range(4)])
+        self.assertEqual(self.scheduler.frame, 3)
+        stats = self.scheduler.stats()
+        self.assertEqual(stats["missed_deadlines"], 0)
+        self.assertEqual(stats["max_lateness_ms"], 0)
+
+    def test_time_spent_in_a_frame_does_not_drift(self):
+        self.deadlines(1)
+        self.clock.t += 7 * MS
+        self.assertEqual(self.deadlines(1), [START + 20 * MS])
+
+    def test_overrun_skips_missed_frames(self):
+        self.deadlines(1)
+        # Frame 0 takes 2.5 periods, frames 1 and 2 are skipped
+        self.clock.t += 50 * MS
+        self.assertEqual(self.deadlines(1), [START + 60 * MS])
+        self.assertEqual(self.scheduler.frame, 3)
+        self.assertEqual(self.scheduler.stats()["missed_deadlines"], 2)
+
+    def test_small_sync_offset_is_slewed(self):
+        self.deadlines(1)
+        # External time is 3 ms ahead of the timeline, less than a period
+        self.scheduler.sync(self.scheduler.external_time_ns() + 3 * MS)
+        step = int(20 * MS * SLEW_FRACTION)
+        deadlines = self.deadlines(5)
+        periods = [b - a for a, b in zip([START] + deadlines, deadlines)]
+        # 1 ms per frame until the 3 ms are taken up
+        self.assertEqual(periods, [20 * MS - step] * 3 + [20 * MS] * 2)
+        self.assertEqual(self.scheduler.stats()["offset_ms"], -START / MS + 3)
+
+    def test_large_sync_offset_is_stepped(self):
+        self.deadlines(1)
+        # External time is 1 s + 5 ms, more than a period away
+        self.scheduler.sync(1005 * MS)
+        deadline = self.deadlines(1)[0]
+        # The next frame is due on the next multiple of the period of external time
+        self.assertEqual(self.scheduler.external_time_ns(deadline), 1020 * MS)
+        self.assertEqual(deadline, START + 15 * MS)
+        self.assertEqual(self.scheduler.frame, 51)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+# test_shared.py - Shared memory universe tests
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import unittest
+from pyudmx import pyudmx
+from pyudmx.simulator import SimulatedBackend
+
+try:
+    import fcntl
+    from pyudmx.shared import SharedUniverseOwner, SharedUniverse
+except ImportError:
+    fcntl = None
+
+
+@unittest.skipIf(fcntl is None, "Shared universes need POSIX file locking")
+class SharedUniverseTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = SimulatedBackend(realtime=False)
+        self.dev = pyudmx.uDMXDevice()
+        self.dev.open(backend=self.backend)
+        self.owner = SharedUniverseOwner([self.dev])
+        self.writer = SharedUniverse(self.owner.name)
+
+    def tearDown(self):
+        self.writer.close()
+        self.owner.close()
+        self.dev.close()
+
+    def test_write_reaches_device(self):
+        self.assertFalse(self.owner.pull(0))
+        with self.writer.batch():
+            self.writer.set_value(7, 255)
+            self.writer.set_values(1, [1, 2, 3])
+        self.assertEqual(self.writer.get_values(1, 3), b"\x01\x02\x03")
+        self.assertTrue(self.owner.pull(0))
+        self.dev.flush()
+        self.assertEqual(self.backend.devices[0].universe[:7], b"\x01\x02\x03\x00\x00\x00\xff")
+
+    def test_writer_that_died_mid_write(self):
+        # A writer took the lock and made the counter odd, then exited
+        self.writer._counters[0] += 1
+        self.assertFalse(self.owner.pull(0))
+        self.assertEqual(self.owner.stats()["deferred"], 1)
+        # Reading does not wait forever
+        self.assertEqual(self.writer.get_values(1, 3), bytes(3))
+
+        self.writer.set_values(1, [1, 2, 3])
+        self.assertEqual(self.writer.recovered, 1)
+        self.assertEqual(self.writer._counters[0] % 2, 0)
+        self.assertTrue(self.owner.pull(0))
+        self.assertEqual(self.dev.Universe.get_values(1, 3), b"\x01\x02\x03")
+        self.writer.set_value(4, 4)
+        self.assertTrue(self.owner.pull(0))
+        self.assertEqual(self.writer.recovered, 1)
+
+    def test_invalid_universe(self):
+        with self.assertRaises(ValueError):
+            SharedUniverse(self.owner.name, universe=1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+# test_universe.py - Universe buffer and flush() tests
+# Copyright (C) 2016  Dave Hocker (email: AtHomeX10@gmail.com)
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3 of the License.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+# See the LICENSE file for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program (the LICENSE file).  If not, see <http://www.gnu.org/licenses/>.
+#
+
+import unittest
+from pyudmx import pyudmx
+from pyudmx.simulator import SimulatedBackend
+from pyudmx.universe import Universe, transfer_packets
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class UniverseTest(unittest.TestCase):
+    def test_only_changed_channels_are_dirty(self):
+        u = Universe()
+        self.assertTrue(u.set_values(1, [0, 5, 0]))
+        self.assertEqual(u.dirty_runs(), [(2, 1)])
+        self.assertFalse(u.set_values(1, [0, 5, 0]))
+
+    def test_plan_merges_close_runs(self):
+        u = Universe()
+        u.set_value(1, 1)
+        u.set_value(3, 1)
+        # One 3 channel transfer costs less than two single ones
+        self.assertLess(transfer_packets(3), 2 * transfer_packets(1))
+        self.assertEqual(u.plan(), [(1, 3)])
+
+    def test_plan_keeps_distant_runs_apart(self):
+        u = Universe()
+        u.set_value(1, 1)
+        u.set_value(100, 1)
+        self.assertEqual(u.plan(), [(1, 1), (100, 1)])
+
+    def test_swap_clears_dirty_mask(self):
+        u = Universe()
+        u.set_values(10, [1, 2])
+        frame, transfers = u.swap()
+        self.assertEqual(transfers, [(10, 2)])
+        self.assertEqual(frame[9:11], b"\x01\x02")
+        self.assertFalse(u.is_dirty)
+        self.assertEqual(u.swap(), (b"", []))
+
+    def test_mark_sent_keeps_newer_writes_dirty(self):
+        u = Universe()
+        u.set_values(1, [1, 2])
+        sent = u.get_values(1, 2)
+        u.set_value(2, 3)
+        u.mark_sent(1, sent)
+        self.assertEqual(u.dirty_runs(), [(2, 1)])
+
+    def test_set_spans_checks_every_span_first(self):
+        u = Universe()
+        with self.assertRaises(ValueError):
+            u.set_spans([(1, [9]), (512, [1, 2])])
+        self.assertEqual(u.get_value(1), 0)
+
+    def test_scatter_list(self):
+        u = Universe()
+        u.set_value(2, 7)
+        u.mark_clean()
+        self.assertTrue(u.scatter([0, 4], [9, 0]))
+        self.assertEqual(u.get_values(1, 5), b"\x09\x07\x00\x00\x00")
+        self.assertEqual(u.dirty_runs(), [(1, 1)])
+        self.assertFalse(u.scatter([0, 4], [9, 0]))
+
+    @unittest.skipIf(numpy is None, "NumPy is not installed")
+    def test_scatter_numpy(self):
+        u = Universe()
+        self.assertTrue(u.scatter(numpy.array([[0, 1], [6, 7]]), numpy.array([1, 2, 3, 4])))
+        self.assertEqual(u.dirty_runs(), [(1, 2), (7, 2)])
+        self.assertEqual(u.get_values(7, 2), b"\x03\x04")
+
+    def test_scatter_checks_indices_and_values(self):
+        u = Universe()
+        with self.assertRaises(ValueError):
+            u.scatter([512], [1])
+        with self.assertRaises(ValueError):
+            u.scatter([-1], [1])
+        with self.assertRaises(ValueError):
+            u.scatter([0], [256])
+        with self.assertRaises(ValueError):
+            u.scatter([0, 1], [1])
+        if numpy is not None:
+            with self.assertRaises(ValueError):
+                u.scatter(numpy.array([-1]), [1])
+            with self.assertRaises(ValueError):
+                u.scatter(numpy.array([0]), numpy.array([300]))
+        self.assertFalse(u.is_dirty)
+
+
+class FlushTest(unittest.TestCase):
+    def setUp(self):
+        self.backend = SimulatedBackend(realtime=False)
+        self.sim = self.backend.devices[0]
+        self.dev = pyudmx.uDMXDevice()
+        self.assertTrue(self.dev.open(backend=self.backend))
+
+    def tearDown(self):
+        self.dev.close()
+
+    def test_flush_sends_planned_transfers(self):
+        u = self.dev.Universe
+        u.set_values(1, [1, 2, 3])
+        u.set_value(5, 4)
+        u.set_value(200, 9)
+        self.assertEqual(u.plan(), [(1, 5), (200, 1)])
+        self.assertEqual(self.dev.flush(), 6)
+        self.assertEqual(self.sim.transfers, 2)
+        self.assertEqual(self.sim.universe, bytearray(u.frame))
+        self.assertEqual(self.dev.flush(), 0)
+        self.assertEqual(self.sim.transfers, 2)
+
+    def test_mark_dirty_resends(self):
+        self.dev.Universe.mark_dirty(1, 4)
+        self.assertEqual(self.dev.flush(), 4)
+        self.assertEqual(self.sim.transfers, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
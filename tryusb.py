@@ -48,6 +48,8 @@ case you are looking for a uDMX type of interface.
 #	activate_this = "/home/pi/Virtualenvs/pyusb/bin/activate_this.py"
 #	execfile(activate_this, dict(__file__=activate_this))
 
+import argparse
+import sys
 import usb  # This is pyusb
 import time
 
@@ -85,65 +87,6 @@ def ctrl_transfer(dev, bmRequestType, channelMode, wValue=0, wIndex=0, data_or_w
 vid = 0x16c0
 pid = 0x05dc
 
-# Find the uDMX interface by vendor and product ID
-dev = usb.core.find(idVendor=vid, idProduct=pid)
-# This would find the uDMX by bus number and address (aka port)
-# dev = usb.core.find(bus=1, address=4)
-#
-# You could find the uDMX by using the SYMLINK that the udev rule sets up.
-# links = glob.glob("/dev/uDMXusb*")
-# os.path.realpath(links[0]) # returns something like /dev/bus/usb/001/004
-# You can use a regex to pull out the bus (001) and address (004).
-
-if dev is None:
-    print("uDMX device was not found")
-    exit(0)
-
-#
-# It looks like the only way to determine what methods and
-# properties are available on a given pyusb object requires looking
-# at the source code on github: https://github.com/walac/pyusb/tree/master/usb
-#
-
-print("**********uDMX Device")
-print("type:", type(dev))
-print(dev)
-
-print("**********MANUFACTURER")
-print(dev.manufacturer)
-if dev.manufacturer != "www.anyma.ch":
-    print("Error - expected www.anyma.ch, actual " + dev.manufacturer)
-
-print("**********PRODUCT")
-print(dev.product)
-
-dev.set_configuration()
-cfg = dev.get_active_configuration()
-print("**********CONFIGURATION")
-print("type:", type(cfg))
-print(cfg)
-
-intf = cfg[0, 0]
-print("**********INTERFACE")
-print("type:", type(intf))
-print(intf)
-
-ep = usb.util.find_descriptor(intf,
-                              # match the first OUT endpoint
-                              custom_match= \
-                                  lambda e: \
-                                      usb.util.endpoint_direction(e.bEndpointAddress) == \
-                                      usb.util.ENDPOINT_OUT)
-print("**********ENDPOINT")
-if ep:
-    print(ep)
-else:
-    print("This device.configuration.interface does not have an OUT endpoint")
-
-status = usb.control.get_status(dev)
-print("**********STATUS")
-print("Status:", status)
-
 cmd_SetSingleChannel = 1
 """
 usb request for cmd_SetSingleChannel:
@@ -192,68 +135,201 @@ usb request for cmd_SetChannelRange:
 bmRequestType = usb.util.CTRL_TYPE_VENDOR | usb.util.CTRL_RECIPIENT_DEVICE | usb.util.CTRL_OUT
 # bmRequestType = usb.util.CTRL_RECIPIENT_DEVICE | usb.util.CTRL_OUT
 
-# Single channel value transfer
-# Interface for setting a single channel data value
-# wValue - the value, 0-255, to be set.
-# wIndex - channel number, 0-511, being set. In DMX terms this corresponds to channel 1-512.
-# data_or_wLength - not used for this case. However, on success this will be the return value.
-
-# Set RGB mode (Venue ThinPar64 is in 7-channel mode)
-channel = 5  # mode channel 6
-channel_value = 0  # RGB mode
-n = ctrl_transfer(dev, bmRequestType, cmd_SetSingleChannel, wValue=channel_value, wIndex=channel, data_or_wLength=1)
-print("Sent:", n)
-
-# Bring dimmer to 100%
-channel = 6  # dimmer channel 7
-channel_value = 255  # on all the way
-n = ctrl_transfer(dev, bmRequestType, cmd_SetSingleChannel, wValue=channel_value, wIndex=channel, data_or_wLength=1)
-print("Sent:", n)
-
-# Turn light on
-channel = 2  # blue channel
-channel_value = 255  # on all the way
-n = ctrl_transfer(dev, bmRequestType, cmd_SetSingleChannel, wValue=channel_value, wIndex=channel, data_or_wLength=1)
-print("Sent:", n)
-channel = 0  # red channel
-channel_value = 255  # on all the way
-n = ctrl_transfer(dev, bmRequestType, cmd_SetSingleChannel, wValue=channel_value, wIndex=channel, data_or_wLength=1)
-print("Sent:", n)
-print("Red/Blue")
-
-print("Sleeping...")
-time.sleep(3.000)
-
-# Turn red off
-channel_value = 0
-n = ctrl_transfer(dev, bmRequestType, cmd_SetSingleChannel, wValue=channel_value, wIndex=channel, data_or_wLength=1)
-print("Sent:", n)
-print("Blue")
-
-print("Sleeping...")
-time.sleep(2.000)
-
-# Interface for setting multiple channels at one time
-# wValue - number of channels/bytes to be set. e.g. len(bytearray)
-# wIndex - starting channel number, 0-511.
-# data_or_wLength - sequence type of data, e.g. a bytearray
-
-channel_values = [255, 255, 255]  # RGB all on
-channel = 0  # Red channel 1
-# Turn on red, green and blue lights
-n = ctrl_transfer(dev, bmRequestType, cmd_SetChannelRange, wValue=len(channel_values), \
-                      wIndex=channel, data_or_wLength=channel_values)
-print("Sent:", n)
-print("White")
-
-print("Sleeping...")
-time.sleep(3.000)
-
-channel_values = [0, 0, 0]  # all off
-# Turn off red, green and blue
-n = ctrl_transfer(dev, bmRequestType, cmd_SetChannelRange, wValue=len(channel_values), \
-                      wIndex=channel, data_or_wLength=channel_values)
-print("Sent:", n)
-print("All off")
-del dev
-dev = None
\ No newline at end of file
+
+def find_device():
+    """
+    Find the uDMX interface by vendor and product ID.
+    """
+    # This would find the uDMX by bus number and address (aka port)
+    # dev = usb.core.find(bus=1, address=4)
+    #
+    # You could find the uDMX by using the SYMLINK that the udev rule sets up.
+    # links = glob.glob("/dev/uDMXusb*")
+    # os.path.realpath(links[0]) # returns something like /dev/bus/usb/001/004
+    # You can use a regex to pull out the bus (001) and address (004).
+    return usb.core.find(idVendor=vid, idProduct=pid)
+
+
+def describe(dev):
+    """
+    Print the descriptors and status of the interface.
+    """
+    #
+    # It looks like the only way to determine what methods and
+    # properties are available on a given pyusb object requires looking
+    # at the source code on github: https://github.com/walac/pyusb/tree/master/usb
+    #
+
+    print("**********uDMX Device")
+    print("type:", type(dev))
+    print(dev)
+
+    print("**********MANUFACTURER")
+    print(dev.manufacturer)
+    if dev.manufacturer != "www.anyma.ch":
+        print("Error - expected www.anyma.ch, actual " + dev.manufacturer)
+
+    print("**********PRODUCT")
+    print(dev.product)
+
+    dev.set_configuration()
+    cfg = dev.get_active_configuration()
+    print("**********CONFIGURATION")
+    print("type:", type(cfg))
+    print(cfg)
+
+    intf = cfg[0, 0]
+    print("**********INTERFACE")
+    print("type:", type(intf))
+    print(intf)
+
+    ep = usb.util.find_descriptor(intf,
+                                  # match the first OUT endpoint
+                                  custom_match= \
+                                      lambda e: \
+                                          usb.util.endpoint_direction(e.bEndpointAddress) == \
+                                          usb.util.ENDPOINT_OUT)
+    print("**********ENDPOINT")
+    if ep:
+        print(ep)
+    else:
+        print("This device.configuration.interface does not have an OUT endpoint")
+
+    status = usb.control.get_status(dev)
+    print("**********STATUS")
+    print("Status:", status)
+
+
+def demo(dev):
+    """
+    Drive a Venue ThinPar64 in 7-channel mode through a few colors.
+    """
+    # Single channel value transfer
+    # Interface for setting a single channel data value
+    # wValue - the value, 0-255, to be set.
+    # wIndex - channel number, 0-511, being set. In DMX terms this corresponds to channel 1-512.
+    # data_or_wLength - not used for this case. However, on success this will be the return value.
+
+    # Set RGB mode (Venue ThinPar64 is in 7-channel mode)
+    channel = 5  # mode channel 6
+    channel_value = 0  # RGB mode
+    n = ctrl_transfer(dev, bmRequestType, cmd_SetSingleChannel, wValue=channel_value, wIndex=channel, data_or_wLength=1)
+    print("Sent:", n)
+
+    # Bring dimmer to 100%
+    channel = 6  # dimmer channel 7
+    channel_value = 255  # on all the way
+    n = ctrl_transfer(dev, bmRequestType, cmd_SetSingleChannel, wValue=channel_value, wIndex=channel, data_or_wLength=1)
+    print("Sent:", n)
+
+    # Turn light on
+    channel = 2  # blue channel
+    channel_value = 255  # on all the way
+    n = ctrl_transfer(dev, bmRequestType, cmd_SetSingleChannel, wValue=channel_value, wIndex=channel, data_or_wLength=1)
+    print("Sent:", n)
+    channel = 0  # red channel
+    channel_value = 255  # on all the way
+    n = ctrl_transfer(dev, bmRequestType, cmd_SetSingleChannel, wValue=channel_value, wIndex=channel, data_or_wLength=1)
+    print("Sent:", n)
+    print("Red/Blue")
+
+    print("Sleeping...")
+    time.sleep(3.000)
+
+    # Turn red off
+    channel_value = 0
+    n = ctrl_transfer(dev, bmRequestType, cmd_SetSingleChannel, wValue=channel_value, wIndex=channel, data_or_wLength=1)
+    print("Sent:", n)
+    print("Blue")
+
+    print("Sleeping...")
+    time.sleep(2.000)
+
+    # Interface for setting multiple channels at one time
+    # wValue - number of channels/bytes to be set. e.g. len(bytearray)
+    # wIndex - starting channel number, 0-511.
+    # data_or_wLength - sequence type of data, e.g. a bytearray
+
+    channel_values = [255, 255, 255]  # RGB all on
+    channel = 0  # Red channel 1
+    # Turn on red, green and blue lights
+    n = ctrl_transfer(dev, bmRequestType, cmd_SetChannelRange, wValue=len(channel_values), \
+                          wIndex=channel, data_or_wLength=channel_values)
+    print("Sent:", n)
+    print("White")
+
+    print("Sleeping...")
+    time.sleep(3.000)
+
+    channel_values = [0, 0, 0]  # all off
+    # Turn off red, green and blue
+    n = ctrl_transfer(dev, bmRequestType, cmd_SetChannelRange, wValue=len(channel_values), \
+                          wIndex=channel, data_or_wLength=channel_values)
+    print("Sent:", n)
+    print("All off")
+
+
+def probe(args):
+    """
+    Characterize the interface's multi-value transfers and save its profile.
+    See pyudmx/profile.py.
+    """
+    from pyudmx import pyudmx
+    from pyudmx.profile import characterize, save_profile, default_profile_path
+
+    dev = pyudmx.uDMXDevice()
+    if args.sim:
+        from pyudmx.simulator import SimulatedBackend
+        opened = dev.open(backend=SimulatedBackend(overflow_rate=args.sim_overflow_rate))
+    else:
+        opened = dev.open(vid, pid)
+    if not opened:
+        print("uDMX device was not found")
+        return 1
+
+    def progress(m):
+        latency = "{0:8.2f} ms".format(m["latency"] * 1000.0) if m["latency"] is not None else "       -   "
+        print("size {0:3d} offset {1:3d}  latency {2}  errors {3:3d}/{4} ({5:.1%})".format(
+            m["size"], m["offset"], latency, m["errors"], m["attempts"], m["error_rate"]))
+
+    print("Characterizing", dev.Device)
+    try:
+        profile = characterize(dev, repeats=args.repeats, progress=progress)
+    finally:
+        dev.close()
+    print("Best transfer size:", profile.max_transfer)
+    print("Pad to whole blocks:", profile.pad)
+    path = args.profiles if args.profiles else default_profile_path()
+    save_profile(profile, path)
+    print("Profile for", profile.key, "saved to", path)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Explore a uDMX interface")
+    parser.add_argument("--probe", action="store_true",
+                        help="measure transfer latency and error rate and save the interface's profile")
+    parser.add_argument("--repeats", type=int, default=20,
+                        help="transfers per size and offset when probing (default 20)")
+    parser.add_argument("--profiles", metavar="FILE",
+                        help="profile file (default ~/.uDMXprofiles.json)")
+    parser.add_argument("--sim", action="store_true",
+                        help="probe a simulated interface instead of real hardware")
+    parser.add_argument("--sim-overflow-rate", type=float, default=0.0,
+                        help="overflow error rate of the simulated interface")
+    args = parser.parse_args()
+
+    if args.probe:
+        return probe(args)
+
+    dev = find_device()
+    if dev is None:
+        print("uDMX device was not found")
+        return 0
+    describe(dev)
+    demo(dev)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
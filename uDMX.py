@@ -22,9 +22,17 @@
 # it finds with the correct vendor ID and product ID.
 #
 
+import time
+
+# Startup time is measured from here
+start_time = time.perf_counter()
+
 import json
+import marshal
 import os
 import sys
+import socket
+import struct
 
 # The active configuration
 loaded_conf = None
@@ -33,6 +41,16 @@ config = {}
 # Global options
 verbose = False
 
+# The pyudmx module, imported by import_pyudmx()
+pyudmx = None
+# Time import_pyudmx() took, in ms
+import_ms = None
+
+# Startup (conf, rc file, message translation and the pyudmx import, up to
+# the first transfer) should stay within this budget.
+# See the uDMX.py section of Readme.md.
+STARTUP_BUDGET_MS = 75
+
 
 def load_conf(cfg_path):
     """
@@ -64,70 +82,77 @@ def load_conf(cfg_path):
     return True
 
 
-# Try to load the conf file from one of these well known places.
-# If there isn't one, we give up.
-places = []
-places.append(os.path.join(os.getcwd(), "uDMX.conf"))
-if os.name == "nt":
-    places.append(os.path.join(os.environ["USERPROFILE"], "uDMX.conf"))
-else:
-    places.append(os.path.join(os.environ["HOME"], "uDMX.conf"))
-    places.append("/etc/uDMX.conf")
-
-for cfg_path in places:
-    if load_conf(cfg_path):
-        loaded_conf = cfg_path
-        break
-
-if loaded_conf is None:
-    print("Unable to find a uDMX.conf file")
-    exit(0)
-
-# print("Configuration:", config)
-
-# Find the pyusb module and import it
-try:
-    import usb  # this is pyusb
-except:
-    # Assumption: You are running with a virtualenv.
-    # If pyusb is not available we assume we might be running sudo on a raspberry pi.
-    # In order to directly access a USB port on a raspberry pi, you must be running sudo.
-    # An alternative is the chmod the permissions on the USB device. For example, if the
-    # device is /dev/bus/usb/001/005, then run the command
-    #   sudo chmod +w /dev/bus/usb/001/005
-    # Unfortunately, this change will be lost across a reboot. A more permanent solution
-    # involves digging into udev. Permissions and a better solution are discussed in
-    # the Readme.md file.
-
-    # This appears to be the recommended way to activate the venv specified in the conf file.
-    import platform
-
-    # If a virtualenv is defined in the config file, use it.
-    if "venv" in config:
-        activate_this = os.path.join(config["venv"], "bin/activate_this.py")
-        # On the raspberry pi 2 this is pretty expensive
-        # On Python 2 is's execfile. One Python 3 it's exec.
-        if sys.version_info[0] < 3:
-            execfile(activate_this, dict(__file__=activate_this))
-        else:
-            exec(open(activate_this).read())
+def find_conf():
+    """
+    Try to load the conf file from one of these well known places.
+    Returns False if there isn't one.
+    """
+    global loaded_conf
+    places = []
+    places.append(os.path.join(os.getcwd(), "uDMX.conf"))
+    if os.name == "nt":
+        places.append(os.path.join(os.environ["USERPROFILE"], "uDMX.conf"))
+    else:
+        places.append(os.path.join(os.environ["HOME"], "uDMX.conf"))
+        places.append("/etc/uDMX.conf")
 
-        import usb  # This is pyusb
+    for cfg_path in places:
+        if load_conf(cfg_path):
+            loaded_conf = cfg_path
+            return True
+    return False
 
-        # print("usb imported from virtualenv.")
-    else:
-        print("Unable to import usb (the PyUSB module).")
-        print("Install PyUSB or specify a virtualenv with PyUSB via the /etc/uDMX.conf file.")
-        exit(0)
 
-from pyudmx import pyudmx
+def import_pyudmx():
+    """
+    Find the pyusb module and import pyudmx.
+    This is deferred until a message actually has to go to the uDMX
+    because activating a virtualenv is expensive.
+    Returns False if pyusb cannot be found.
+    """
+    global pyudmx, import_ms
+    started = time.perf_counter()
+    try:
+        import usb  # this is pyusb
+    except:
+        # Assumption: You are running with a virtualenv.
+        # If pyusb is not available we assume we might be running sudo on a raspberry pi.
+        # In order to directly access a USB port on a raspberry pi, you must be running sudo.
+        # An alternative is the chmod the permissions on the USB device. For example, if the
+        # device is /dev/bus/usb/001/005, then run the command
+        #   sudo chmod +w /dev/bus/usb/001/005
+        # Unfortunately, this change will be lost across a reboot. A more permanent solution
+        # involves digging into udev. Permissions and a better solution are discussed in
+        # the Readme.md file.
+
+        # If a virtualenv is defined in the config file, use it.
+        if "venv" in config:
+            activate_this = os.path.join(config["venv"], "bin/activate_this.py")
+            # On the raspberry pi 2 this is pretty expensive
+            exec(open(activate_this).read(), dict(__file__=activate_this))
+
+            import usb  # This is pyusb
+
+            # print("usb imported from virtualenv.")
+        else:
+            print("Unable to import usb (the PyUSB module).")
+            print("Install PyUSB or specify a virtualenv with PyUSB via the /etc/uDMX.conf file.")
+            return False
+
+    from pyudmx import pyudmx as module
+    pyudmx = module
+    import_ms = (time.perf_counter() - started) * 1000.0
+    return True
+
 
 # channel/value dictionary
 channels_key = "channels"
 values_key = "values"
+scenes_key = "scenes"
 cv_dict = {}
 cv_dict[channels_key] = {}
 cv_dict[values_key] = {}
+cv_dict[scenes_key] = {}
 
 
 def add_channel(name, value):
@@ -141,10 +166,91 @@ def add_values(name, values):
     """
     Adds an alias with list of values to the channel/value dictionary.
     """
-    int_values = map(int, values)
+    int_values = list(map(int, values))
     cv_dict[values_key][name] = int_values
 
 
+def add_fixture(name, attributes, address):
+    """
+    Adds channel aliases for a fixture: the fixture name for its start
+    address and name.attribute for each of its channels.
+    """
+    address = int(address)
+    add_channel(name, address)
+    for offset, attribute in enumerate(attributes):
+        if attribute != "-":
+            add_channel(name + "." + attribute, address + offset)
+
+
+class Scene:
+    """
+    A scene being compiled from the rc file. Statements are applied in
+    order, so later statements and includes override earlier ones.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.frame = bytearray(512)
+        # 1 for each channel the scene sets
+        self.mask = bytearray(512)
+
+    def set(self, channel, values):
+        self.frame[channel - 1:channel - 1 + len(values)] = bytes(values)
+        self.mask[channel - 1:channel - 1 + len(values)] = b"\x01" * len(values)
+
+    def include(self, compiled):
+        for channel, count in compiled["spans"]:
+            self.set(channel, compiled["frame"][channel - 1:channel - 1 + count])
+
+    def compile(self):
+        """
+        Returns the compiled scene: the frame and the spans of channels
+        the scene sets, as [channel, count] pairs. Recalling the scene sends
+        each span straight from the frame.
+        """
+        spans = []
+        mask = self.mask
+        start = mask.find(1)
+        while start >= 0:
+            end = mask.find(0, start)
+            if end < 0:
+                end = len(mask)
+            spans.append([start + 1, end - start])
+            start = mask.find(1, end)
+        return {"frame": bytes(self.frame), "spans": spans}
+
+
+def add_scene(scene):
+    """
+    Adds a compiled scene to the channel/value dictionary.
+    """
+    cv_dict[scenes_key][scene.name] = scene.compile()
+
+
+def parse_scene_statement(scene, tokens):
+    """
+    Apply one statement inside a scene block to the scene:
+        include <scene>
+        <channel> <value> ...
+    Raises ValueError for an invalid statement.
+    """
+    if tokens[0] == "include":
+        if len(tokens) != 2:
+            raise ValueError("include takes one argument, a scene name")
+        if tokens[1] not in cv_dict[scenes_key]:
+            raise ValueError("Undefined scene " + tokens[1])
+        scene.include(cv_dict[scenes_key][tokens[1]])
+        return
+    if len(tokens) < 2:
+        raise ValueError("A channel and at least one value are required")
+    trans_tokens = translate_message_tokens(tokens)
+    channel = trans_tokens[0]
+    values = trans_tokens[1:]
+    if not is_valid_channel(channel) or not is_valid_channel(channel + len(values) - 1) or \
+            not are_valid_values(values):
+        raise ValueError("Channel or value out of range")
+    scene.set(channel, values)
+
+
 def is_valid_channel(channel):
     """
     Determines if a channel number is a valid DMX channel (1-512).
@@ -173,9 +279,9 @@ def are_valid_values(values):
     return True
 
 
-def load_rc_file():
+def rc_file_path():
     """
-    Load the contents of the resource file ~/.uDMXrc
+    Returns the path of the resource file.
     """
     # If an rc file is named in the config, use it.
     # Otherwise, fall back to looking in the HOME directory.
@@ -189,49 +295,193 @@ def load_rc_file():
         else:
             # Mostly *nix type systems
             rcfile = os.path.join(os.environ["HOME"], ".uDMXrc")
+    return rcfile
+
+
+# Version of the layout of the cached alias tables. Bump it whenever the
+# layout changes (e.g. version 2 added scenes) so older caches are not used.
+RC_CACHE_FORMAT = 2
+
+
+def rc_cache_key(rcfile):
+    """
+    Returns the key that identifies the current contents of the rc file:
+    the cache format, its absolute path, modification time and size.
+    """
+    st = os.stat(rcfile)
+    return [RC_CACHE_FORMAT, os.path.abspath(rcfile), st.st_mtime_ns, st.st_size]
+
+
+def rc_cache_path(rcfile):
+    """
+    Returns the path of the compiled rc file cache.
+    The conf file can override the default with a "uDMXrc_cache" entry.
+    """
+    if "uDMXrc_cache" in config:
+        return config["uDMXrc_cache"]
+    return rcfile + ".cache"
+
+
+def load_rc_cache(rcfile):
+    """
+    Load the alias tables from the rc file cache if the cache was written in
+    the current format and matches the rc file's current path, mtime and size.
+    Returns True if the cache was used.
+    """
+    global cv_dict
+    try:
+        key = rc_cache_key(rcfile)
+        with open(rc_cache_path(rcfile), "rb") as cf:
+            cache = marshal.load(cf)
+        if cache["key"] != key:
+            return False
+        cv_dict = cache["cv_dict"]
+    except Exception:
+        # Missing, stale or written by a different Python version
+        return False
+    return True
+
+
+def save_rc_cache(rcfile):
+    """
+    Save the alias tables to the rc file cache.
+    """
+    try:
+        cache = {"key": rc_cache_key(rcfile), "cv_dict": cv_dict}
+        with open(rc_cache_path(rcfile), "wb") as cf:
+            marshal.dump(cache, cf)
+    except Exception as ex:
+        # The cache is only an optimization
+        if verbose:
+            print("Unable to save resource file cache")
+            print(str(ex))
+
+
+def parse_rc_file(rcfile):
+    """
+    Parse the resource file into the channel/value dictionary.
+    Returns the number of invalid statements, or None if the file could not be opened.
+    """
+    errors = 0
+    # Fixture profiles, name -> attribute names in channel order
+    profiles = {}
+    # The scene block being parsed
+    scene = None
     try:
         cf = open(rcfile, 'r')
-        for line in cf:
-            tokens = line.split()
+    except:
+        print("Unable to open resource file", rcfile)
+        return None
+    for line in cf:
+        tokens = line.split()
 
-            # Blank line
-            if len(tokens) == 0:
-                continue
+        # Blank line
+        if len(tokens) == 0:
+            continue
 
-            # A comment
-            if tokens[0] == '#':
+        # A comment
+        if tokens[0] == '#':
+            continue
+        # Inside a scene block
+        elif scene is not None:
+            if tokens[0] == 'end':
+                add_scene(scene)
+                scene = None
                 continue
-            # A channel alias
-            elif tokens[0] == 'channel':
-                # channel alias value
-                if len(tokens) >= 3:
-                    if is_valid_channel(tokens[2]):
-                        add_channel(tokens[1], tokens[2])
-                    else:
-                        print(line)
-                        print("Invalid channel value")
+            try:
+                parse_scene_statement(scene, tokens)
+                continue
+            except ValueError as ex:
+                print(line)
+                print(str(ex))
+        # The start of a scene block, ended by an end statement
+        elif tokens[0] == 'scene':
+            # scene name
+            if len(tokens) == 2:
+                scene = Scene(tokens[1])
+                continue
+            else:
+                print(line)
+                print("Invalid scene statement")
+        # A channel alias
+        elif tokens[0] == 'channel':
+            # channel alias value
+            if len(tokens) >= 3:
+                if is_valid_channel(tokens[2]):
+                    add_channel(tokens[1], tokens[2])
+                    continue
                 else:
                     print(line)
-                    print("Invalid channel statement")
-            # A DMX value or values
-            elif tokens[0] in ['value', 'values']:
-                # value alias value
-                if len(tokens) >= 3:
-                    if are_valid_values(tokens[2:]):
-                        add_values(tokens[1], tokens[2:])
-                    else:
-                        print(line)
-                        print("Invalid value(s)")
+                    print("Invalid channel value")
+            else:
+                print(line)
+                print("Invalid channel statement")
+        # A DMX value or values
+        elif tokens[0] in ['value', 'values']:
+            # value alias value
+            if len(tokens) >= 3:
+                if are_valid_values(tokens[2:]):
+                    add_values(tokens[1], tokens[2:])
+                    continue
                 else:
                     print(line)
-                    print("Invalid value statement")
-            # Something we don't recognize
+                    print("Invalid value(s)")
             else:
                 print(line)
-                print(tokens[0], "is not a recognized resource file statement")
-        cf.close()
-    except:
-        print("Unable to open resource file", rcfile)
+                print("Invalid value statement")
+        # A fixture profile
+        elif tokens[0] == 'profile':
+            # profile name attribute attribute ... (- for an unused channel)
+            if len(tokens) >= 3:
+                profiles[tokens[1]] = tokens[2:]
+                continue
+            else:
+                print(line)
+                print("Invalid profile statement")
+        # A fixture
+        elif tokens[0] == 'fixture':
+            # fixture name profile address
+            if len(tokens) >= 4:
+                if tokens[2] not in profiles:
+                    print(line)
+                    print("Undefined profile", tokens[2])
+                elif is_valid_channel(tokens[3]) and \
+                        is_valid_channel(int(tokens[3]) + len(profiles[tokens[2]]) - 1):
+                    add_fixture(tokens[1], profiles[tokens[2]], tokens[3])
+                    continue
+                else:
+                    print(line)
+                    print("Invalid fixture address")
+            else:
+                print(line)
+                print("Invalid fixture statement")
+        # Something we don't recognize
+        else:
+            print(line)
+            print(tokens[0], "is not a recognized resource file statement")
+        errors += 1
+    cf.close()
+    if scene is not None:
+        print("Scene", scene.name, "has no end statement")
+        errors += 1
+    return errors
+
+
+def load_rc_file():
+    """
+    Load the contents of the resource file ~/.uDMXrc
+    The parsed alias tables are cached (see rc_cache_path()) and the
+    cache is used as long as the rc file does not change.
+    """
+    rcfile = rc_file_path()
+    if load_rc_cache(rcfile):
+        if verbose:
+            print("Loaded resource file cache for", rcfile)
+        return
+    errors = parse_rc_file(rcfile)
+    # Only cache a clean parse so that problems keep getting reported
+    if errors == 0:
+        save_rc_cache(rcfile)
 
 
 def translate_message_tokens(message_tokens):
@@ -262,24 +512,305 @@ def dump_dict():
     print(cv_dict)
 
 
-def send_dmx_message(message_tokens):
+# Daemon protocol. Each request is a header followed by count values:
+#   magic (1 byte), command (1 byte, 1=single 2=multi), channel (2 bytes), count (2 bytes)
+# Each reply is a status (1 byte, 0=ok) followed by the number of values sent (2 bytes).
+# All fields are big endian.
+DAEMON_MAGIC = 0xD7
+request_header = struct.Struct("!BBHH")
+reply_format = struct.Struct("!BH")
+
+
+def daemon_socket_dir(create=False):
     """
-    Send the DMX message defined by the command line arguments (message tokens).
-    The first argument/token is the DMX channel.
-    The remaining argument(s).token(s) are DMX values.
+    Returns the per-user directory for the daemon socket: $XDG_RUNTIME_DIR,
+    or else a uDMX-<uid> directory in the temp directory that only the user
+    can access. Raises OSError if that directory does not exist (and create
+    is False), belongs to another user or can be accessed by other users.
     """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return runtime_dir
+    # Imported here, they are only needed to talk to the daemon
+    import stat
+    import tempfile
+    uid = os.getuid()
+    path = os.path.join(tempfile.gettempdir(), "uDMX-{0}".format(uid))
+    if create:
+        try:
+            os.mkdir(path, 0o700)
+        except FileExistsError:
+            pass
+    # The temp directory is shared, so don't trust a directory someone else made
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != uid or st.st_mode & 0o077:
+        raise PermissionError("{0} is not a directory private to the current user".format(path))
+    return path
+
+
+def daemon_socket_path(create=False):
+    """
+    Returns the path of the daemon's Unix domain socket.
+    The conf file can override the default with a "socket" entry.
+    :param create: create the socket's directory if needed (see daemon_socket_dir())
+    """
+    if "socket" in config:
+        return config["socket"]
+    return os.path.join(daemon_socket_dir(create), "uDMX.sock")
+
+
+def recv_exactly(conn, n):
+    """
+    Receive exactly n bytes from a socket.
+    Returns None if the connection is closed first.
+    """
+    buf = bytearray(n)
+    view = memoryview(buf)
+    received = 0
+    while received < n:
+        r = conn.recv_into(view[received:])
+        if r == 0:
+            return None
+        received += r
+    return buf
+
+
+def daemon_request(channel, values):
+    """
+    Returns a daemon request that sends values (bytes-like) starting at channel.
+    """
+    cmd = 1 if len(values) == 1 else 2
+    return request_header.pack(DAEMON_MAGIC, cmd, channel, len(values)) + values
+
+
+def send_requests_to_daemon(requests):
+    """
+    Forward daemon requests over one connection to a running daemon.
+    Returns the number of values sent, or None if no daemon is running.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    total = 0
+    try:
+        s.connect(daemon_socket_path())
+        # Send them all before reading any replies
+        s.sendall(b"".join(requests))
+        for _ in requests:
+            reply = recv_exactly(s, reply_format.size)
+            if reply is None:
+                return None
+            status, n = reply_format.unpack(reply)
+            if status == 0:
+                total += n
+    except OSError:
+        return None
+    finally:
+        s.close()
+    return total
+
+
+def send_to_daemon(trans_tokens):
+    """
+    Forward a translated message to a running daemon.
+    Returns the number of values sent, or None if no daemon is running.
+    """
+    try:
+        request = daemon_request(trans_tokens[0], bytearray(trans_tokens[1:]))
+    except (ValueError, struct.error):
+        # Let the direct path report the bad message
+        return None
+    return send_requests_to_daemon([request])
+
+
+def can_connect(path):
+    """
+    Returns True if something is listening on a Unix domain socket.
+    """
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        s.close()
+
+
+def daemon_listen(path):
+    """
+    Returns a Unix domain socket listening on path that only the current user can connect to.
+    """
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(path)
+        os.chmod(path, 0o600)
+        server.listen(16)
+    except OSError:
+        server.close()
+        raise
+    return server
+
+
+def run_daemon():
+    """
+    Keep the uDMX interface open and send the messages received on
+    the daemon socket until interrupted.
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        print("Daemon mode requires Unix domain sockets")
+        return False
+
+    dev = pyudmx.uDMXDevice()
+    if not dev.open():
+        print("Unable to find and open uDMX interface")
+        return False
+
+    try:
+        path = daemon_socket_path(create=True)
+    except OSError as ex:
+        print("Unable to use the daemon socket directory")
+        print(str(ex))
+        dev.close()
+        return False
+    if os.path.exists(path):
+        # A socket left behind by a daemon that did not shut down cleanly
+        if can_connect(path):
+            print("A uDMX daemon is already running on", path)
+            dev.close()
+            return False
+        os.remove(path)
+
+    server = daemon_listen(path)
+    print("uDMX daemon listening on", path)
+    try:
+        while True:
+            conn, addr = server.accept()
+            # Don't let a stalled client hold up everyone else
+            conn.settimeout(5.0)
+            try:
+                serve_connection(dev, conn)
+            except OSError as ex:
+                if verbose:
+                    print(str(ex))
+            finally:
+                conn.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        os.remove(path)
+        dev.close()
+    return True
+
+
+def run_osc_server(port):
+    """
+    Keep the uDMX interface open and apply the OSC messages received on
+    a UDP port until interrupted. The rc file's channel aliases can be
+    used as OSC addresses, e.g. /dmx/red.
+    """
+    import asyncio
+    from pyudmx.osc import OSCServer
 
-    # Open the uDMX USB device
     dev = pyudmx.uDMXDevice()
     if not dev.open():
         print("Unable to find and open uDMX interface")
         return False
 
+    async def serve():
+        server = OSCServer(dev, port=port, aliases=cv_dict[channels_key])
+        await server.start()
+        print("uDMX OSC server listening on", server.address)
+        try:
+            while True:
+                await asyncio.sleep(60)
+                if verbose:
+                    print(server.stats())
+        finally:
+            server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        dev.close()
+    return True
+
+
+def serve_connection(dev, conn):
+    """
+    Handle the requests on one client connection.
+    """
+    while True:
+        header = recv_exactly(conn, request_header.size)
+        if header is None:
+            return
+        magic, cmd, channel, count = request_header.unpack(header)
+        values = recv_exactly(conn, count) if count else bytearray()
+        if magic != DAEMON_MAGIC or values is None:
+            return
+        try:
+            if cmd == 1:
+                n = dev.send_single_value(channel, values[0])
+            else:
+                n = dev.send_multi_value(channel, values)
+            if verbose:
+                print("Sent", n, "value(s) to channel", channel)
+            conn.sendall(reply_format.pack(0, n))
+        except Exception as ex:
+            print(str(ex))
+            conn.sendall(reply_format.pack(1, 0))
+
+
+def report_startup_time():
+    """
+    Print the time from the start of the program to the first transfer: loading
+    the conf and rc files, translating the message and, unless a daemon took the
+    message, importing pyudmx. Call it just before the interface is opened.
+    """
+    elapsed_ms = (time.perf_counter() - start_time) * 1000.0
+    if import_ms is None:
+        print("Startup time: {0:.1f} ms (budget {1} ms)".format(elapsed_ms, STARTUP_BUDGET_MS))
+    else:
+        print("Startup time: {0:.1f} ms (budget {1} ms), {2:.1f} ms of it importing pyudmx".format(
+            elapsed_ms, STARTUP_BUDGET_MS, import_ms))
+    if elapsed_ms > STARTUP_BUDGET_MS:
+        print("Startup time is over budget")
+
+
+def send_dmx_message(message_tokens):
+    """
+    Send the DMX message defined by the command line arguments (message tokens).
+    The first argument/token is the DMX channel.
+    The remaining argument(s).token(s) are DMX values.
+    The message goes through a running daemon if there is one.
+    """
+
     # Translate the tokens into integers.
     # trans_tokens[0] will be the one-based channel number (1-512) as an integer.
     # The remaining tokens will be zero-based values (0-255) as integers.
     trans_tokens = translate_message_tokens(message_tokens)
 
+    n = send_to_daemon(trans_tokens)
+    if n is not None:
+        if verbose:
+            report_startup_time()
+            print("Sent", n, "value(s) through the daemon")
+        return n > 0
+
+    if not import_pyudmx():
+        return False
+    if verbose:
+        report_startup_time()
+
+    # Open the uDMX USB device
+    dev = pyudmx.uDMXDevice()
+    if not dev.open():
+        print("Unable to find and open uDMX interface")
+        return False
+
     if len(trans_tokens) == 2:
         # Single value message
         if verbose:
@@ -303,6 +834,184 @@ def send_dmx_message(message_tokens):
     return n > 0
 
 
+def send_scene(name):
+    """
+    Recall a scene compiled from the rc file. Each span of channels the
+    scene sets is sent straight from the compiled frame, in one transfer.
+    Channels outside the scene are left as they are.
+    The scene goes through a running daemon if there is one.
+    """
+    scene = cv_dict[scenes_key].get(name)
+    if scene is None:
+        print("Undefined scene", name)
+        return False
+    frame = memoryview(scene["frame"])
+    spans = scene["spans"]
+
+    n = send_requests_to_daemon([daemon_request(c, frame[c - 1:c - 1 + count]) for c, count in spans])
+    if n is not None:
+        if verbose:
+            report_startup_time()
+            print("Sent", n, "value(s) through the daemon")
+        return n > 0
+
+    if not import_pyudmx():
+        return False
+    if verbose:
+        report_startup_time()
+
+    dev = pyudmx.uDMXDevice()
+    if not dev.open():
+        print("Unable to find and open uDMX interface")
+        return False
+    n = 0
+    for c, count in spans:
+        if count == 1:
+            n += dev.send_single_value(c, frame[c - 1])
+        else:
+            n += dev.send_multi_value(c, frame[c - 1:c - 1 + count])
+    dev.close()
+    if verbose:
+        print("Sent", n, "value(s) in", len(spans), "transfer(s)")
+    return n > 0
+
+
+class BatchReadError(Exception):
+    """
+    A batch file could not be opened or read.
+    """
+    pass
+
+
+def read_batch_lines(path):
+    """
+    Generate (line number, line) pairs from a batch file, or from stdin if path is "-".
+    Raises BatchReadError if the file cannot be opened or read.
+    """
+    try:
+        if path == "-":
+            yield from enumerate(sys.stdin, 1)
+            return
+        with open(path, "r") as bf:
+            yield from enumerate(bf, 1)
+    except OSError as ex:
+        raise BatchReadError(str(ex)) from ex
+
+
+def batch_tokens(lines):
+    """
+    Split batch lines into tokens, skipping blank lines and comments.
+    """
+    for line_number, line in lines:
+        tokens = line.split()
+        if len(tokens) == 0 or tokens[0].startswith("#"):
+            continue
+        yield line_number, tokens
+
+
+def batch_messages(token_lines):
+    """
+    Translate tokenized batch lines into messages. Each message is one of
+        ("wait", seconds)
+        ("set", translated tokens)
+        ("scene", compiled scene)
+    Lines that cannot be translated are reported and skipped.
+    """
+    for line_number, tokens in token_lines:
+        try:
+            if tokens[0] == "scene":
+                if len(tokens) != 2 or tokens[1] not in cv_dict[scenes_key]:
+                    raise ValueError("scene takes one argument, a scene defined in the rc file")
+                yield "scene", cv_dict[scenes_key][tokens[1]]
+                continue
+            if tokens[0] == "wait":
+                if len(tokens) != 2:
+                    raise ValueError("wait takes one argument, the time in milliseconds")
+                ms = float(tokens[1])
+                if ms < 0:
+                    raise ValueError("wait time must not be negative")
+                yield "wait", ms / 1000.0
+                continue
+            if len(tokens) < 2:
+                raise ValueError("a channel and at least one value are required")
+            trans_tokens = translate_message_tokens(tokens)
+            channel = trans_tokens[0]
+            values = trans_tokens[1:]
+            if not is_valid_channel(channel) or not is_valid_channel(channel + len(values) - 1) or \
+                    not are_valid_values(values):
+                raise ValueError("channel or value out of range")
+            yield "set", trans_tokens
+        except ValueError as ex:
+            print("Line {0}: {1}".format(line_number, " ".join(tokens)))
+            print(str(ex))
+
+
+def run_batch(path):
+    """
+    Send the messages in a batch file over one open uDMX interface.
+    Writes between wait lines are collected in the universe buffer and sent
+    together, so each channel goes out once per frame with its latest value.
+    Waits are timed from the start of the batch so transfer time does not
+    accumulate as drift.
+    Returns True if the batch completed.
+    """
+    dev = pyudmx.uDMXDevice()
+    if not dev.open():
+        print("Unable to find and open uDMX interface")
+        return False
+
+    universe = dev.Universe
+    messages = 0
+    sent = 0
+    try:
+        next_frame = time.perf_counter()
+        for kind, message in batch_messages(batch_tokens(read_batch_lines(path))):
+            if kind == "set":
+                if len(message) == 2:
+                    universe.set_value(message[0], message[1])
+                else:
+                    universe.set_values(message[0], message[1:])
+                # Send every write, as separate uDMX.py runs would, even where the
+                # value matches the universe (a fresh universe is all zeros)
+                universe.mark_dirty(message[0], len(message) - 1)
+                messages += 1
+                continue
+            if kind == "scene":
+                frame = message["frame"]
+                for c, count in message["spans"]:
+                    universe.set_values(c, frame[c - 1:c - 1 + count])
+                    # Send the scene's values even where they match the universe
+                    universe.mark_dirty(c, count)
+                messages += 1
+                continue
+            # A wait ends the frame
+            sent += dev.flush()
+            next_frame += message
+            delay = next_frame - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Running late, start timing again from now
+                next_frame = time.perf_counter()
+        sent += dev.flush()
+    except BatchReadError as ex:
+        print("Unable to read batch file", path)
+        print(str(ex))
+        return False
+    except pyudmx.usb.core.USBError as ex:
+        print("uDMX interface error")
+        print(str(ex))
+        return False
+    except KeyboardInterrupt:
+        return False
+    finally:
+        dev.close()
+
+    if verbose:
+        print("Batch of {0} message(s) sent {1} value(s)".format(messages, sent))
+    return True
+
+
 #
 # Main program
 #
@@ -313,13 +1022,25 @@ if __name__ == "__main__":
 
     # Set up command line parsing
     parser = argparse.ArgumentParser()
-    parser.add_argument("channel", nargs=1,
+    parser.add_argument("channel", nargs="?",
                         help="DMX channel number (1-512) or channel name")
-    parser.add_argument("value", nargs="+",
+    parser.add_argument("value", nargs="*",
                         help="One or more DMX channel values (0-255) or value names")
     parser.add_argument("-v", "--verbose",
                         help="Produce verbose output", action="store_true")
+    parser.add_argument("--daemon",
+                        help="Keep the uDMX open and serve messages from other uDMX.py invocations",
+                        action="store_true")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="Send the message lines in FILE (- for stdin) over one open uDMX")
+    parser.add_argument("--osc", metavar="PORT", type=int,
+                        help="Keep the uDMX open and serve OSC messages on a UDP port")
+    parser.add_argument("--scene", metavar="NAME",
+                        help="Recall a scene defined in the rc file")
     args = parser.parse_args()
+    mode_given = args.daemon or args.batch or args.scene or args.osc is not None
+    if not mode_given and (args.channel is None or len(args.value) == 0):
+        parser.error("a channel and at least one value are required")
 
     verbose = args.verbose
 
@@ -328,13 +1049,43 @@ if __name__ == "__main__":
     #    help()
     #    exit(0)
 
+    # Nothing is loaded until the command line has been validated
+    if not find_conf():
+        print("Unable to find a uDMX.conf file")
+        exit(0)
+    # print("Configuration:", config)
+
     # Load the .uDMXrc file
     load_rc_file()
     # dump_dict()
 
+    if args.daemon:
+        if import_pyudmx():
+            run_daemon()
+        exit(0)
+
+    if args.osc is not None:
+        if import_pyudmx():
+            run_osc_server(args.osc)
+        exit(0)
+
+    if args.batch:
+        if import_pyudmx() and run_batch(args.batch):
+            print("Batch sent")
+        else:
+            print("Batch failed")
+        exit(0)
+
+    if args.scene:
+        if send_scene(args.scene):
+            print("Scene sent")
+        else:
+            print("Scene failed")
+        exit(0)
+
     # Send the message through the uDMX interface
     msg_tokens = []
-    msg_tokens.extend(args.channel)
+    msg_tokens.append(args.channel)
     msg_tokens.extend(args.value)
     if verbose:
         print("Message tokens:", msg_tokens)